@@ -2,65 +2,919 @@ import requests
 import base64
 import cv2
 import os
-from typing import Tuple, Optional
+import gzip
+import re
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterable, List, Sequence, Tuple, Optional, Union
+from cache import get_result_cache, make_key
+from video_utils import EncodedFrame
+from reporting import log
+import metrics
+from audio_utils import split_wav
 from config import (
     VLM_API_URL, VLM_MODEL_NAME, VLM_HEADERS,
-    TRANSCRIBE_API_URL,
-    IMAGE_PROMPT_TEMPLATE, TEXT_PROMPT_TEMPLATE
+    TRANSCRIBE_API_URL, TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_MAX_PARALLEL, TRANSCRIBE_MAX_RETRIES,
+    TEXT_WINDOW_WORDS, TEXT_WINDOW_OVERLAP_WORDS, TEXT_MAX_PARALLEL,
+    IMAGE_PROMPT_TEMPLATE, TEXT_PROMPT_TEMPLATE, BATCH_IMAGE_PROMPT_TEMPLATE,
+    DEFAULT_HTTP_POOL_SIZE, HTTP_COMPRESS_REQUESTS,
+    FRAME_MAX_SIDE, FRAME_IMAGE_FORMAT, FRAME_IMAGE_QUALITY,
+    VLM_RATE_LIMIT, VLM_RATE_BURST, VLM_ADAPTIVE_CONCURRENCY, VLM_INITIAL_CONCURRENCY,
+    VLM_MIN_CONCURRENCY, VLM_MAX_CONCURRENCY, VLM_LATENCY_TARGET_SECONDS,
+    VLM_MAX_RETRIES, VLM_RETRY_BASE_DELAY, VLM_RETRY_MAX_DELAY,
+    VLM_HEDGE_ENABLED, VLM_HEDGE_PERCENTILE, VLM_HEDGE_MIN_SAMPLES, VLM_HEDGE_MAX_RATIO
 )
 
+try:
+    import aiohttp
+except ImportError:  # aiohttp chỉ cần cho các hàm *_async
+    aiohttp = None
+
+
+class HttpClient:
+    """
+    HTTP client dùng chung giữa các threads: một requests.Session với connection pool
+    giữ kết nối keep-alive, tránh mở TCP connection mới cho mỗi request.
+    """
+    
+    def __init__(self, pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+                 compress: bool = HTTP_COMPRESS_REQUESTS):
+        """
+        Args:
+            pool_size: Số kết nối tối đa giữ lại cho mỗi host
+            compress: Nén gzip body JSON gửi đi
+        """
+        self.pool_size = pool_size
+        self.compress = compress
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._active = 0  # Số request đang chạy
+        self._retired = False
+        self._lock = threading.Lock()
+    
+    def post(self, url: str, json_body=None, headers: Optional[dict] = None,
+             timeout: float = 30, upload_kind: Optional[str] = None, **kwargs) -> requests.Response:
+        """
+        POST qua connection pool; json_body được nén gzip nếu bật compress.
+        upload_kind: nhãn đếm số bytes body đã gửi (metrics.uploaded), None = không đếm
+        """
+        if json_body is not None and self.compress:
+            headers = dict(headers or {})
+            headers['Content-Type'] = 'application/json'
+            headers['Content-Encoding'] = 'gzip'
+            kwargs['data'] = gzip.compress(json.dumps(json_body).encode('utf-8'), compresslevel=5)
+        elif json_body is not None:
+            kwargs['json'] = json_body
+        with self._lock:
+            self._active += 1
+        try:
+            response = self.session.post(url, headers=headers, timeout=timeout, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                idle = self._retired and not self._active
+            if idle:
+                self.session.close()
+        if upload_kind is not None:
+            metrics.uploaded(upload_kind, len(response.request.body or b""))
+        return response
+    
+    def retire(self):
+        """Client đã được thay bằng client mới: đóng kết nối ngay khi request cuối cùng xong"""
+        with self._lock:
+            self._retired = True
+            idle = not self._active
+        if idle:
+            self.session.close()
+    
+    def close(self):
+        self.session.close()
+
+
+_http_client: Optional[HttpClient] = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client(min_pool_size: Optional[int] = None) -> HttpClient:
+    """
+    Lấy HTTP client dùng chung (tạo lần đầu khi cần).
+    
+    Args:
+        min_pool_size: Nếu pool hiện tại nhỏ hơn (ví dụ nhiều threads hơn mặc định),
+                       tạo client mới với pool đủ lớn
+    """
+    global _http_client
+    client = _http_client
+    if client is not None and (min_pool_size is None or client.pool_size >= min_pool_size):
+        return client
+    
+    with _http_client_lock:
+        if _http_client is None or (min_pool_size is not None and _http_client.pool_size < min_pool_size):
+            pool_size = max(min_pool_size or 0, DEFAULT_HTTP_POOL_SIZE)
+            old_client, _http_client = _http_client, HttpClient(pool_size=pool_size)
+            # Các threads khác có thể đang dùng client cũ: đóng khi request của chúng xong
+            if old_client is not None:
+                old_client.retire()
+        return _http_client
+
+
+# Status code cho thấy server quá tải → giảm số request đồng thời
+_OVERLOAD_STATUSES = {429, 500, 502, 503, 504}
+
+
+class _RequestSlot:
+    """Kết quả của một request đi qua VLMLimiter (status=None khi lỗi kết nối/timeout)"""
+    
+    def __init__(self):
+        self.status = None
+        self.started_at = time.monotonic()
+
+
+class VLMLimiter:
+    """
+    Giới hạn request tới VLM server, dùng chung giữa các threads và event loop:
+    
+    - Token bucket: tối đa rate request/giây, cho phép dồn tối đa burst request.
+    - AIMD: số request đồng thời (limit) tăng thêm ~1 sau mỗi limit request trả lời
+      nhanh, giảm theo hệ số backoff khi gặp 429/5xx/timeout hoặc độ trễ > latency_target.
+      Như TCP, chỉ request gửi sau lần giảm gần nhất mới được giảm tiếp, để một đợt lỗi
+      của các request đã gửi cùng lúc không kéo limit về min.
+    """
+    
+    def __init__(self, rate: float = VLM_RATE_LIMIT, burst: int = VLM_RATE_BURST,
+                 adaptive: bool = VLM_ADAPTIVE_CONCURRENCY,
+                 initial: int = VLM_INITIAL_CONCURRENCY,
+                 min_limit: int = VLM_MIN_CONCURRENCY, max_limit: int = VLM_MAX_CONCURRENCY,
+                 latency_target: float = VLM_LATENCY_TARGET_SECONDS, backoff: float = 0.7):
+        """
+        Args:
+            rate: Số request/giây tối đa (0 = không giới hạn)
+            burst: Dung lượng token bucket
+            adaptive: Bật AIMD; tắt thì limit cố định = max_limit
+            initial: Số request đồng thời ban đầu (trong khoảng min_limit..max_limit)
+            min_limit, max_limit: Khoảng giá trị của limit
+            latency_target: Độ trễ (giây) bị coi là server quá tải
+            backoff: Hệ số nhân khi giảm limit
+        """
+        self.rate = rate
+        self.burst = burst
+        self.adaptive = adaptive
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.limit = float(min(max(initial, min_limit), max_limit) if adaptive else max_limit)
+        self.in_flight = 0
+        self.overloads = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._decreased_at = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = deque()  # (event loop, future) của các coroutine đang chờ slot
+    
+    def _try_acquire(self) -> Optional[float]:
+        """
+        Lấy một slot nếu được (gọi khi giữ lock).
+        
+        Returns:
+            0 nếu thành công, None nếu đã đủ limit request đang chạy (đợi có request trả slot),
+            ngược lại số giây cần đợi token bucket
+        """
+        if self.in_flight >= int(self.limit):
+            return None
+        if self.rate:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+            self._refilled_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+            self._tokens -= 1
+        self.in_flight += 1
+        return 0
+    
+    def _release(self, slot: _RequestSlot, latency: Optional[float]):
+        """Trả slot và điều chỉnh limit theo kết quả request (latency=None: không tính)"""
+        with self._cond:
+            self.in_flight -= 1
+            if self.adaptive and latency is not None:
+                overloaded = slot.status is None or slot.status in _OVERLOAD_STATUSES
+                if overloaded or latency > self.latency_target:
+                    self.overloads += 1
+                    if slot.started_at >= self._decreased_at:
+                        self._decreased_at = time.monotonic()
+                        self.limit = max(self.min_limit, self.limit * self.backoff)
+                elif slot.status == 200:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+            self._wake_async_waiters()
+    
+    def _wake_async_waiters(self):
+        """Đánh thức tối đa số coroutine bằng số slot đang trống (gọi khi giữ lock)"""
+        for _ in range(max(0, int(self.limit) - self.in_flight)):
+            if not self._async_waiters:
+                break
+            loop, waiter = self._async_waiters.popleft()
+            loop.call_soon_threadsafe(_resolve_waiter, waiter)
+    
+    @contextmanager
+    def slot(self):
+        """Chờ tới lượt gửi request (threads); gán slot.status sau khi có response"""
+        queued_at = time.monotonic()
+        with self._cond:
+            while True:
+                wait_seconds = self._try_acquire()
+                if wait_seconds == 0:
+                    break
+                # None: đợi tới khi _release notify, không thức dậy định kỳ
+                self._cond.wait(wait_seconds)
+        
+        request_slot = _RequestSlot()
+        metrics.observe("vlm_queue", request_slot.started_at - queued_at)
+        latency = None
+        try:
+            yield request_slot
+            latency = time.monotonic() - request_slot.started_at
+        except (requests.ConnectionError, requests.Timeout):
+            latency = time.monotonic() - request_slot.started_at
+            raise
+        finally:
+            self._release(request_slot, latency)
+    
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        Bản async của slot(): không chặn event loop. Khi đủ limit, coroutine đợi một future
+        được _release đánh thức (từ bất kỳ thread nào); lock chỉ giữ trong lúc cập nhật
+        bộ đếm, không bao giờ giữ trong lúc đợi.
+        """
+        queued_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter = None
+            with self._cond:
+                wait_seconds = self._try_acquire()
+                if wait_seconds is None:
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+            if wait_seconds == 0:
+                break
+            if waiter is None:
+                await asyncio.sleep(wait_seconds)
+                continue
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        # Đã được đánh thức nhưng bị cancel: nhường lượt cho coroutine khác
+                        self._wake_async_waiters()
+                raise
+        
+        request_slot = _RequestSlot()
+        metrics.observe("vlm_queue", request_slot.started_at - queued_at)
+        latency = None
+        try:
+            yield request_slot
+            latency = time.monotonic() - request_slot.started_at
+        except asyncio.TimeoutError:
+            latency = time.monotonic() - request_slot.started_at
+            raise
+        except Exception as e:
+            if aiohttp is not None and isinstance(e, aiohttp.ClientConnectionError):
+                latency = time.monotonic() - request_slot.started_at
+            raise
+        finally:
+            self._release(request_slot, latency)
+    
+    def stats(self) -> dict:
+        """Limit hiện tại, số request đang chạy và số lần server quá tải"""
+        with self._cond:
+            return {"limit": int(self.limit), "in_flight": self.in_flight, "overloads": self.overloads}
+
+
+def _resolve_waiter(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_vlm_limiter: Optional[VLMLimiter] = None
+_vlm_limiter_lock = threading.Lock()
+
+
+def get_vlm_limiter() -> VLMLimiter:
+    """Limiter dùng chung của process (tạo lần đầu khi cần)"""
+    global _vlm_limiter
+    if _vlm_limiter is None:
+        with _vlm_limiter_lock:
+            if _vlm_limiter is None:
+                _vlm_limiter = VLMLimiter()
+    return _vlm_limiter
+
+
+def configure_vlm_limiter(**kwargs) -> VLMLimiter:
+    """Thay limiter dùng chung bằng limiter mới (tham số như VLMLimiter)"""
+    global _vlm_limiter
+    with _vlm_limiter_lock:
+        _vlm_limiter = VLMLimiter(**kwargs)
+    return _vlm_limiter
+
+
+_retry_policy = {
+    "max_retries": VLM_MAX_RETRIES,
+    "hedge": VLM_HEDGE_ENABLED,
+}
+
+
+def configure_vlm_retries(max_retries: Optional[int] = None, hedge: Optional[bool] = None) -> dict:
+    """
+    Đổi số lần retry / bật tắt hedged request cho các request VLM (None = giữ nguyên).
+    
+    Returns:
+        Thiết lập hiện tại
+    """
+    if max_retries is not None:
+        _retry_policy["max_retries"] = max_retries
+    if hedge is not None:
+        _retry_policy["hedge"] = hedge
+    return dict(_retry_policy)
+
+
+class _LatencyTracker:
+    """Độ trễ các request VLM thành công gần đây, dùng để tính deadline hedge"""
+    
+    def __init__(self, window: int = 200):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+    
+    def add(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+    
+    def hedge_deadline(self) -> Optional[float]:
+        """
+        Deadline (giây) trước khi gửi request hedge, hoặc None nếu không hedge
+        (đã tắt, chưa đủ mẫu, hoặc đã dùng hết tỷ lệ hedge cho phép).
+        Mỗi lần gọi được tính là một request.
+        """
+        with self._lock:
+            self.requests += 1
+            if not _retry_policy["hedge"] or len(self._latencies) < VLM_HEDGE_MIN_SAMPLES:
+                return None
+            if self.hedges >= self.requests * VLM_HEDGE_MAX_RATIO:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * VLM_HEDGE_PERCENTILE / 100))]
+    
+    def hedged(self):
+        with self._lock:
+            self.hedges += 1
+
+
+_latency_tracker = _LatencyTracker()
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    """Thread pool chạy request khi bật hedge (đủ cho cả request gốc và request hedge)"""
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _vlm_limiter_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=4 * VLM_MAX_CONCURRENCY,
+                                                     thread_name_prefix='vlm-hedge')
+    return _hedge_executor
+
+
+def _retry_delay(attempt: int) -> float:
+    """Exponential backoff với full jitter: ngẫu nhiên trong [0, base * 2^attempt] (có trần)"""
+    return random.uniform(0, min(VLM_RETRY_MAX_DELAY, VLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def _post_vlm_once(api_url: str, payload: dict) -> requests.Response:
+    """Một request VLM qua HTTP client dùng chung và limiter"""
+    with get_vlm_limiter().slot() as slot:
+        response = get_http_client().post(api_url, json_body=payload, headers=VLM_HEADERS,
+                                          timeout=30, upload_kind="vlm")
+        slot.status = response.status_code
+    latency = time.monotonic() - slot.started_at
+    metrics.observe("vlm_request", latency)
+    if response.status_code == 200:
+        _latency_tracker.add(latency)
+    return response
+
+
+def _post_vlm_hedged(api_url: str, payload: dict) -> requests.Response:
+    """Gửi request; nếu quá deadline hedge chưa xong thì gửi thêm 1 bản, lấy kết quả về trước"""
+    deadline = _latency_tracker.hedge_deadline()
+    if deadline is None:
+        return _post_vlm_once(api_url, payload)
+    
+    executor = _get_hedge_executor()
+    pending = {executor.submit(_post_vlm_once, api_url, payload)}
+    done, pending = wait(pending, timeout=deadline)
+    if not done:
+        _latency_tracker.hedged()
+        pending.add(executor.submit(_post_vlm_once, api_url, payload))
+    
+    # Lấy response thành công đầu tiên; request còn lại chạy nốt ở background và bị bỏ qua.
+    # 429/5xx chỉ được trả về khi không còn request nào đang chờ (để _post_vlm retry)
+    overloaded, error = None, None
+    while True:
+        for future in done:
+            try:
+                response = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if response.status_code not in _OVERLOAD_STATUSES:
+                return response
+            overloaded = response
+        if not pending:
+            if overloaded is not None:
+                return overloaded
+            raise error
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+
+def _post_vlm(api_url: str, payload: dict) -> requests.Response:
+    """
+    POST tới VLM API; lỗi tạm thời (429/5xx, timeout, mất kết nối) được thử lại tối đa
+    max_retries lần (configure_vlm_retries) với exponential backoff + jitter.
+    
+    Returns:
+        Response cuối cùng (có thể vẫn là lỗi nếu hết số lần thử)
+    """
+    max_retries = _retry_policy["max_retries"]
+    for attempt in range(max_retries + 1):
+        try:
+            response = _post_vlm_hedged(api_url, payload)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            reason = type(e).__name__
+        else:
+            if response.status_code not in _OVERLOAD_STATUSES or attempt == max_retries:
+                return response
+            reason = f"status {response.status_code}"
+        
+        delay = _retry_delay(attempt)
+        log(f"⚠️  VLM lỗi tạm thời ({reason}), thử lại sau {delay:.1f}s "
+              f"({attempt + 1}/{max_retries})")
+        time.sleep(delay)
+
+
+# Định dạng ảnh hỗ trợ: (extension cho cv2.imencode, flag chất lượng, MIME type)
+IMAGE_FORMATS = {
+    "jpeg": ('.jpg', cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+    "webp": ('.webp', cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+}
+
+_frame_encoding = {
+    "max_side": FRAME_MAX_SIDE,
+    "format": FRAME_IMAGE_FORMAT,
+    "quality": FRAME_IMAGE_QUALITY,
+}
+
+
+def configure_frame_encoding(max_side: Optional[int] = None, image_format: Optional[str] = None,
+                             quality: Optional[int] = None) -> dict:
+    """
+    Đổi cách tiền xử lý frame trước khi gửi VLM (tham số None = giữ nguyên).
+    
+    Args:
+        max_side: Cạnh dài tối đa (px, 0 = giữ nguyên kích thước)
+        image_format: "jpeg" hoặc "webp"
+        quality: Chất lượng nén (1-100)
+    
+    Returns:
+        Thiết lập hiện tại
+    """
+    if image_format is not None and image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Định dạng ảnh không hợp lệ: {image_format} "
+                         f"(hỗ trợ: {', '.join(IMAGE_FORMATS)})")
+    if max_side is not None:
+        _frame_encoding["max_side"] = max_side
+    if image_format is not None:
+        _frame_encoding["format"] = image_format
+    if quality is not None:
+        _frame_encoding["quality"] = quality
+    return frame_encoding()
+
+
+def frame_encoding() -> dict:
+    """Thiết lập tiền xử lý frame hiện tại (max_side, format, quality)"""
+    return dict(_frame_encoding)
+
+
+def resize_frame(frame, max_side: int):
+    """Thu nhỏ frame để cạnh dài nhất <= max_side (giữ tỷ lệ, không phóng to)"""
+    height, width = frame.shape[:2]
+    longest = max(height, width)
+    if not max_side or longest <= max_side:
+        return frame
+    scale = max_side / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+
+def encode_frame(frame) -> bytes:
+    """Thu nhỏ frame (numpy array) theo max_side rồi encode thành bytes JPEG/WebP"""
+    if isinstance(frame, EncodedFrame):
+        return frame.data
+    extension, quality_flag, _ = IMAGE_FORMATS[_frame_encoding["format"]]
+    with metrics.timed("encode"):
+        frame = resize_frame(frame, _frame_encoding["max_side"])
+        ok, buffer = cv2.imencode(extension, frame, [quality_flag, int(_frame_encoding["quality"])])
+    if not ok:
+        raise ValueError(f"Không thể encode frame sang {_frame_encoding['format']}")
+    return buffer.tobytes()
+
+
+def _image_data_url(base64_image: str) -> str:
+    """Data URL của ảnh đã encode theo định dạng hiện tại"""
+    return f"data:{IMAGE_FORMATS[_frame_encoding['format']][2]};base64,{base64_image}"
+
+
+def _to_base64(data: bytes) -> str:
+    with metrics.timed("base64"):
+        return base64.b64encode(data).decode('utf-8')
+
 
 def frame_to_base64(frame) -> str:
     """Chuyển frame (numpy array) thành base64 string"""
-    _, buffer = cv2.imencode('.jpg', frame)
-    return base64.b64encode(buffer).decode('utf-8')
+    return _to_base64(encode_frame(frame))
+
+
+def _cache_lookup(kind: str, prompt: str, content: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Tra cache kết quả trước khi gọi VLM.
+    
+    Returns:
+        (cache key, kết quả đã cache hoặc None); key là None khi cache bị tắt
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return None, None
+    key = make_key(kind, VLM_MODEL_NAME, prompt, content)
+    return key, cache.get(key)
+
+
+def _cache_store(key: Optional[str], answer: str):
+    """Lưu kết quả vào cache (chỉ lưu câu trả lời Yes/No hợp lệ)"""
+    cache = get_result_cache()
+    if cache is not None and key is not None and answer.lower().startswith(('yes', 'no')):
+        cache.set(key, answer)
+
 
+def _cache_store_all(entries: Iterable[Tuple[Optional[str], str]]):
+    """_cache_store cho nhiều kết quả (một lần chuyển sang thread pool ở bản async)"""
+    for key, answer in entries:
+        _cache_store(key, answer)
 
-def transcribe_audio(audio_path: str, api_url: str = TRANSCRIBE_API_URL) -> str:
+
+def _split_cached_frames(frame_indices: Sequence[int], jpegs: Sequence[bytes]):
+    """
+    Tách các frames của một batch thành frames đã có trong cache và frames cần gửi.
+    
+    Returns:
+        (results {frame_index: kết quả cache}, keys {frame_index: cache key},
+         pending [(frame_index, jpeg)] cần gửi VLM)
+    """
+    results, keys, pending = {}, {}, []
+    for frame_index, jpeg in zip(frame_indices, jpegs):
+        key, cached = _cache_lookup("frame_batch", BATCH_IMAGE_PROMPT_TEMPLATE, jpeg)
+        keys[frame_index] = key
+        if cached is not None:
+            log(f"Frame {frame_index}: {cached} (cache)")
+            metrics.frames("cached")
+            results[frame_index] = cached
+        else:
+            pending.append((frame_index, jpeg))
+    return results, keys, pending
+
+
+def _record_details(details: Optional[Dict[int, dict]], frame_indices: Iterable[int],
+                    raw_answer: Optional[str], latency: Optional[float] = None, source: str = "vlm"):
+    """Ghi câu trả lời gốc, độ trễ request và nguồn kết quả của các frames vào details (nếu có)"""
+    if details is not None:
+        for frame_index in frame_indices:
+            details[frame_index] = {"raw_answer": raw_answer, "latency": latency, "source": source}
+
+
+def _text_payload(text: str) -> dict:
+    """Payload chat completion kiểm tra text"""
+    return {
+        "model": VLM_MODEL_NAME,
+        "messages": [
+            {
+                "role": "user",
+                "content": TEXT_PROMPT_TEMPLATE.format(transcript=text)
+            }
+        ],
+        "temperature": 0.1,
+        "max_tokens": 1500
+    }
+
+
+def split_text_windows(text: str, window_words: int = TEXT_WINDOW_WORDS,
+                       overlap_words: int = TEXT_WINDOW_OVERLAP_WORDS) -> List[str]:
     """
-    Gửi audio file đến API transcribe để lấy text.
+    Chia text thành các cửa sổ tối đa window_words từ, 2 cửa sổ liền nhau chung
+    overlap_words từ (câu vi phạm nằm ở ranh giới vẫn trọn vẹn trong 1 cửa sổ).
+    
+    Returns:
+        List cửa sổ theo thứ tự; text ngắn → [text] nguyên bản
+    """
+    words = text.split()
+    if window_words <= 0 or len(words) <= window_words:
+        return [text]
+    step = max(1, window_words - overlap_words)
+    windows = []
+    for start in range(0, len(words), step):
+        windows.append(" ".join(words[start:start + window_words]))
+        if start + window_words >= len(words):
+            break
+    return windows
+
+
+def _merge_text_results(results: Sequence[str]) -> str:
+    """Gộp kết quả các cửa sổ ("Yes" nếu có cửa sổ vi phạm, "Error" nếu có cửa sổ lỗi, còn lại "No")"""
+    for result in results:
+        if result.lower().startswith('yes'):
+            return result
+    if any(not result.lower().startswith('no') for result in results):
+        return "Error"
+    return "No"
+
+
+def _frame_payload(base64_image: str) -> dict:
+    """Payload chat completion kiểm tra một frame"""
+    return {
+        "model": VLM_MODEL_NAME,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": IMAGE_PROMPT_TEMPLATE},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": _image_data_url(base64_image)
+                        }
+                    }
+                ]
+            }
+        ],
+        "temperature": 0.1,
+        "max_tokens": 1500
+    }
+
+
+def _frames_batch_payload(base64_images: Sequence[str]) -> dict:
+    """Payload chat completion kiểm tra nhiều frames, mỗi ảnh có nhãn "Image n:" đứng trước"""
+    content = [{"type": "text", "text": BATCH_IMAGE_PROMPT_TEMPLATE.format(count=len(base64_images))}]
+    for n, base64_image in enumerate(base64_images, 1):
+        content.append({"type": "text", "text": f"Image {n}:"})
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": _image_data_url(base64_image)
+            }
+        })
+    
+    return {
+        "model": VLM_MODEL_NAME,
+        "messages": [
+            {
+                "role": "user",
+                "content": content
+            }
+        ],
+        "temperature": 0.1,
+        "max_tokens": 1500
+    }
+
+
+_BATCH_ANSWER_RE = re.compile(r'image\s*#?\s*(\d+)\W*?(yes|no)\b', re.IGNORECASE)
+
+
+def parse_batch_answer(answer: str, count: int) -> List[str]:
+    """
+    Tách câu trả lời batch ("Image 1: Yes", "Image 2: No", ...) thành kết quả từng ảnh.
     
     Args:
-        audio_path: Đường dẫn đến file audio
+        answer: Nội dung trả lời của VLM
+        count: Số ảnh trong batch
+    
+    Returns:
+        List count phần tử "Yes"/"No" theo thứ tự ảnh; ảnh không có câu trả lời là "Error"
+    """
+    verdicts = ["Error"] * count
+    for match in _BATCH_ANSWER_RE.finditer(answer):
+        n = int(match.group(1))
+        if 1 <= n <= count and verdicts[n - 1] == "Error":
+            verdicts[n - 1] = match.group(2).capitalize()
+    
+    if all(v == "Error" for v in verdicts):
+        # Model bỏ nhãn "Image n": chấp nhận khi có đúng count dòng Yes/No theo thứ tự
+        lines = [line.strip().lower() for line in answer.splitlines() if line.strip()]
+        if len(lines) == count and all(line.startswith(('yes', 'no')) for line in lines):
+            verdicts = ["Yes" if line.startswith('yes') else "No" for line in lines]
+    
+    return verdicts
+
+
+def _answer_from_result(result: dict) -> str:
+    """Lấy nội dung trả lời từ response chat completion"""
+    return result.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
+
+
+def _transcript_from_result(result: dict) -> Optional[str]:
+    """Lấy transcript từ response API transcribe (None nếu success=false)"""
+    # API trả về dạng {"success": true, "text": "...", "filename": "..."}
+    if result.get('success', False):
+        transcript = result.get('text', '')
+        log("Text: ", transcript)
+        filename = result.get('filename', '')
+        log(f"Transcribe thành công. File: {filename}, Text length: {len(transcript)} characters")
+        return transcript
+    else:
+        log(f"API trả về success=false: {result}")
+        return None
+
+
+_transcribe_settings = {
+    "chunk_seconds": TRANSCRIBE_CHUNK_SECONDS,
+    "max_parallel": TRANSCRIBE_MAX_PARALLEL,
+    "max_retries": TRANSCRIBE_MAX_RETRIES,
+}
+
+
+def configure_transcription(chunk_seconds: Optional[float] = None, max_parallel: Optional[int] = None,
+                            max_retries: Optional[int] = None) -> dict:
+    """
+    Đổi cách transcribe (tham số None = giữ nguyên).
+    
+    Args:
+        chunk_seconds: Độ dài tối đa mỗi chunk (giây, 0 = gửi nguyên file)
+        max_parallel: Số chunk transcribe đồng thời
+        max_retries: Số lần thử lại mỗi request lỗi
+    
+    Returns:
+        Thiết lập hiện tại
+    """
+    if chunk_seconds is not None:
+        _transcribe_settings["chunk_seconds"] = chunk_seconds
+    if max_parallel is not None:
+        _transcribe_settings["max_parallel"] = max(1, max_parallel)
+    if max_retries is not None:
+        _transcribe_settings["max_retries"] = max(0, max_retries)
+    return dict(_transcribe_settings)
+
+
+def transcription_settings() -> dict:
+    """Thiết lập transcribe hiện tại"""
+    return dict(_transcribe_settings)
+
+
+def transcribe_audio(audio: Union[str, bytes], api_url: str = TRANSCRIBE_API_URL,
+                     filename: str = "audio.wav") -> str:
+    """
+    Gửi audio đến API transcribe để lấy text (thử lại khi lỗi, tối đa max_retries lần).
+    
+    Args:
+        audio: Đường dẫn đến file audio, hoặc nội dung WAV (bytes, ví dụ từ extract_audio_bytes)
         api_url: URL của API transcribe
+        filename: Tên file gửi kèm khi audio là bytes
     
     Returns:
-        Text transcript từ audio
+        Text transcript từ audio ("" nếu vẫn lỗi sau khi thử lại)
     """
+    return _transcribe_with_retries(audio, api_url, filename) or ""
+
+
+def _transcribe_with_retries(audio: Union[str, bytes], api_url: str, filename: str) -> Optional[str]:
+    """Như transcribe_audio nhưng trả về None khi vẫn lỗi (phân biệt với audio không có lời)"""
+    max_retries = _transcribe_settings["max_retries"]
+    for attempt in range(max_retries + 1):
+        if attempt:
+            delay = _retry_delay(attempt)
+            log(f"🔁 Thử lại transcribe {filename} lần {attempt} sau {delay:.1f}s")
+            time.sleep(delay)
+        transcript = _transcribe_once(audio, api_url, filename)
+        if transcript is not None:
+            return transcript
+    return None
+
+
+def _transcribe_once(audio: Union[str, bytes], api_url: str, filename: str) -> Optional[str]:
+    """Một request transcribe; None nếu lỗi có thể thử lại"""
     try:
-        with open(audio_path, 'rb') as audio_file:
-            files = {'file': (os.path.basename(audio_path), audio_file, 'audio/wav')}
-            
-            response = requests.post(api_url, files=files, timeout=60)
-            
-            if response.status_code == 200:
-                result = response.json()
-                # API trả về dạng {"success": true, "text": "...", "filename": "..."}
-                if result.get('success', False):
-                    transcript = result.get('text', '')
-                    print("Text: ", transcript)
-                    filename = result.get('filename', '')
-                    print(f"Transcribe thành công. File: {filename}, Text length: {len(transcript)} characters")
-                    return transcript
-                else:
-                    print(f"API trả về success=false: {result}")
-                    return ""
+        with metrics.timed("transcribe_request"):
+            if isinstance(audio, bytes):
+                files = {'file': (filename, audio, 'audio/wav')}
+                response = get_http_client().post(api_url, files=files, timeout=60,
+                                                  upload_kind="transcribe")
             else:
-                print(f"Lỗi API transcribe - Status {response.status_code}: {response.text}")
-                return ""
-                
+                with open(audio, 'rb') as audio_file:
+                    files = {'file': (os.path.basename(audio), audio_file, 'audio/wav')}
+                    
+                    response = get_http_client().post(api_url, files=files, timeout=60,
+                                                      upload_kind="transcribe")
+        
+        if response.status_code == 200:
+            return _transcript_from_result(response.json())
+        else:
+            log(f"Lỗi API transcribe - Status {response.status_code}: {response.text}")
+            return None
+    
     except FileNotFoundError:
-        print(f"Không tìm thấy file audio: {audio_path}")
+        log(f"Không tìm thấy file audio: {audio}")
         return ""
     except Exception as e:
-        print(f"Lỗi khi transcribe audio: {str(e)}")
-        return ""
+        log(f"Lỗi khi transcribe audio: {str(e)}")
+        return None
+
+
+def _audio_chunks(audio: Union[str, bytes], filename: str) -> Optional[List[Tuple[str, bytes]]]:
+    """
+    Chia audio dài thành các chunk (tên file, WAV) theo chunk_seconds;
+    None nếu audio đủ ngắn để gửi nguyên file (hoặc không đọc được dạng WAV).
+    """
+    chunk_seconds = _transcribe_settings["chunk_seconds"]
+    if not chunk_seconds:
+        return None
+    try:
+        chunks = split_wav(audio, chunk_seconds)
+    except Exception as e:
+        log(f"⚠️  Không chia được audio, transcribe nguyên file: {str(e)}")
+        return None
+    if len(chunks) <= 1:
+        return None
+    stem = os.path.splitext(filename if isinstance(audio, bytes) else os.path.basename(audio))[0]
+    return [(f"{stem}_part{i:03d}.wav", chunk) for i, chunk in enumerate(chunks)]
+
+
+def _join_transcripts(parts: List[Optional[str]]) -> Optional[str]:
+    """
+    Ghép transcript các chunk theo thứ tự (bỏ chunk rỗng). None nếu có chunk vẫn lỗi sau
+    khi thử lại: thiếu 1 đoạn text có thể làm sai kết luận, nên coi cả audio là lỗi.
+    """
+    failed = sum(1 for part in parts if part is None)
+    if failed:
+        log(f"❌ {failed}/{len(parts)} chunk transcribe lỗi sau khi thử lại")
+        return None
+    return " ".join(part.strip() for part in parts if part.strip())
+
+
+def transcribe_audio_chunked(audio: Union[str, bytes], api_url: str = TRANSCRIBE_API_URL,
+                             filename: str = "audio.wav") -> Optional[str]:
+    """
+    Transcribe audio dài: chia tại khoảng lặng thành các chunk <= chunk_seconds, gửi song song
+    (tối đa max_parallel) rồi ghép transcript theo thứ tự. Mỗi chunk được thử lại riêng;
+    còn chunk nào vẫn lỗi thì cả audio coi như lỗi. Audio ngắn → như transcribe_audio.
+    
+    Args:
+        audio: Đường dẫn file WAV hoặc nội dung WAV (bytes)
+        api_url: URL của API transcribe
+        filename: Tên file gửi kèm khi audio là bytes
+    
+    Returns:
+        Text transcript từ audio, None nếu transcribe (hoặc 1 chunk bất kỳ) vẫn lỗi sau khi thử lại
+    """
+    chunks = _audio_chunks(audio, filename)
+    if chunks is None:
+        return _transcribe_with_retries(audio, api_url, filename)
+    
+    log(f"Chia audio thành {len(chunks)} chunk, transcribe song song...")
+    with ThreadPoolExecutor(max_workers=min(len(chunks), _transcribe_settings["max_parallel"])) as executor:
+        parts = list(executor.map(
+            lambda chunk: _transcribe_with_retries(chunk[1], api_url, chunk[0]), chunks
+        ))
+    return _join_transcripts(parts)
 
 
 def check_text_vlm(text: str, api_url: str = VLM_API_URL) -> str:
     """
     Gửi text đến VLM API để kiểm tra vi phạm.
     
+    Text dài được chia thành các cửa sổ chồng lấn (split_text_windows) kiểm tra song song;
+    cửa sổ đầu tiên trả về "Yes" quyết định kết quả, các cửa sổ chưa gửi bị hủy.
+    Kết quả mỗi cửa sổ được cache theo hash nội dung cửa sổ.
+    
     Args:
         text: Text cần kiểm tra
         api_url: URL của VLM API
@@ -69,41 +923,57 @@ def check_text_vlm(text: str, api_url: str = VLM_API_URL) -> str:
         "Yes" hoặc "No" hoặc "Error"
     """
     if not text or not text.strip():
-        print("Text rỗng, trả về No")
+        log("Text rỗng, trả về No")
         return "No"
     
+    windows = split_text_windows(text)
+    if len(windows) == 1:
+        return _check_text_window(text, api_url)
+    
+    log(f"Text dài ({len(text.split())} từ) → kiểm tra {len(windows)} cửa sổ song song")
+    results = []
+    executor = ThreadPoolExecutor(max_workers=min(len(windows), TEXT_MAX_PARALLEL))
+    try:
+        futures = [executor.submit(_check_text_window, window, api_url) for window in windows]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result.lower().startswith('yes'):
+                log("⏩ Có cửa sổ vi phạm, bỏ qua các cửa sổ còn lại")
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return _merge_text_results(results)
+
+
+def _check_text_window(text: str, api_url: str) -> str:
+    """Kiểm tra 1 đoạn text qua VLM (có cache)"""
+    key, cached = _cache_lookup("text", TEXT_PROMPT_TEMPLATE, text.encode('utf-8'))
+    if cached is not None:
+        log(f"Text check result (cache): {cached}")
+        return cached
+    
     try:
-        prompt = TEXT_PROMPT_TEMPLATE.format(transcript=text)
-        
-        payload = {
-            "model": VLM_MODEL_NAME,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.1,
-            "max_tokens": 1500
-        }
-        
-        response = requests.post(api_url, headers=VLM_HEADERS, json=payload, timeout=30)
+        payload = _text_payload(text)
+        
+        response = _post_vlm(api_url, payload)
         
         if response.status_code == 200:
-            result = response.json()
-            answer = result.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
-            print(f"Text check result: {answer}")
+            answer = _answer_from_result(response.json())
+            log(f"Text check result: {answer}")
+            _cache_store(key, answer)
             return answer
         else:
-            print(f"Lỗi VLM API (text) - Status {response.status_code}: {response.text}")
+            log(f"Lỗi VLM API (text) - Status {response.status_code}: {response.text}")
             return "Error"
             
     except Exception as e:
-        print(f"Lỗi khi kiểm tra text: {str(e)}")
+        log(f"Lỗi khi kiểm tra text: {str(e)}")
         return "Error"
 
 
-def check_frame_vlm(frame, frame_index: int, api_url: str = VLM_API_URL) -> Tuple[int, str]:
+def check_frame_vlm(frame, frame_index: int, api_url: str = VLM_API_URL,
+                    details: Optional[Dict[int, dict]] = None) -> Tuple[int, str]:
     """
     Gửi frame đến VLM API để kiểm tra vi phạm.
     
@@ -111,6 +981,7 @@ def check_frame_vlm(frame, frame_index: int, api_url: str = VLM_API_URL) -> Tupl
         frame: Frame (numpy array) hoặc đường dẫn ảnh
         frame_index: Index của frame
         api_url: URL của VLM API
+        details: Dict (nếu có) được điền {frame_index: {"raw_answer", "latency", "source"}}
     
     Returns:
         Tuple (frame_index, result) với result là "Yes", "No", hoặc "Error"
@@ -120,43 +991,520 @@ def check_frame_vlm(frame, frame_index: int, api_url: str = VLM_API_URL) -> Tupl
         if isinstance(frame, str):
             frame = cv2.imread(frame)
             if frame is None:
-                print(f"Frame {frame_index}: Không thể đọc ảnh")
+                log(f"Frame {frame_index}: Không thể đọc ảnh")
                 return (frame_index, "Error")
         
-        base64_image = frame_to_base64(frame)
-        
-        payload = {
-            "model": VLM_MODEL_NAME,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": IMAGE_PROMPT_TEMPLATE},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            "temperature": 0.1,
-            "max_tokens": 1500
-        }
+        jpeg = encode_frame(frame)
+        
+        # Cùng nội dung frame (intro, end card, logo...) đã được kiểm tra → dùng lại kết quả
+        key, cached = _cache_lookup("frame", IMAGE_PROMPT_TEMPLATE, jpeg)
+        if cached is not None:
+            log(f"Frame {frame_index}: {cached} (cache)")
+            metrics.frames("cached")
+            _record_details(details, [frame_index], cached, source="cache")
+            return (frame_index, cached)
+        
+        base64_image = _to_base64(jpeg)
+        
+        payload = _frame_payload(base64_image)
         
-        response = requests.post(api_url, headers=VLM_HEADERS, json=payload, timeout=30)
+        metrics.frames("sent")
+        start = time.perf_counter()
+        response = _post_vlm(api_url, payload)
+        latency = time.perf_counter() - start
         
         if response.status_code == 200:
-            result = response.json()
-            answer = result.get('choices', [{}])[0].get('message', {}).get('content', '').strip()
-            print(f"Frame {frame_index}: {answer}")
+            answer = _answer_from_result(response.json())
+            log(f"Frame {frame_index}: {answer}")
+            _record_details(details, [frame_index], answer, latency)
+            _cache_store(key, answer)
             return (frame_index, answer)
         else:
-            print(f"Frame {frame_index}: Lỗi VLM API - Status {response.status_code}")
+            log(f"Frame {frame_index}: Lỗi VLM API - Status {response.status_code}")
+            _record_details(details, [frame_index], None, latency)
             return (frame_index, "Error")
             
     except Exception as e:
-        print(f"Frame {frame_index}: Lỗi - {str(e)}")
+        log(f"Frame {frame_index}: Lỗi - {str(e)}")
+        return (frame_index, "Error")
+
+
+def check_frames_batch_vlm(frames: Sequence, frame_indices: Sequence[int],
+                           api_url: str = VLM_API_URL,
+                           details: Optional[Dict[int, dict]] = None) -> List[Tuple[int, str]]:
+    """
+    Gửi nhiều frames trong một request VLM (giảm số request và số token prompt).
+    
+    Args:
+        frames: Các frames (numpy array) hoặc đường dẫn ảnh
+        frame_indices: Index tương ứng của từng frame
+        api_url: URL của VLM API
+        details: Như check_frame_vlm; frames gửi chung nhận cùng câu trả lời gốc và độ trễ
+    
+    Returns:
+        List (frame_index, result) theo thứ tự frames, result là "Yes", "No", hoặc "Error"
+    """
+    if len(frames) == 1:
+        return [check_frame_vlm(frames[0], frame_indices[0], api_url, details)]
+    
+    try:
+        jpegs = []
+        for frame, frame_index in zip(frames, frame_indices):
+            if isinstance(frame, str):
+                frame = cv2.imread(frame)
+                if frame is None:
+                    log(f"Frame {frame_index}: Không thể đọc ảnh")
+                    return [(i, "Error") for i in frame_indices]
+            jpegs.append(encode_frame(frame))
+        
+        # Chỉ gửi các frames chưa có trong cache
+        results, keys, pending = _split_cached_frames(frame_indices, jpegs)
+        for frame_index, cached in results.items():
+            _record_details(details, [frame_index], cached, source="cache")
+        
+        if pending:
+            payload = _frames_batch_payload([_to_base64(jpeg) for _, jpeg in pending])
+            pending_indices = [i for i, _ in pending]
+            
+            metrics.frames("sent", len(pending))
+            start = time.perf_counter()
+            response = _post_vlm(api_url, payload)
+            latency = time.perf_counter() - start
+            
+            if response.status_code == 200:
+                answer = _answer_from_result(response.json())
+                _record_details(details, pending_indices, answer, latency)
+                for frame_index, result in _batch_results(pending_indices, answer):
+                    results[frame_index] = result
+                    _cache_store(keys[frame_index], result)
+            else:
+                log(f"Frames {pending_indices}: Lỗi VLM API - Status {response.status_code}")
+                _record_details(details, pending_indices, None, latency)
+                results.update((i, "Error") for i in pending_indices)
+        
+        return [(i, results[i]) for i in frame_indices]
+    
+    except Exception as e:
+        log(f"Frames {list(frame_indices)}: Lỗi - {str(e)}")
+        return [(i, "Error") for i in frame_indices]
+
+
+def _batch_results(frame_indices: Sequence[int], answer: str) -> List[Tuple[int, str]]:
+    """Ghép câu trả lời batch với frame index, in kết quả từng frame"""
+    results = list(zip(frame_indices, parse_batch_answer(answer, len(frame_indices))))
+    for frame_index, result in results:
+        log(f"Frame {frame_index}: {result}")
+    if any(result == "Error" for _, result in results):
+        log(f"Frames {list(frame_indices)}: Không parse được đủ câu trả lời batch: {answer!r}")
+    return results
+
+
+# ===========================
+# ASYNC (aiohttp)
+# ===========================
+
+class AsyncHttpClient:
+    """
+    Bản async của HttpClient: một aiohttp.ClientSession với connection pool keep-alive.
+    Dùng làm async context manager trong event loop sẽ chạy các request.
+    """
+    
+    def __init__(self, pool_size: int = DEFAULT_HTTP_POOL_SIZE,
+                 compress: bool = HTTP_COMPRESS_REQUESTS):
+        if aiohttp is None:
+            raise ImportError("Cần cài aiohttp để dùng các hàm async: pip install aiohttp")
+        self.pool_size = pool_size
+        self.compress = compress
+        self.session = None
+    
+    async def __aenter__(self) -> "AsyncHttpClient":
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+    
+    async def post(self, url: str, json_body=None, headers: Optional[dict] = None,
+                   timeout: float = 30, data=None,
+                   upload_kind: Optional[str] = None) -> Tuple[int, str]:
+        """
+        POST qua connection pool, trả về (status_code, response text).
+        upload_kind: như HttpClient.post (chỉ đếm được khi body là bytes, không đếm FormData)
+        """
+        headers = dict(headers or {})
+        if json_body is not None:
+            headers['Content-Type'] = 'application/json'
+            data = json.dumps(json_body).encode('utf-8')
+            if self.compress:
+                headers['Content-Encoding'] = 'gzip'
+                data = gzip.compress(data, compresslevel=5)
+        if upload_kind is not None and isinstance(data, bytes):
+            metrics.uploaded(upload_kind, len(data))
+        
+        async with self.session.post(url, data=data, headers=headers,
+                                     timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            return response.status, await response.text()
+
+
+async def _post_vlm_once_async(client: AsyncHttpClient, api_url: str, payload: dict) -> Tuple[int, str]:
+    """Bản async của _post_vlm_once"""
+    async with get_vlm_limiter().async_slot() as slot:
+        status, body = await client.post(api_url, json_body=payload, headers=VLM_HEADERS, timeout=30,
+                                         upload_kind="vlm")
+        slot.status = status
+    latency = time.monotonic() - slot.started_at
+    metrics.observe("vlm_request", latency)
+    if status == 200:
+        _latency_tracker.add(latency)
+    return status, body
+
+
+async def _post_vlm_hedged_async(client: AsyncHttpClient, api_url: str,
+                                 payload: dict) -> Tuple[int, str]:
+    """Bản async của _post_vlm_hedged: request thua bị cancel"""
+    deadline = _latency_tracker.hedge_deadline()
+    if deadline is None:
+        return await _post_vlm_once_async(client, api_url, payload)
+    
+    pending = {asyncio.ensure_future(_post_vlm_once_async(client, api_url, payload))}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=deadline)
+        if not done:
+            _latency_tracker.hedged()
+            pending.add(asyncio.ensure_future(_post_vlm_once_async(client, api_url, payload)))
+        
+        overloaded, error = None, None
+        while True:
+            for task in done:
+                try:
+                    status, body = task.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if status not in _OVERLOAD_STATUSES:
+                    return status, body
+                overloaded = status, body
+            if not pending:
+                if overloaded is not None:
+                    return overloaded
+                raise error
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _post_vlm_async(client: AsyncHttpClient, api_url: str, payload: dict) -> Tuple[int, str]:
+    """Bản async của _post_vlm (retry + hedge)"""
+    max_retries = _retry_policy["max_retries"]
+    for attempt in range(max_retries + 1):
+        try:
+            status, body = await _post_vlm_hedged_async(client, api_url, payload)
+        except (asyncio.TimeoutError, aiohttp.ClientConnectionError) as e:
+            if attempt == max_retries:
+                raise
+            reason = type(e).__name__
+        else:
+            if status not in _OVERLOAD_STATUSES or attempt == max_retries:
+                return status, body
+            reason = f"status {status}"
+        
+        delay = _retry_delay(attempt)
+        log(f"⚠️  VLM lỗi tạm thời ({reason}), thử lại sau {delay:.1f}s "
+              f"({attempt + 1}/{max_retries})")
+        await asyncio.sleep(delay)
+
+
+async def transcribe_audio_async(audio: Union[str, bytes], api_url: str = TRANSCRIBE_API_URL,
+                                 client: Optional[AsyncHttpClient] = None,
+                                 filename: str = "audio.wav") -> str:
+    """
+    Bản async của transcribe_audio.
+    
+    Args:
+        audio: Đường dẫn đến file audio hoặc nội dung WAV (bytes)
+        api_url: URL của API transcribe
+        client: AsyncHttpClient dùng chung (None → tạo client tạm)
+        filename: Tên file gửi kèm khi audio là bytes
+    
+    Returns:
+        Text transcript từ audio ("" nếu vẫn lỗi sau khi thử lại)
+    """
+    if client is None:
+        async with AsyncHttpClient() as client:
+            return await transcribe_audio_async(audio, api_url, client, filename)
+    return await _transcribe_with_retries_async(audio, api_url, client, filename) or ""
+
+
+async def _transcribe_with_retries_async(audio: Union[str, bytes], api_url: str,
+                                         client: AsyncHttpClient, filename: str) -> Optional[str]:
+    """Bản async của _transcribe_with_retries"""
+    max_retries = _transcribe_settings["max_retries"]
+    for attempt in range(max_retries + 1):
+        if attempt:
+            delay = _retry_delay(attempt)
+            log(f"🔁 Thử lại transcribe {filename} lần {attempt} sau {delay:.1f}s")
+            await asyncio.sleep(delay)
+        transcript = await _transcribe_once_async(audio, api_url, client, filename)
+        if transcript is not None:
+            return transcript
+    return None
+
+
+async def _transcribe_once_async(audio: Union[str, bytes], api_url: str, client: AsyncHttpClient,
+                                 filename: str) -> Optional[str]:
+    """Bản async của _transcribe_once"""
+    try:
+        if isinstance(audio, bytes):
+            audio_bytes = audio
+        else:
+            audio_bytes = await asyncio.to_thread(_read_file, audio)
+            filename = os.path.basename(audio)
+        
+        form = aiohttp.FormData()
+        form.add_field('file', audio_bytes, filename=filename, content_type='audio/wav')
+        
+        # FormData không biết trước kích thước: đếm phần audio (chiếm gần hết body)
+        metrics.uploaded("transcribe", len(audio_bytes))
+        with metrics.timed("transcribe_request"):
+            status, text = await client.post(api_url, data=form, timeout=60)
+        
+        if status == 200:
+            return _transcript_from_result(json.loads(text))
+        else:
+            log(f"Lỗi API transcribe - Status {status}: {text}")
+            return None
+    
+    except FileNotFoundError:
+        log(f"Không tìm thấy file audio: {audio}")
+        return ""
+    except Exception as e:
+        log(f"Lỗi khi transcribe audio: {str(e)}")
+        return None
+
+
+async def transcribe_audio_chunked_async(audio: Union[str, bytes], api_url: str = TRANSCRIBE_API_URL,
+                                         client: Optional[AsyncHttpClient] = None,
+                                         filename: str = "audio.wav",
+                                         semaphore: Optional[asyncio.Semaphore] = None) -> Optional[str]:
+    """
+    Bản async của transcribe_audio_chunked. Mỗi chunk chiếm 1 slot của semaphore (nếu có)
+    trong lúc gửi, nên số request đồng thời vẫn nằm trong giới hạn chung.
+    """
+    if client is None:
+        async with AsyncHttpClient() as client:
+            return await transcribe_audio_chunked_async(audio, api_url, client, filename, semaphore)
+    
+    chunks = await asyncio.to_thread(_audio_chunks, audio, filename)
+    if chunks is None:
+        chunks = [(filename, audio)]
+    else:
+        log(f"Chia audio thành {len(chunks)} chunk, transcribe song song...")
+    
+    limit = asyncio.Semaphore(_transcribe_settings["max_parallel"])
+    
+    async def transcribe(name, chunk):
+        async with limit:
+            if semaphore is None:
+                return await _transcribe_with_retries_async(chunk, api_url, client, name)
+            async with semaphore:
+                return await _transcribe_with_retries_async(chunk, api_url, client, name)
+    
+    parts = await asyncio.gather(*(transcribe(name, chunk) for name, chunk in chunks))
+    if len(chunks) == 1:
+        return parts[0]
+    return _join_transcripts(parts)
+
+
+async def check_text_vlm_async(text: str, api_url: str = VLM_API_URL,
+                               client: Optional[AsyncHttpClient] = None,
+                               semaphore: Optional[asyncio.Semaphore] = None) -> str:
+    """
+    Bản async của check_text_vlm. Mỗi cửa sổ chiếm 1 slot của semaphore (nếu có)
+    trong lúc gửi.
+    
+    Returns:
+        "Yes" hoặc "No" hoặc "Error"
+    """
+    if not text or not text.strip():
+        log("Text rỗng, trả về No")
+        return "No"
+    
+    if client is None:
+        async with AsyncHttpClient() as client:
+            return await check_text_vlm_async(text, api_url, client, semaphore)
+    
+    limit = asyncio.Semaphore(TEXT_MAX_PARALLEL)
+    
+    async def check(window):
+        async with limit:
+            if semaphore is None:
+                return await _check_text_window_async(window, api_url, client)
+            async with semaphore:
+                return await _check_text_window_async(window, api_url, client)
+    
+    windows = split_text_windows(text)
+    if len(windows) == 1:
+        return await check(text)
+    
+    log(f"Text dài ({len(text.split())} từ) → kiểm tra {len(windows)} cửa sổ song song")
+    results = []
+    tasks = [asyncio.ensure_future(check(window)) for window in windows]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            results.append(result)
+            if result.lower().startswith('yes'):
+                log("⏩ Có cửa sổ vi phạm, bỏ qua các cửa sổ còn lại")
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    return _merge_text_results(results)
+
+
+async def _check_text_window_async(text: str, api_url: str, client: AsyncHttpClient) -> str:
+    """Bản async của _check_text_window (truy vấn cache SQLite chạy trong thread pool)"""
+    key, cached = await asyncio.to_thread(_cache_lookup, "text", TEXT_PROMPT_TEMPLATE,
+                                          text.encode('utf-8'))
+    if cached is not None:
+        log(f"Text check result (cache): {cached}")
+        return cached
+    
+    try:
+        status, body = await _post_vlm_async(client, api_url, _text_payload(text))
+        
+        if status == 200:
+            answer = _answer_from_result(json.loads(body))
+            log(f"Text check result: {answer}")
+            await asyncio.to_thread(_cache_store, key, answer)
+            return answer
+        else:
+            log(f"Lỗi VLM API (text) - Status {status}: {body}")
+            return "Error"
+    
+    except Exception as e:
+        log(f"Lỗi khi kiểm tra text: {str(e)}")
+        return "Error"
+
+
+async def check_frame_vlm_async(frame, frame_index: int, api_url: str = VLM_API_URL,
+                                client: Optional[AsyncHttpClient] = None,
+                                details: Optional[Dict[int, dict]] = None) -> Tuple[int, str]:
+    """
+    Bản async của check_frame_vlm. Đọc ảnh và encode JPEG chạy trong thread pool
+    mặc định để không chặn event loop.
+    
+    Returns:
+        Tuple (frame_index, result) với result là "Yes", "No", hoặc "Error"
+    """
+    if client is None:
+        async with AsyncHttpClient() as client:
+            return await check_frame_vlm_async(frame, frame_index, api_url, client, details)
+    
+    try:
+        if isinstance(frame, str):
+            frame = await asyncio.to_thread(cv2.imread, frame)
+            if frame is None:
+                log(f"Frame {frame_index}: Không thể đọc ảnh")
+                return (frame_index, "Error")
+        
+        jpeg = await asyncio.to_thread(encode_frame, frame)
+        
+        key, cached = await asyncio.to_thread(_cache_lookup, "frame", IMAGE_PROMPT_TEMPLATE, jpeg)
+        if cached is not None:
+            log(f"Frame {frame_index}: {cached} (cache)")
+            metrics.frames("cached")
+            _record_details(details, [frame_index], cached, source="cache")
+            return (frame_index, cached)
+        
+        base64_image = _to_base64(jpeg)
+        
+        metrics.frames("sent")
+        start = time.perf_counter()
+        status, body = await _post_vlm_async(client, api_url, _frame_payload(base64_image))
+        latency = time.perf_counter() - start
+        
+        if status == 200:
+            answer = _answer_from_result(json.loads(body))
+            log(f"Frame {frame_index}: {answer}")
+            _record_details(details, [frame_index], answer, latency)
+            await asyncio.to_thread(_cache_store, key, answer)
+            return (frame_index, answer)
+        else:
+            log(f"Frame {frame_index}: Lỗi VLM API - Status {status}")
+            _record_details(details, [frame_index], None, latency)
+            return (frame_index, "Error")
+    
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log(f"Frame {frame_index}: Lỗi - {str(e)}")
         return (frame_index, "Error")
 
+
+async def check_frames_batch_vlm_async(frames: Sequence, frame_indices: Sequence[int],
+                                       api_url: str = VLM_API_URL,
+                                       client: Optional[AsyncHttpClient] = None,
+                                       details: Optional[Dict[int, dict]] = None) -> List[Tuple[int, str]]:
+    """
+    Bản async của check_frames_batch_vlm.
+    
+    Returns:
+        List (frame_index, result) theo thứ tự frames
+    """
+    if len(frames) == 1:
+        return [await check_frame_vlm_async(frames[0], frame_indices[0], api_url, client, details)]
+    
+    if client is None:
+        async with AsyncHttpClient() as client:
+            return await check_frames_batch_vlm_async(frames, frame_indices, api_url, client, details)
+    
+    try:
+        jpegs = []
+        for frame, frame_index in zip(frames, frame_indices):
+            if isinstance(frame, str):
+                frame = await asyncio.to_thread(cv2.imread, frame)
+                if frame is None:
+                    log(f"Frame {frame_index}: Không thể đọc ảnh")
+                    return [(i, "Error") for i in frame_indices]
+            jpegs.append(await asyncio.to_thread(encode_frame, frame))
+        
+        results, keys, pending = await asyncio.to_thread(_split_cached_frames, frame_indices, jpegs)
+        for frame_index, cached in results.items():
+            _record_details(details, [frame_index], cached, source="cache")
+        
+        if pending:
+            payload = _frames_batch_payload([_to_base64(jpeg) for _, jpeg in pending])
+            pending_indices = [i for i, _ in pending]
+            
+            metrics.frames("sent", len(pending))
+            start = time.perf_counter()
+            status, body = await _post_vlm_async(client, api_url, payload)
+            latency = time.perf_counter() - start
+            
+            if status == 200:
+                answer = _answer_from_result(json.loads(body))
+                _record_details(details, pending_indices, answer, latency)
+                batch_results = _batch_results(pending_indices, answer)
+                results.update(batch_results)
+                await asyncio.to_thread(_cache_store_all,
+                                        [(keys[frame_index], result) for frame_index, result in batch_results])
+            else:
+                log(f"Frames {pending_indices}: Lỗi VLM API - Status {status}")
+                _record_details(details, pending_indices, None, latency)
+                results.update((i, "Error") for i in pending_indices)
+        
+        return [(i, results[i]) for i in frame_indices]
+    
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log(f"Frames {list(frame_indices)}: Lỗi - {str(e)}")
+        return [(i, "Error") for i in frame_indices]
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
@@ -0,0 +1,247 @@
+import io
+import wave
+import numpy as np
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from config import (
+    VAD_ENABLED, VAD_FRAME_MS, VAD_ENERGY_MARGIN_DB, VAD_MIN_ENERGY_DB, VAD_MAX_THRESHOLD_DB,
+    VAD_MAX_ZCR, VAD_MIN_MODULATION_DB, VAD_MIN_SPECTRAL_MODULATION_DB, VAD_MAX_GAP_SECONDS, VAD_MIN_SEGMENT_SECONDS,
+    VAD_PADDING_SECONDS, VAD_MIN_SPEECH_SECONDS
+)
+
+
+AUDIO_SAMPLE_RATE = 16000
+
+# Các dải tần (Hz) dùng để tìm dao động của giọng nói khi có nhạc nền
+_VOICE_BAND_EDGES_HZ = np.linspace(300, 3400, 9)
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = AUDIO_SAMPLE_RATE) -> bytes:
+    """Ghép header WAV cho PCM 16-bit mono (header ghi qua pipe không có độ dài thật)"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def read_wav(audio: Union[str, bytes]) -> Tuple[np.ndarray, int]:
+    """
+    Đọc WAV PCM 16-bit (đường dẫn file hoặc bytes).
+    
+    Returns:
+        (samples int16 mono, sample rate); nhiều kênh được lấy trung bình
+    """
+    source = io.BytesIO(audio) if isinstance(audio, bytes) else audio
+    with wave.open(source, 'rb') as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Chỉ hỗ trợ WAV PCM 16-bit (sample width {wav.getsampwidth()})")
+        channels = wav.getnchannels()
+        sample_rate = wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples, sample_rate
+
+
+_vad_settings = {
+    "enabled": VAD_ENABLED,
+    "frame_ms": VAD_FRAME_MS,
+    "energy_margin_db": VAD_ENERGY_MARGIN_DB,
+    "min_energy_db": VAD_MIN_ENERGY_DB,
+    "max_threshold_db": VAD_MAX_THRESHOLD_DB,
+    "max_zcr": VAD_MAX_ZCR,
+    "min_modulation_db": VAD_MIN_MODULATION_DB,
+    "min_spectral_modulation_db": VAD_MIN_SPECTRAL_MODULATION_DB,
+    "max_gap_seconds": VAD_MAX_GAP_SECONDS,
+    "min_segment_seconds": VAD_MIN_SEGMENT_SECONDS,
+    "padding_seconds": VAD_PADDING_SECONDS,
+    "min_speech_seconds": VAD_MIN_SPEECH_SECONDS,
+}
+
+
+def configure_vad(enabled: Optional[bool] = None, **settings) -> dict:
+    """
+    Bật/tắt VAD hoặc đổi ngưỡng (các key như _vad_settings, tham số None = giữ nguyên).
+    
+    Returns:
+        Thiết lập hiện tại
+    """
+    if enabled is not None:
+        _vad_settings["enabled"] = enabled
+    for name, value in settings.items():
+        if name not in _vad_settings:
+            raise ValueError(f"Thiết lập VAD không hợp lệ: {name}")
+        if value is not None:
+            _vad_settings[name] = value
+    return dict(_vad_settings)
+
+
+def vad_settings() -> dict:
+    """Thiết lập VAD hiện tại (dùng cho cache key)"""
+    return dict(_vad_settings)
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """Các đoạn liên tiếp True của mask, dạng [start, end)"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def _band_modulation_db(x: np.ndarray, sample_rate: int) -> float:
+    """
+    Dao động lớn nhất (phân vị 90% - phân vị 10%, dB) của năng lượng theo thời gian trong
+    các dải tần _VOICE_BAND_EDGES_HZ, với x là các frame (n_frames, frame_len).
+    """
+    spectrum = np.abs(np.fft.rfft(x * np.hanning(x.shape[1]), axis=1)) ** 2
+    freqs = np.fft.rfftfreq(x.shape[1], 1 / sample_rate)
+    band = np.digitize(freqs, _VOICE_BAND_EDGES_HZ)
+    n_bands = len(_VOICE_BAND_EDGES_HZ) - 1
+    levels = np.stack([spectrum[:, band == i].sum(axis=1) for i in range(1, n_bands + 1)
+                       if np.any(band == i)], axis=1)
+    low, high = np.percentile(10 * np.log10(levels + 1e-10), [10, 90], axis=0)
+    return float(np.max(high - low))
+
+
+def speech_segments(samples: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    Tìm các đoạn có giọng nói bằng năng lượng và zero-crossing theo từng frame ngắn
+    (tính vector hóa trên cả track).
+    
+    Frame "có tiếng" khi năng lượng vượt ngưỡng thích nghi theo nền nhiễu và ZCR không
+    quá cao; các frame gần nhau được gộp thành đoạn. Đoạn có năng lượng gần như không
+    đổi chỉ bị loại (nhạc nền, tone) khi năng lượng trong từng dải tần giọng nói cũng
+    không đổi, để giọng đọc trên nền nhạc to hơn vẫn được giữ.
+    
+    Returns:
+        List (start, end) theo chỉ số sample, đã cộng padding và gộp chồng lấn
+    """
+    settings = _vad_settings
+    frame = max(1, int(sample_rate * settings["frame_ms"] / 1000))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+    
+    x = samples[:n_frames * frame].astype(np.float32).reshape(n_frames, frame) / 32768.0
+    energy_db = 10 * np.log10(np.mean(x * x, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(x[:, 1:]) != np.signbit(x[:, :-1]), axis=1)
+    
+    floor = np.percentile(energy_db, 10)
+    threshold = min(max(floor + settings["energy_margin_db"], settings["min_energy_db"]),
+                    settings["max_threshold_db"])
+    active = (energy_db > threshold) & (zcr <= settings["max_zcr"])
+    
+    frames_per_second = sample_rate / frame
+    max_gap = int(settings["max_gap_seconds"] * frames_per_second)
+    min_segment = int(settings["min_segment_seconds"] * frames_per_second)
+    
+    # Gộp các đoạn cách nhau bởi khoảng lặng ngắn
+    merged = []
+    for start, end in _runs(active):
+        if merged and start - merged[-1][1] <= max_gap:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    
+    padding = int(settings["padding_seconds"] * sample_rate)
+    segments = []
+    for start, end in merged:
+        if end - start < max(min_segment, 1):
+            continue
+        # Nhạc/tone: năng lượng các frame có tiếng gần như không đổi, cả tổng lẫn theo dải tần
+        voiced = energy_db[start:end][active[start:end]]
+        low, high = np.percentile(voiced, [10, 90])
+        if (high - low < settings["min_modulation_db"]
+                and _band_modulation_db(x[start:end][active[start:end]], sample_rate)
+                < settings["min_spectral_modulation_db"]):
+            continue
+        seg_start = max(0, start * frame - padding)
+        seg_end = min(len(samples), end * frame + padding)
+        if segments and seg_start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], seg_end)
+        else:
+            segments.append((seg_start, seg_end))
+    return segments
+
+
+def split_on_silence(samples: np.ndarray, sample_rate: int = AUDIO_SAMPLE_RATE,
+                     max_seconds: float = 30) -> List[Tuple[int, int]]:
+    """
+    Chia audio thành các đoạn dài tối đa max_seconds, cắt tại chỗ lặng nhất (năng lượng
+    trung bình ~200ms thấp nhất, chọn vị trí muộn nhất nếu có nhiều chỗ lặng như nhau)
+    trong nửa sau của mỗi đoạn để không cắt ngang từ.
+    
+    Returns:
+        List (start, end) theo chỉ số sample, nối tiếp nhau phủ toàn bộ audio
+    """
+    max_len = int(max_seconds * sample_rate)
+    if max_len <= 0 or len(samples) <= max_len:
+        return [(0, len(samples))]
+    
+    frame = max(1, int(sample_rate * _vad_settings["frame_ms"] / 1000))
+    n_frames = len(samples) // frame
+    x = samples[:n_frames * frame].astype(np.float32).reshape(n_frames, frame)
+    window = max(1, int(0.2 * sample_rate / frame))
+    energy = np.convolve(np.mean(x * x, axis=1), np.ones(window) / window, mode='same')
+    
+    chunks = []
+    start = 0
+    while len(samples) - start > max_len:
+        low = (start + max_len // 2) // frame
+        high = max(low + 1, (start + max_len) // frame)
+        window_energy = energy[low:high]
+        quiet = np.flatnonzero(window_energy <= window_energy.min() * 2 + 1.0)
+        cut = (low + int(quiet[-1])) * frame
+        if cut <= start:
+            cut = start + max_len
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, len(samples)))
+    return chunks
+
+
+def split_wav(audio: Union[str, bytes], max_seconds: float) -> List[bytes]:
+    """
+    Chia WAV (đường dẫn hoặc bytes) tại các khoảng lặng thành các WAV dài tối đa max_seconds.
+    
+    Returns:
+        List nội dung WAV theo thứ tự thời gian
+    """
+    samples, sample_rate = read_wav(audio)
+    return [pcm_to_wav(samples[start:end].astype('<i2').tobytes(), sample_rate)
+            for start, end in split_on_silence(samples, sample_rate, max_seconds)]
+
+
+class SpeechAudio(NamedTuple):
+    """Kết quả VAD: WAV chỉ còn các đoạn có giọng nói (None nếu không có), kèm thời lượng"""
+    wav: Optional[bytes]
+    speech_seconds: float
+    total_seconds: float
+
+
+def trim_to_speech(audio: Union[str, bytes]) -> SpeechAudio:
+    """
+    Chạy VAD trên WAV và cắt bỏ các đoạn lặng/nhạc dài.
+    
+    Args:
+        audio: Đường dẫn file WAV hoặc nội dung WAV (bytes)
+    
+    Returns:
+        SpeechAudio; wav là None khi tổng thời lượng giọng nói < VAD_MIN_SPEECH_SECONDS
+    """
+    samples, sample_rate = read_wav(audio)
+    segments = speech_segments(samples, sample_rate)
+    speech = sum(end - start for start, end in segments)
+    speech_seconds = speech / sample_rate
+    total_seconds = len(samples) / sample_rate
+    
+    if speech_seconds < _vad_settings["min_speech_seconds"]:
+        return SpeechAudio(None, speech_seconds, total_seconds)
+    if speech == len(samples):
+        wav = audio if isinstance(audio, bytes) else pcm_to_wav(samples.tobytes(), sample_rate)
+        return SpeechAudio(wav, speech_seconds, total_seconds)
+    
+    trimmed = np.concatenate([samples[start:end] for start, end in segments])
+    return SpeechAudio(pcm_to_wav(trimmed.astype('<i2').tobytes(), sample_rate), speech_seconds, total_seconds)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Benchmark các phần nóng của pipeline kiểm tra video.
+
+Ví dụ:
+  python benchmark.py frames
+  python benchmark.py frames --durations 30 120 --fps 30 60 --interval 2
+  python benchmark.py http --requests 2000 --concurrency 50
+  python benchmark.py encode --video ad.mp4 --max-sides 0 1024 768 --formats jpeg webp
+"""
+import sys
+import os
+import time
+import shutil
+import resource
+import argparse
+import tempfile
+import json
+import base64
+import statistics
+import threading
+import numpy as np
+import cv2
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from video_utils import SAMPLING_MODES, _sample_frames
+import api_client
+from api_client import HttpClient, IMAGE_FORMATS, configure_frame_encoding, encode_frame
+from cache import configure_result_cache
+
+
+# ===========================
+# HELPERS
+# ===========================
+
+def _cpu_seconds() -> float:
+    """Tổng CPU time (user + sys) của process hiện tại và các process con đã kết thúc"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _measure(fn):
+    """Chạy fn(), trả về (kết quả, wall time, CPU time)"""
+    wall_start = time.perf_counter()
+    cpu_start = _cpu_seconds()
+    result = fn()
+    return result, time.perf_counter() - wall_start, _cpu_seconds() - cpu_start
+
+
+def _print_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
+
+
+# ===========================
+# FRAME SAMPLING
+# ===========================
+
+def make_synthetic_video(path: str, duration: float, fps: float,
+                         width: int = 640, height: int = 360) -> str:
+    """Tạo video tổng hợp (gradient chuyển động + nhiễu) để decode không quá rẻ"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"Không thể tạo video: {path}")
+
+    rng = np.random.default_rng(0)
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    ys = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    noise = rng.integers(0, 32, size=(height, width, 3), dtype=np.uint8)
+
+    for i in range(int(duration * fps)):
+        base = (xs + ys + i * 3) % 256
+        frame = np.dstack([base, np.roll(base, i, axis=1), 255 - base]).astype(np.uint8)
+        writer.write(cv2.add(frame, np.roll(noise, i, axis=0)))
+
+    writer.release()
+    return path
+
+
+def bench_frames(args):
+    # "scene" lấy frames theo nội dung (không so sánh được same_frames) → chỉ đo khi chỉ định
+    modes = args.modes or [m for m in SAMPLING_MODES if m != "scene"]
+    if 'ffmpeg' in modes and shutil.which('ffmpeg') is None:
+        print("Không tìm thấy ffmpeg, bỏ qua mode ffmpeg")
+        modes.remove('ffmpeg')
+    rows = []
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for duration in args.durations:
+            for fps in args.fps:
+                video_path = os.path.join(temp_dir, f"synthetic_{duration}s_{fps}fps.mp4")
+                print(f"Tạo video {duration}s @ {fps}fps...")
+                make_synthetic_video(video_path, duration, fps)
+
+                baseline = None
+                for mode in modes:
+                    def run():
+                        return [n for n, _ in _sample_frames(video_path, args.interval, mode)]
+
+                    best = None
+                    for _ in range(args.repeat):
+                        numbers, wall, cpu = _measure(run)
+                        if best is None or wall < best[1]:
+                            best = (numbers, wall, cpu)
+
+                    numbers, wall, cpu = best
+                    if baseline is None:
+                        baseline = (numbers, wall)
+                    same = "yes" if numbers == baseline[0] else "NO"
+                    rows.append([
+                        f"{duration}s", f"{fps}", mode, len(numbers),
+                        f"{wall:.3f}", f"{cpu:.3f}", f"{baseline[1] / wall:.2f}x", same
+                    ])
+
+    print()
+    _print_table(
+        ["video", "fps", "mode", "frames", "wall(s)", "cpu(s)", "speedup", "same_frames"],
+        rows
+    )
+
+
+# ===========================
+# HTTP CLIENT
+# ===========================
+
+class _StubVLMHandler(BaseHTTPRequestHandler):
+    """Server giả lập VLM: đọc body, trả về chat completion "No" ngay lập tức"""
+    protocol_version = "HTTP/1.1"  # Cho phép keep-alive
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = json.dumps({"choices": [{"message": {"content": "No"}}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Mặc định 5 → connection reset khi nhiều kết nối mới cùng lúc
+
+
+def _run_requests(post, url: str, payload: dict, total: int, concurrency: int) -> float:
+    """Gửi total requests với concurrency threads, trả về requests/giây"""
+    def one(_):
+        response = post(url, payload)
+        response.content
+        return response.status_code
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        statuses = list(executor.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    
+    failed = sum(1 for s in statuses if s != 200)
+    if failed:
+        print(f"  {failed} requests lỗi")
+    return total / elapsed
+
+
+def bench_http(args):
+    server = _StubServer(('127.0.0.1', 0), _StubVLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    
+    payload = {
+        "model": "stub",
+        "messages": [{"role": "user", "content": "x" * (args.payload_kb * 1024)}]
+    }
+    
+    variants = [
+        ("requests.post (không pool)", lambda u, p: requests.post(u, json=p, timeout=30)),
+    ]
+    pooled = HttpClient(pool_size=args.concurrency)
+    variants.append(("HttpClient (pool + keep-alive)",
+                     lambda u, p: pooled.post(u, json_body=p, timeout=30)))
+    if args.compress:
+        compressed = HttpClient(pool_size=args.concurrency, compress=True)
+        variants.append(("HttpClient + gzip",
+                         lambda u, p: compressed.post(u, json_body=p, timeout=30)))
+    
+    rows = []
+    baseline = None
+    try:
+        for name, post in variants:
+            print(f"Đo {name}...")
+            rps = _run_requests(post, url, payload, args.requests, args.concurrency)
+            baseline = baseline or rps
+            rows.append([name, f"{rps:.0f}", f"{rps / baseline:.2f}x"])
+    finally:
+        server.shutdown()
+        pooled.close()
+    
+    print()
+    _print_table(["client", "req/s", "speedup"], rows)
+
+
+# ===========================
+# FRAME ENCODING
+# ===========================
+
+def _synthetic_frame(width: int = 3840, height: int = 2160):
+    """Frame 4K tổng hợp: gradient, vài khối màu, chữ và nhiễu nhẹ (giống ảnh quảng cáo)"""
+    xs = np.linspace(0, 255, width, dtype=np.float32)
+    ys = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (xs * 0.6 + ys * 0.4).astype(np.uint8)
+    frame = np.dstack([base, 255 - base, np.roll(base, width // 3, axis=1)])
+    for i in range(6):
+        x, y = (i * 601) % (width - 800), (i * 347) % (height - 500)
+        cv2.rectangle(frame, (x, y), (x + 700, y + 400), (40 * i, 255 - 30 * i, 120), -1)
+        cv2.putText(frame, f"SALE {i * 10}% OFF", (x + 20, y + 220), cv2.FONT_HERSHEY_SIMPLEX,
+                    4, (255, 255, 255), 8)
+    noise = np.random.default_rng(0).integers(0, 8, size=frame.shape, dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+
+def _load_frame(video_path: str):
+    """Lấy frame ở giữa video"""
+    cap = cv2.VideoCapture(video_path)
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) // 2)
+        ret, frame = cap.read()
+    finally:
+        cap.release()
+    if not ret:
+        raise RuntimeError(f"Không thể đọc frame từ video: {video_path}")
+    return frame
+
+
+def bench_encode(args):
+    frame = _load_frame(args.video) if args.video else _synthetic_frame()
+    print(f"Frame gốc: {frame.shape[1]}x{frame.shape[0]}")
+    
+    server = None
+    url = args.url
+    if url is None:
+        server = _StubServer(('127.0.0.1', 0), _StubVLMHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+    # Đo độ trễ thật: không dùng lại kết quả đã cache
+    configure_result_cache(enabled=False)
+    
+    rows = []
+    try:
+        for image_format in args.formats:
+            for max_side in args.max_sides:
+                for quality in args.qualities:
+                    configure_frame_encoding(max_side, image_format, quality)
+                    
+                    encode_times = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        data = encode_frame(frame)
+                        encode_times.append(time.perf_counter() - start)
+                    
+                    latencies = []
+                    for i in range(args.requests):
+                        start = time.perf_counter()
+                        api_client.check_frame_vlm(frame, i, url)
+                        latencies.append(time.perf_counter() - start)
+                    
+                    rows.append([
+                        image_format, max_side or "gốc", quality,
+                        f"{len(base64.b64encode(data)) / 1024:.0f}",
+                        f"{statistics.median(encode_times) * 1000:.1f}",
+                        f"{statistics.median(latencies) * 1000:.1f}",
+                    ])
+    finally:
+        if server is not None:
+            server.shutdown()
+    
+    print()
+    _print_table(["format", "max_side", "quality", "base64(KB)", "encode(ms)", "latency(ms)"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark pipeline kiểm tra video',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    frames_parser = subparsers.add_parser('frames', help='So sánh các mode lấy mẫu frames')
+    frames_parser.add_argument('--durations', type=float, nargs='+', default=[10, 60],
+                               help='Độ dài các video tổng hợp (giây)')
+    frames_parser.add_argument('--fps', type=float, nargs='+', default=[30, 60],
+                               help='FPS các video tổng hợp')
+    frames_parser.add_argument('--interval', type=float, default=1,
+                               help='Khoảng thời gian giữa các frames (giây)')
+    frames_parser.add_argument('--modes', nargs='+', choices=SAMPLING_MODES,
+                               help='Các mode cần đo (mặc định: tất cả, mode đầu tiên là baseline)')
+    frames_parser.add_argument('--repeat', type=int, default=1,
+                               help='Số lần chạy mỗi mode (lấy lần nhanh nhất)')
+    frames_parser.set_defaults(func=bench_frames)
+
+    http_parser = subparsers.add_parser('http', help='So sánh requests.post và HttpClient trên server giả lập')
+    http_parser.add_argument('--requests', type=int, default=2000, help='Tổng số requests')
+    http_parser.add_argument('--concurrency', type=int, default=50, help='Số threads gửi song song')
+    http_parser.add_argument('--payload-kb', type=int, default=64, help='Kích thước body mỗi request (KB)')
+    http_parser.add_argument('--compress', action='store_true', help='Đo thêm HttpClient với gzip body')
+    http_parser.set_defaults(func=bench_http)
+    
+    encode_parser = subparsers.add_parser('encode', help='So sánh kích thước / thời gian encode frame gửi VLM')
+    encode_parser.add_argument('--video', help='Lấy frame giữa video này (mặc định: frame 4K tổng hợp)')
+    encode_parser.add_argument('--max-sides', type=int, nargs='+', default=[0, 1536, 1024, 768, 512],
+                               help='Các giá trị cạnh dài tối đa (0 = giữ nguyên)')
+    encode_parser.add_argument('--formats', nargs='+', choices=list(IMAGE_FORMATS), default=list(IMAGE_FORMATS),
+                               help='Các định dạng ảnh cần đo')
+    encode_parser.add_argument('--qualities', type=int, nargs='+', default=[95, 85, 70],
+                               help='Các mức chất lượng nén')
+    encode_parser.add_argument('--repeat', type=int, default=10, help='Số lần encode mỗi thiết lập')
+    encode_parser.add_argument('--requests', type=int, default=10,
+                               help='Số lần gọi check_frame_vlm mỗi thiết lập (đo độ trễ end-to-end)')
+    encode_parser.add_argument('--url', help='VLM API thật để đo độ trễ (mặc định: server giả lập)')
+    encode_parser.set_defaults(func=bench_encode)
+    
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
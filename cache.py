@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+from config import CACHE_ENABLED, CACHE_PATH, CACHE_MAX_BYTES, CACHE_TTL_SECONDS
+
+
+# accessed_at (cho LRU) chỉ được ghi lại khi cũ hơn khoảng này: LRU không cần chính xác
+# tới từng giây, còn mỗi lần ghi + commit đều giữ lock chung của cache
+_TOUCH_INTERVAL_SECONDS = 3600
+
+
+def make_key(kind: str, model: str, prompt: str, content: bytes) -> str:
+    """
+    Tạo cache key từ loại kết quả, model, prompt và nội dung (bytes JPEG hoặc text).
+    Đổi prompt hoặc model → key khác, kết quả cũ tự động không được dùng lại.
+    """
+    prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+    content_hash = hashlib.sha256(content).hexdigest()
+    return f"{kind}:{model}:{prompt_hash}:{content_hash}"
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 của nội dung file, đọc theo từng chunk (không load cả file vào RAM)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def video_cache_key(digest: str, settings: dict) -> str:
+    """
+    Cache key cho kết quả cả video: digest nội dung file + các thiết lập ảnh hưởng tới
+    kết luận (interval, threshold, prompts, model...).
+    """
+    settings_hash = hashlib.sha256(
+        json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()[:16]
+    return f"video:{settings_hash}:{digest}"
+
+
+class ResultCache:
+    """
+    Cache kết quả VLM trên đĩa (SQLite), dùng chung được giữa các threads và process.
+    
+    Entry quá ttl_seconds bị coi là hết hạn; khi tổng dung lượng vượt max_bytes,
+    các entry lâu nhất chưa được dùng (LRU) bị xóa.
+    """
+    
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES,
+                 ttl_seconds: float = CACHE_TTL_SECONDS):
+        """
+        Args:
+            path: Đường dẫn file SQLite
+            max_bytes: Dung lượng tối đa (tổng độ dài key + value)
+            ttl_seconds: Thời gian sống của mỗi entry (giây, 0 = không hết hạn)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        # Index path → digest: file không đổi (size, mtime) thì không cần hash lại
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_index (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+    
+    def get(self, key: str) -> Optional[str]:
+        """Lấy kết quả đã cache, None nếu không có hoặc đã hết hạn"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, size, created_at, accessed_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is not None and self.ttl_seconds and now - row[2] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[1]
+                row = None
+            
+            if row is None:
+                self.misses += 1
+                return None
+            
+            if now - row[3] > _TOUCH_INTERVAL_SECONDS:
+                self._conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            self.hits += 1
+            return row[0]
+    
+    def set(self, key: str, value: str):
+        """Lưu kết quả, xóa các entry LRU nếu vượt dung lượng"""
+        now = time.time()
+        size = len(key) + len(value.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Xóa entry hết hạn rồi LRU cho tới khi còn <= 90% max_bytes (gọi khi đang giữ lock)"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM entries WHERE created_at < ?",
+                               (time.time() - self.ttl_seconds,))
+        target = self.max_bytes * 0.9
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > target:
+            # Tìm mốc accessed_at sao cho phần cũ hơn đủ để về dưới target
+            rows = self._conn.execute("SELECT accessed_at, size FROM entries ORDER BY accessed_at")
+            freed = 0
+            cutoff = None
+            for accessed_at, size in rows:
+                freed += size
+                cutoff = accessed_at
+                if total - freed <= target:
+                    break
+            self._conn.execute("DELETE FROM entries WHERE accessed_at <= ?", (cutoff,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._total_bytes = total
+    
+    def get_json(self, key: str) -> Optional[dict]:
+        """Như get() nhưng giá trị được lưu dưới dạng JSON"""
+        value = self.get(key)
+        return json.loads(value) if value is not None else None
+    
+    def set_json(self, key: str, value: dict):
+        """Như set() với giá trị là dict (lưu dạng JSON)"""
+        self.set(key, json.dumps(value, ensure_ascii=False))
+    
+    def file_digest(self, path: str) -> str:
+        """
+        Digest nội dung file, dùng lại giá trị đã tính nếu size và mtime chưa đổi,
+        nên kiểm tra lại cả folder hàng nghìn file đã thấy chỉ tốn vài os.stat().
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM file_index WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, stat.st_size, stat.st_mtime_ns)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+        
+        digest = file_digest(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_index (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, digest)
+            )
+            self._conn.commit()
+        return digest
+    
+    def stats(self) -> dict:
+        """Số lần hit/miss từ khi khởi tạo và dung lượng hiện tại"""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes": self._total_bytes,
+        }
+    
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM file_index")
+            self._conn.commit()
+            self._total_bytes = 0
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_result_cache: Optional[ResultCache] = None
+_result_cache_enabled = CACHE_ENABLED
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Cache dùng chung của process (tạo lần đầu khi cần), None nếu cache bị tắt"""
+    global _result_cache
+    if not _result_cache_enabled:
+        return None
+    if _result_cache is None:
+        with _result_cache_lock:
+            if _result_cache is None:
+                _result_cache = ResultCache()
+    return _result_cache
+
+
+def configure_result_cache(enabled: bool = True, path: Optional[str] = None,
+                           max_bytes: Optional[int] = None,
+                           ttl_seconds: Optional[float] = None) -> Optional[ResultCache]:
+    """
+    Bật/tắt hoặc đổi cấu hình cache dùng chung.
+    
+    Returns:
+        Cache mới (None nếu tắt)
+    """
+    global _result_cache, _result_cache_enabled
+    with _result_cache_lock:
+        _result_cache_enabled = enabled
+        _result_cache = None
+        if enabled:
+            _result_cache = ResultCache(
+                path or CACHE_PATH,
+                max_bytes if max_bytes is not None else CACHE_MAX_BYTES,
+                ttl_seconds if ttl_seconds is not None else CACHE_TTL_SECONDS
+            )
+    return _result_cache
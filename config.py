@@ -1,3 +1,5 @@
+import os
+
 # ===========================
 # CONFIG
 # ===========================
@@ -13,6 +15,12 @@ VLM_HEADERS = {
 
 # Transcribe API Config
 TRANSCRIBE_API_URL = "http://162.213.119.141:40396/transcribe"
+# Audio dài hơn CHUNK_SECONDS được chia tại khoảng lặng và transcribe song song (0 = gửi nguyên file)
+TRANSCRIBE_CHUNK_SECONDS = 30
+# Số chunk transcribe đồng thời cho 1 audio
+TRANSCRIBE_MAX_PARALLEL = 8
+# Số lần thử lại mỗi request transcribe lỗi (mỗi chunk thử lại riêng)
+TRANSCRIBE_MAX_RETRIES = 2
 
 # ===========================
 # PROMPT TEMPLATES
@@ -43,6 +51,30 @@ If the risk_level is *High* or *Medium*, return Yes; otherwise, return No. Do no
 """
 
 
+# Prompt cho phân tích nhiều frames trong 1 request (batch), {count} = số ảnh
+BATCH_IMAGE_PROMPT_TEMPLATE = """
+Act as a strict Meta (Facebook/Instagram) Advertising Policy compliance expert.
+
+Analyze the {count} attached images, labelled Image 1 to Image {count} in the order they appear.
+These images are intended to be used as ad creatives.
+Your task is to identify potential policy violations based on Meta's Advertising Standards.
+
+Focus specifically on the following policies:
+1. Adult Content & Sexual Suggestiveness: 
+   - Check for nudity, implied nudity, or excessive visible skin.
+   - Check for sexually suggestive poses (e.g., arching back, lying on a bed in a provocative manner).
+   - Check for images that focus unnecessarily on specific body parts (zoom-ins on skin/body).
+2. Sensational Content: Are there images that might be considered shocking, scary, or gruesome (e.g., looking through body parts)?
+3. Low Quality or Disruptive Content.
+
+Judge each image independently and assign it a risk level (No, Low, Medium, High).
+If the risk_level is *High* or *Medium*, the answer for that image is Yes; otherwise, it is No.
+
+Return exactly {count} lines, one per image, in this format and nothing else:
+Image 1: Yes
+Image 2: No
+"""
+
 # Prompt cho phân tích text (transcript từ audio)
 TEXT_PROMPT_TEMPLATE = """
 Act as a strict Meta (Facebook/Instagram) Advertising Policy compliance expert.
@@ -74,3 +106,158 @@ DEFAULT_INTERVAL_SECONDS = 1
 DEFAULT_MAX_THREADS = 50
 DEFAULT_THRESHOLD_PERCENT = 25  
 
+# Frame sampling
+# "read": decode mọi frame (cách cũ) | "grab": grab() mọi frame, chỉ retrieve() frame được chọn
+# "seek": nhảy thẳng tới frame cần lấy | "ffmpeg": pipe rawvideo từ ffmpeg (select filter)
+DEFAULT_FRAME_SAMPLING_MODE = "seek"
+# Khoảng cách (số frame) tối thiểu để seek; nhỏ hơn thì grab() tiến tới sẽ rẻ hơn decode lại từ keyframe
+DEFAULT_SEEK_MIN_GAP_FRAMES = 48
+
+# Mode "scene": lấy frame tại các điểm chuyển cảnh + 1 frame tối thiểu mỗi SCENE_FLOOR_SECONDS
+# (interval_seconds không dùng). Số frame/giây được phân tích (decode ảnh thu nhỏ để so sánh)
+SCENE_ANALYSIS_FPS = 5
+# Chênh lệch trung bình độ sáng (thang 0-255) của ảnh thu nhỏ để coi là chuyển cảnh
+SCENE_CHANGE_THRESHOLD = 12.0
+# Khoảng cách tối đa / tối thiểu giữa 2 frame được lấy (giây)
+SCENE_FLOOR_SECONDS = 5
+SCENE_MIN_GAP_SECONDS = 0.5
+# Số frames tối đa mỗi video (khoảng cách tối thiểu được nới ra theo độ dài video)
+SCENE_MAX_FRAMES = 120
+
+# Demux 1 lần: check_video_complete lấy cả audio và frames từ cùng 1 tiến trình ffmpeg
+# (áp dụng cho mọi mode trừ "scene"; frames lấy theo filter fps của ffmpeg)
+SINGLE_PASS_DEMUX = True
+# Số frames tối đa đã decode nhưng chưa được gửi đi; đầy thì ffmpeg tạm dừng (kéo theo audio),
+# nên video có nhiều frames lấy mẫu hơn số này dùng 2 lần mở video thay vì demux 1 lần
+DEMUX_MAX_BUFFERED_FRAMES = 64
+
+# Phát hiện giọng nói (VAD) trước khi transcribe: không có giọng nói → bỏ qua transcribe
+# và kiểm tra text; có thì cắt bỏ các đoạn lặng dài trước khi upload
+VAD_ENABLED = True
+# Độ dài mỗi frame phân tích năng lượng / zero-crossing (ms)
+VAD_FRAME_MS = 30
+# Frame có giọng nói khi năng lượng vượt nền nhiễu (phân vị 10%) ít nhất MARGIN dB,
+# và không thấp hơn MIN_ENERGY_DB dBFS; ngưỡng không vượt quá MAX_THRESHOLD_DB
+VAD_ENERGY_MARGIN_DB = 10
+VAD_MIN_ENERGY_DB = -50
+VAD_MAX_THRESHOLD_DB = -30
+# Tỉ lệ zero-crossing tối đa (cao hơn là nhiễu trắng/xì)
+VAD_MAX_ZCR = 0.4
+# Đoạn có năng lượng gần như không đổi (phân vị 90% - phân vị 10% < MIN_MODULATION_DB) là
+# nhạc/tone nền; giọng nói lên xuống theo âm tiết nên dao động mạnh hơn. Để thấp: bỏ sót
+# giọng nói (bỏ qua kiểm tra text) tệ hơn transcribe thừa một đoạn nhạc
+VAD_MIN_MODULATION_DB = 6
+# Đoạn có tổng năng lượng phẳng vẫn được giữ nếu năng lượng trong 1 dải tần của giọng nói
+# (300-3400 Hz) dao động từ SPECTRAL_MODULATION_DB trở lên: giọng đọc trên nền nhạc to hơn
+# không làm tổng năng lượng dao động, nhưng các hài âm của giọng vẫn lên xuống theo âm tiết
+VAD_MIN_SPECTRAL_MODULATION_DB = 12
+# Khoảng lặng ngắn hơn MAX_GAP được gộp vào đoạn nói; đoạn ngắn hơn MIN_SEGMENT bị bỏ
+VAD_MAX_GAP_SECONDS = 0.5
+VAD_MIN_SEGMENT_SECONDS = 0.25
+# Giữ thêm PADDING giây lặng ở 2 đầu mỗi đoạn nói
+VAD_PADDING_SECONDS = 0.2
+# Tổng thời lượng giọng nói tối thiểu để transcribe
+VAD_MIN_SPEECH_SECONDS = 0.5
+
+# Kiểm tra text dài: chia transcript thành các cửa sổ chồng lấn, kiểm tra song song,
+# "Yes" ở bất kỳ cửa sổ nào → "Yes" (dừng các cửa sổ còn lại). Độ dài tính theo số từ
+# (~1.3 token/từ), giữ prompt + transcript trong context và prefill ngắn
+TEXT_WINDOW_WORDS = 800
+TEXT_WINDOW_OVERLAP_WORDS = 80
+# Số cửa sổ kiểm tra đồng thời cho 1 transcript
+TEXT_MAX_PARALLEL = 8
+
+# HTTP client (dùng chung cho VLM và transcribe)
+# Kích thước connection pool, nên >= số threads kiểm tra frames
+DEFAULT_HTTP_POOL_SIZE = DEFAULT_MAX_THREADS
+# Nén gzip body JSON gửi đi (chỉ bật khi server hỗ trợ Content-Encoding: gzip cho request)
+HTTP_COMPRESS_REQUESTS = False
+
+# Giới hạn request tới VLM server, dùng chung cho kiểm tra frame và text của mọi video trong process
+# Tốc độ tối đa (request/giây, 0 = không giới hạn) và số request được gửi dồn một lúc
+VLM_RATE_LIMIT = 0
+VLM_RATE_BURST = 20
+# AIMD: tăng dần số request đồng thời khi server trả lời nhanh, giảm mạnh khi gặp
+# 429/5xx/timeout hoặc độ trễ vượt VLM_LATENCY_TARGET_SECONDS. Bắt đầu bằng số threads
+# mặc định để không tự giảm concurrency khi server chưa có dấu hiệu quá tải
+VLM_ADAPTIVE_CONCURRENCY = True
+VLM_INITIAL_CONCURRENCY = DEFAULT_MAX_THREADS
+VLM_MIN_CONCURRENCY = 2
+VLM_MAX_CONCURRENCY = 128
+VLM_LATENCY_TARGET_SECONDS = 10
+
+# Retry request VLM lỗi tạm thời (429/5xx, timeout, mất kết nối): exponential backoff + jitter
+VLM_MAX_RETRIES = 2
+VLM_RETRY_BASE_DELAY = 0.5
+VLM_RETRY_MAX_DELAY = 8
+# Hedged request: request chậm hơn VLM_HEDGE_PERCENTILE độ trễ gần đây → gửi thêm 1 request
+# giống hệt và lấy kết quả về trước; tối đa VLM_HEDGE_MAX_RATIO số request được hedge
+VLM_HEDGE_ENABLED = False
+VLM_HEDGE_PERCENTILE = 95
+VLM_HEDGE_MIN_SAMPLES = 20
+VLM_HEDGE_MAX_RATIO = 0.1
+
+# Tiền xử lý frame trước khi gửi VLM: vision encoder của model tự thu nhỏ ảnh lớn,
+# gửi ảnh 4K gốc chỉ tốn băng thông và thời gian encode
+# Cạnh dài tối đa (px, 0 = giữ nguyên kích thước)
+FRAME_MAX_SIDE = 1024
+# Định dạng ảnh gửi đi: "jpeg" hoặc "webp"
+FRAME_IMAGE_FORMAT = "jpeg"
+# Chất lượng nén (1-100)
+FRAME_IMAGE_QUALITY = 85
+
+# Số frames gửi trong 1 request VLM (1 = mỗi request 1 frame)
+DEFAULT_FRAME_BATCH_SIZE = 1
+
+# Bỏ qua frames gần trùng lặp (so sánh ảnh thu nhỏ grayscale), dùng lại kết quả của frame đại diện
+# Chênh lệch trung bình tối đa (thang 0-255) để coi 2 frames là trùng
+DEFAULT_DEDUP_MAX_DIFF = 3.0
+# Kích thước ảnh thu nhỏ để so sánh (DEDUP_THUMB_SIZE x DEDUP_THUMB_SIZE)
+DEDUP_THUMB_SIZE = 32
+# Số frame đại diện gần nhất được so sánh (slideshow quay lại slide cũ)
+DEDUP_WINDOW = 4
+
+# Lọc cục bộ trước khi gửi VLM: frame gần như trống (đen, đơn sắc, fade) được kết luận "No"
+# ngay, không tốn request. Chỉ bỏ qua khi đủ cả 3 điều kiện, còn lại vẫn gửi VLM
+PREFILTER_ENABLED = True
+# Kích thước ảnh thu nhỏ (màu) dùng để phân tích
+PREFILTER_THUMB_SIZE = 64
+# Entropy tối đa (bit) của histogram độ sáng 32 mức
+PREFILTER_MAX_ENTROPY = 2.0
+# Biên được tìm trên ảnh xám EDGE_SIZE x EDGE_SIZE (lớn hơn ảnh thu nhỏ để 1 dòng chữ nhỏ
+# không bị làm mờ mất)
+PREFILTER_EDGE_SIZE = 256
+# Tỉ lệ pixel biên tối đa (chữ, logo, vật thể đều tạo biên → vẫn gửi VLM). 1 dòng chữ nhỏ
+# chỉ chiếm vài phần nghìn ảnh nên mặc định là 0: có biên nào là gửi VLM
+PREFILTER_MAX_EDGE_RATIO = 0.0
+# Tỉ lệ pixel màu da tối đa
+PREFILTER_MAX_SKIN_RATIO = 0.05
+
+# Cache kết quả VLM theo hash nội dung (frame JPEG / transcript) + prompt + model
+CACHE_ENABLED = True
+CACHE_PATH = os.path.expanduser("~/.cache/meta_ads_checker/results.sqlite3")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+
+# Lưu tiến độ batch (từng file, từng frame) để chạy lại sau khi bị dừng giữa chừng
+JOB_STORE_PATH = os.path.expanduser("~/.cache/meta_ads_checker/jobs.sqlite3")
+# Batch bị bỏ dở (không có tiến độ mới) lâu hơn số giây này bị xóa khi mở batch khác
+JOB_STORE_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+# Service mode (server.py): nhận job kiểm tra video qua HTTP, giữ pool kết nối/cache giữa các job
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8080
+# Số video được kiểm tra đồng thời
+SERVER_WORKERS = 4
+# Số job tối đa đang chờ; đầy thì POST /jobs trả về 503
+SERVER_QUEUE_SIZE = 100
+# Số job đã xong được giữ lại để tra kết quả (cũ nhất bị xóa trước)
+SERVER_MAX_FINISHED_JOBS = 1000
+
+# Metrics: thời gian từng bước (histogram) và số frames / bytes gửi đi (counters).
+# Tắt mặc định; bật qua --metrics-json (main.py) hoặc mặc định bật trong server.py (/metrics)
+METRICS_ENABLED = False
+# Cận trên các bucket histogram thời gian (giây)
+METRICS_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Chu kỳ ghi file JSON (--metrics-json)
+METRICS_DUMP_INTERVAL_SECONDS = 10
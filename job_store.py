@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional
+
+from config import JOB_STORE_PATH, JOB_STORE_MAX_AGE_SECONDS
+
+
+def batch_id_for(settings: dict) -> str:
+    """ID batch từ các thiết lập ảnh hưởng tới kết quả: cùng thiết lập → chạy tiếp batch cũ"""
+    return hashlib.sha256(
+        json.dumps(settings, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()[:16]
+
+
+def media_list_digest(paths: Iterable[str]) -> str:
+    """Digest của danh sách file (không phụ thuộc thứ tự), để batch gắn với đúng lần quét đó"""
+    return hashlib.sha256(
+        "\n".join(sorted(os.path.abspath(path) for path in paths)).encode('utf-8')
+    ).hexdigest()[:16]
+
+
+class JobStore:
+    """
+    Tiến độ kiểm tra batch trên đĩa (SQLite): trạng thái từng file media và kết quả
+    từng frame, ghi ngay khi có kết quả nên process bị dừng giữa chừng vẫn chạy tiếp được.
+    
+    Trạng thái file: "running" (đang kiểm tra), "partial" (xong nhưng còn frame lỗi),
+    "done" (mọi frame có kết quả hợp lệ). Kết quả gắn với (size, mtime) của file;
+    file đã đổi thì tiến độ cũ bị bỏ.
+    
+    Batch chỉ dùng để chạy tiếp sau khi bị dừng: xong hết (finish_batch) thì bị xóa, lần
+    quét sau kiểm tra lại từ đầu; batch bỏ dở quá max_age_seconds cũng bị xóa.
+    """
+    
+    def __init__(self, path: str = JOB_STORE_PATH, max_age_seconds: float = JOB_STORE_MAX_AGE_SECONDS):
+        """
+        Args:
+            path: Đường dẫn file SQLite
+            max_age_seconds: Batch không có tiến độ mới lâu hơn số giây này bị xóa (0 = giữ mãi)
+        """
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS batches (
+                batch_id TEXT PRIMARY KEY,
+                settings TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS media (
+                batch_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (batch_id, path)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS frames (
+                batch_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                frame_index INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (batch_id, path, frame_index)
+            )
+        """)
+        self._conn.commit()
+    
+    def start_batch(self, settings: dict, resume: bool = True) -> str:
+        """
+        Tạo (hoặc mở lại) batch cho bộ thiết lập, trả về batch_id.
+        
+        Args:
+            resume: False = bỏ tiến độ cũ của batch, kiểm tra lại mọi file
+        """
+        batch_id = batch_id_for(settings)
+        with self._lock:
+            self._prune_stale()
+            if not resume:
+                self._delete_batch(batch_id)
+            self._conn.execute(
+                "INSERT OR IGNORE INTO batches (batch_id, settings, created_at) VALUES (?, ?, ?)",
+                (batch_id, json.dumps(settings, sort_keys=True, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+        return batch_id
+    
+    def finish_batch(self, batch_id: str) -> bool:
+        """
+        Xóa batch nếu mọi file đều "done" (không cần chạy tiếp nữa); batch còn file lỗi
+        hoặc dở dang được giữ để lần chạy sau kiểm tra lại phần thiếu.
+        
+        Returns:
+            True nếu batch đã bị xóa
+        """
+        with self._lock:
+            unfinished = self._conn.execute(
+                "SELECT COUNT(*) FROM media WHERE batch_id = ? AND status != 'done'", (batch_id,)
+            ).fetchone()[0]
+            if unfinished:
+                return False
+            self._delete_batch(batch_id)
+            self._conn.commit()
+        return True
+    
+    def _delete_batch(self, batch_id: str):
+        """Xóa batch cùng tiến độ của nó (gọi khi đang giữ lock, chưa commit)"""
+        for table in ("frames", "media", "batches"):
+            self._conn.execute(f"DELETE FROM {table} WHERE batch_id = ?", (batch_id,))
+    
+    def _prune_stale(self):
+        """Xóa các batch không có tiến độ mới trong max_age_seconds (gọi khi đang giữ lock)"""
+        if not self.max_age_seconds:
+            return
+        stale = self._conn.execute(
+            "SELECT b.batch_id FROM batches b LEFT JOIN media m ON m.batch_id = b.batch_id "
+            "GROUP BY b.batch_id HAVING MAX(COALESCE(m.updated_at, b.created_at)) < ?",
+            (time.time() - self.max_age_seconds,)
+        ).fetchall()
+        for (batch_id,) in stale:
+            self._delete_batch(batch_id)
+    
+    def _signature(self, path: str):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+    
+    def finished_result(self, batch_id: str, path: str) -> Optional[str]:
+        """Kết quả file đã kiểm tra xong ("done") và chưa bị sửa, None nếu cần kiểm tra (lại)"""
+        size, mtime_ns = self._signature(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM media WHERE batch_id = ? AND path = ? AND status = 'done' "
+                "AND size = ? AND mtime_ns = ?",
+                (batch_id, os.path.abspath(path), size, mtime_ns)
+            ).fetchone()
+        return row[0] if row is not None else None
+    
+    def begin_media(self, batch_id: str, path: str) -> Dict[int, str]:
+        """
+        Đánh dấu file đang được kiểm tra.
+        
+        Returns:
+            {frame_index: kết quả} các frame đã có kết quả hợp lệ (Yes/No) từ lần chạy trước;
+            frame còn thiếu hoặc "Error" cần gửi lại
+        """
+        path = os.path.abspath(path)
+        size, mtime_ns = self._signature(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns FROM media WHERE batch_id = ? AND path = ?", (batch_id, path)
+            ).fetchone()
+            if row is not None and tuple(row) != (size, mtime_ns):
+                # File đã đổi nội dung: kết quả frame cũ không còn đúng
+                self._conn.execute("DELETE FROM frames WHERE batch_id = ? AND path = ?", (batch_id, path))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media (batch_id, path, size, mtime_ns, status, result, updated_at) "
+                "VALUES (?, ?, ?, ?, 'running', NULL, ?)",
+                (batch_id, path, size, mtime_ns, time.time())
+            )
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT frame_index, result FROM frames WHERE batch_id = ? AND path = ?", (batch_id, path)
+            ).fetchall()
+        return {index: result for index, result in rows if result.lower().startswith(('yes', 'no'))}
+    
+    def record_frame(self, batch_id: str, path: str, frame_index: int, result: str):
+        """Lưu kết quả 1 frame ngay khi có"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO frames (batch_id, path, frame_index, result, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (batch_id, os.path.abspath(path), frame_index, result, time.time())
+            )
+            self._conn.commit()
+    
+    def finish_media(self, batch_id: str, path: str, result: str, complete: bool = True):
+        """
+        Lưu kết luận của file.
+        
+        Args:
+            complete: False nếu còn frame "Error" → lần chạy sau kiểm tra lại các frame đó
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE media SET status = ?, result = ?, updated_at = ? WHERE batch_id = ? AND path = ?",
+                ("done" if complete else "partial", result, time.time(), batch_id, os.path.abspath(path))
+            )
+            self._conn.commit()
+    
+    def progress(self, batch_id: str) -> Dict[str, int]:
+        """Số file theo trạng thái trong batch"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM media WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        return dict(rows)
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,125 +1,577 @@
 #!/usr/bin/env python3
 import sys
 import os
+import time
+import atexit
+import shutil
 import argparse
+import asyncio
+import threading
+import multiprocessing
+from contextlib import contextmanager
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
-from video_utils import extract_frames, extract_audio, is_video_file
-from api_client import transcribe_audio, check_text_vlm, check_frame_vlm
-from config import DEFAULT_INTERVAL_SECONDS, DEFAULT_MAX_THREADS, DEFAULT_THRESHOLD_PERCENT
+from video_utils import (
+    iter_frames, extract_audio, extract_audio_bytes, is_video_file, max_frame_samples, SAMPLING_MODES, FrameDeduper,
+    EncodedFrame, frame_thumbnail, MediaDemuxer, FramePrefilter, configure_prefilter,
+    prefilter_settings, estimate_frame_samples
+)
+from api_client import (
+    transcribe_audio_chunked, check_text_vlm, get_http_client,
+    check_frames_batch_vlm, AsyncHttpClient, transcribe_audio_chunked_async, check_text_vlm_async,
+    check_frames_batch_vlm_async, configure_frame_encoding, frame_encoding, IMAGE_FORMATS,
+    encode_frame, get_vlm_limiter, configure_vlm_limiter, configure_vlm_retries,
+    configure_transcription, transcription_settings
+)
+from audio_utils import trim_to_speech, configure_vad, vad_settings
+from reporting import log, configure_output, output_settings, verdict_of, FrameResult, VideoReport, JsonLinesWriter
+import metrics
+from cache import get_result_cache, configure_result_cache, video_cache_key
+from config import (
+    DEFAULT_INTERVAL_SECONDS, DEFAULT_MAX_THREADS, DEFAULT_THRESHOLD_PERCENT,
+    DEFAULT_FRAME_SAMPLING_MODE, DEFAULT_FRAME_BATCH_SIZE, DEFAULT_DEDUP_MAX_DIFF,
+    FRAME_MAX_SIDE, FRAME_IMAGE_FORMAT, FRAME_IMAGE_QUALITY,
+    VLM_API_URL, VLM_RATE_LIMIT, VLM_MAX_RETRIES, VLM_MODEL_NAME, TRANSCRIBE_CHUNK_SECONDS,
+    TEXT_WINDOW_WORDS, TEXT_WINDOW_OVERLAP_WORDS, IMAGE_PROMPT_TEMPLATE, BATCH_IMAGE_PROMPT_TEMPLATE, TEXT_PROMPT_TEMPLATE,
+    SCENE_ANALYSIS_FPS, SCENE_CHANGE_THRESHOLD, SCENE_FLOOR_SECONDS, SCENE_MIN_GAP_SECONDS,
+    SCENE_MAX_FRAMES, SINGLE_PASS_DEMUX, DEMUX_MAX_BUFFERED_FRAMES, METRICS_DUMP_INTERVAL_SECONDS
+)
 
 
-def check_video_frames(frames, max_workers: int = 50, threshold_percent: float = 25) -> str:
+def _early_verdict(yes_count: int, valid_count: int, remaining: int,
+                   threshold_percent: float) -> Optional[str]:
+    """
+    Trả về kết luận nếu nó không thể thay đổi dù các frames còn lại ra kết quả gì, ngược lại None.
+    
+    Frames "Error" không tính vào valid_count nên trường hợp xấu nhất cho "Yes" là mọi frame
+    còn lại đều "No", trường hợp tốt nhất là mọi frame còn lại đều "Yes".
+    """
+    if valid_count > 0 and yes_count * 100 >= threshold_percent * (valid_count + remaining):
+        return "Yes"
+    if (valid_count + remaining > 0 and
+            (yes_count + remaining) * 100 < threshold_percent * (valid_count + remaining)):
+        return "No"
+    return None
+
+
+class _FrameTally:
+    """
+    Đếm kết quả frames, quyết định dừng sớm và tổng hợp kết luận.
+    Dùng chung cho check_video_frames và check_video_frames_async.
+    """
+    
+    def __init__(self, threshold_percent: float, early_exit: bool,
+                 expected_total: Optional[int], stop_event=None):
+        self.threshold_percent = threshold_percent
+        self.early_exit = early_exit
+        self.expected_total = expected_total  # Cận trên số frames, chỉ dùng khi chắc chắn đúng
+        self.stop_event = stop_event  # threading.Event hoặc asyncio.Event
+        self.results = {}
+        self.yes_count = 0
+        self.valid_count = 0  # Số frames hợp lệ (không phải Error)
+        self.total_frames = 0  # Số frames đã gửi đi (kể cả frames trùng lặp)
+        self.duplicate_count = 0
+        self.prefiltered_count = 0  # Số frames kết luận "No" tại chỗ, không gửi VLM
+        self.pending_duplicates = {}  # index frame đại diện → [index frames trùng đang chờ kết quả]
+        self.representatives = {}  # index frame trùng lặp → index frame đại diện
+        self.prefiltered = set()
+        self.producer_done = False
+        self.stop_reason = None
+    
+    def add(self, frame_index: int, result: str):
+        self.results[frame_index] = result
+        
+        # Đếm số frames có "Yes" và số frames hợp lệ
+        if result.lower().startswith('yes'):
+            self.yes_count += 1
+            self.valid_count += 1
+            log(f"Frame {frame_index}: {result} ✓")
+        elif result.lower().startswith('no'):
+            self.valid_count += 1
+        # Error không tính vào valid_count
+        
+        # Các frames trùng với frame này nhận cùng kết quả
+        for dup_index in self.pending_duplicates.pop(frame_index, ()):
+            self.add(dup_index, result)
+    
+    def add_duplicate(self, frame_index: int, rep_index: int):
+        """Frame trùng lặp với frame đại diện rep_index: không gửi VLM, dùng kết quả của đại diện"""
+        self.total_frames += 1
+        self.duplicate_count += 1
+        self.representatives[frame_index] = rep_index
+        if rep_index in self.results:
+            self.add(frame_index, self.results[rep_index])
+        else:
+            self.pending_duplicates.setdefault(rep_index, []).append(frame_index)
+    
+    def add_all(self, results):
+        """Kết quả VLM của một batch frames"""
+        for frame_index, result in results:
+            if not result.lower().startswith(('yes', 'no')):
+                metrics.frames("errored")
+            self.add(frame_index, result)
+    
+    def add_prefiltered(self, frame_indices: Iterable[int]):
+        """Frames được lọc cục bộ kết luận an toàn (không gửi VLM)"""
+        for frame_index in frame_indices:
+            self.prefiltered_count += 1
+            self.prefiltered.add(frame_index)
+            self.add(frame_index, "No")
+    
+    def counts(self) -> Dict[str, int]:
+        """Số frames đã gửi / có kết quả / hợp lệ / "Yes" / lỗi"""
+        return {
+            "total": self.total_frames,
+            "answered": len(self.results),
+            "valid": self.valid_count,
+            "yes": self.yes_count,
+            "errors": len(self.results) - self.valid_count,
+            "duplicates": self.duplicate_count,
+            "prefiltered": self.prefiltered_count,
+        }
+    
+    def frame_results(self, timestamps: Sequence[float],
+                      details: Dict[int, dict]) -> List[FrameResult]:
+        """
+        Kết quả từng frame đã có, theo thứ tự index.
+        
+        Args:
+            timestamps: Thời điểm (giây) của frame thứ i (có thể thiếu, ví dụ khi frames là list)
+            details: Chi tiết request VLM theo frame index (xem check_frame_vlm)
+        """
+        frames = []
+        for frame_index in sorted(self.results):
+            timestamp = timestamps[frame_index] if frame_index < len(timestamps) else None
+            if frame_index in self.prefiltered:
+                frames.append(FrameResult(frame_index, "No", timestamp, source="prefilter"))
+                continue
+            rep_index = self.representatives.get(frame_index, frame_index)
+            detail = details.get(rep_index, {})
+            frames.append(FrameResult(
+                frame_index, verdict_of(self.results[frame_index]), timestamp,
+                detail.get("latency") if rep_index == frame_index else None,
+                detail.get("raw_answer"),
+                "duplicate" if rep_index != frame_index else detail.get("source", "vlm")
+            ))
+        return frames
+    
+    def should_stop(self) -> bool:
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.stop_reason = "stop_event"
+            return True
+        if not self.early_exit:
+            return False
+        if self.producer_done:
+            total = self.total_frames
+        elif self.expected_total:
+            total = max(self.expected_total, self.total_frames)
+        else:
+            return False
+        remaining = total - len(self.results)
+        if _early_verdict(self.yes_count, self.valid_count, remaining, self.threshold_percent):
+            self.stop_reason = "decided"
+            return True
+        return False
+    
+    def summarize(self, unfinished: int) -> str:
+        """In thống kê và trả về kết luận frames"""
+        if self.stop_reason == "stop_event":
+            log(f"⏩ Dừng kiểm tra frames: video đã có kết luận vi phạm "
+                  f"({len(self.results)}/{self.total_frames} frames đã có kết quả)")
+            return "Skipped"
+        
+        if self.stop_reason == "decided":
+            log(f"⏩ Dừng sớm: kết luận frames đã chắc chắn sau {len(self.results)} frames "
+                  f"(bỏ qua {unfinished} request chưa xong)")
+        
+        if self.total_frames == 0:
+            log("Không có frame nào được trích xuất!")
+            return "No"
+        
+        threshold_percent = self.threshold_percent
+        
+        # Tính tỷ lệ
+        if self.valid_count == 0:
+            log("Không có frame hợp lệ nào!")
+            final_result = "No"
+        else:
+            percentage = (self.yes_count / self.valid_count) * 100
+            log(f"\n{'='*60}")
+            log(f"THỐNG KÊ KẾT QUẢ FRAMES:")
+            log(f"  - Tổng số frames: {self.total_frames}")
+            log(f"  - Frames đã có kết quả: {len(self.results)}")
+            if self.duplicate_count:
+                log(f"  - Frames trùng lặp (dùng lại kết quả, không gửi VLM): {self.duplicate_count}")
+            if self.prefiltered_count:
+                log(f"  - Frames trống/đơn sắc (lọc cục bộ, không gửi VLM): {self.prefiltered_count}")
+            log(f"  - Frames hợp lệ: {self.valid_count}")
+            log(f"  - Frames có 'Yes': {self.yes_count}")
+            log(f"  - Tỷ lệ: {percentage:.2f}%")
+            log(f"  - Ngưỡng yêu cầu: {threshold_percent}%")
+            log(f"{'='*60}")
+            
+            if percentage >= threshold_percent:
+                final_result = "Yes"
+                log(f"⚠️  KẾT LUẬN FRAMES: VI PHẠM (≥{threshold_percent}% frames có 'Yes')")
+            else:
+                final_result = "No"
+                log(f"✅ KẾT LUẬN FRAMES: AN TOÀN (<{threshold_percent}% frames có 'Yes')")
+        
+        log(f"\nKẾT QUẢ KIỂM TRA FRAMES: {final_result}")
+        return final_result
+
+
+def check_video_frames(frames: Iterable, max_workers: int = 50, threshold_percent: float = 25,
+                       max_pending: Optional[int] = None,
+                       early_exit: bool = False,
+                       expected_total: Optional[int] = None,
+                       stop_event: Optional[threading.Event] = None,
+                       batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                       stats: Optional[Dict[str, int]] = None,
+                       dedup_max_diff: Optional[float] = None,
+                       timestamps: Optional[Sequence[float]] = None,
+                       frame_results: Optional[List[FrameResult]] = None) -> str:
     """
     Kiểm tra tất cả frames của video với logic: cần >= threshold_percent% frames có kết quả "Yes" mới kết luận là "Yes"
     
+    Frames được tiêu thụ dạng streaming (list hoặc generator như iter_frames): mỗi frame được
+    gửi đi ngay khi decode xong, tối đa max_pending frames đang chờ kết quả cùng lúc
+    (backpressure), nên bộ nhớ không phụ thuộc độ dài video.
+    
     Args:
-        frames: List các frames
+        frames: List hoặc iterator các frames
         max_workers: Số threads tối đa
         threshold_percent: Ngưỡng phần trăm (mặc định 25%)
+        max_pending: Số frames tối đa đang chờ kết quả (mặc định 2 × max_workers)
+        early_exit: Dừng sớm (ngừng gửi, cancel các request đang chờ) khi kết luận đã chắc chắn
+        expected_total: Số frames tối đa khi frames là iterator (để dừng sớm trước khi
+                        trích xuất xong), phải là cận trên chắc chắn (max_frame_samples),
+                        không phải ước lượng; với list luôn dùng len(frames)
+        stop_event: Khi được set (ví dụ text đã kết luận vi phạm), ngừng kiểm tra frames
+        batch_size: Số frames gửi chung trong 1 request VLM (1 = mỗi request 1 frame)
+        stats: Dict (nếu có) được điền số lượng frames theo _FrameTally.counts()
+        dedup_max_diff: Bỏ qua frames gần trùng lặp với frame đại diện trước đó (chênh lệch
+                        trung bình ảnh thu nhỏ <= dedup_max_diff), dùng lại kết quả của
+                        đại diện; None = gửi tất cả frames
+        timestamps: Thời điểm (giây) của từng frame, có thể được điền dần trong lúc frames
+                    được decode (tham số timestamps của iter_frames)
+        frame_results: List (nếu có) được điền FrameResult của các frames đã có kết quả
     
     Returns:
-        "Yes" nếu >= threshold_percent% frames có "Yes", "No" nếu không, "Error" nếu có lỗi
+        "Yes" nếu >= threshold_percent% frames có "Yes", "No" nếu không,
+        "Skipped" nếu bị dừng qua stop_event
     """
-    if not frames:
-        print("Không có frame nào được trích xuất!")
-        return "No"
+    if batch_size < 1:
+        raise ValueError(f"batch_size phải >= 1 (nhận: {batch_size})")
+    if max_pending is None:
+        max_pending = max_workers * 2
+    # Connection pool đủ cho mọi thread giữ kết nối keep-alive riêng
+    get_http_client(min_pool_size=max_workers)
+    if hasattr(frames, '__len__'):
+        expected_total = len(frames)
     
-    print(f"\nBắt đầu kiểm tra {len(frames)} frames với {max_workers} threads...")
-    print(f"Ngưỡng: {threshold_percent}% frames phải có kết quả 'Yes' để kết luận vi phạm")
+    log(f"\nBắt đầu kiểm tra frames với {max_workers} threads...")
+    log(f"Ngưỡng: {threshold_percent}% frames phải có kết quả 'Yes' để kết luận vi phạm")
     
     # Thu thập tất cả kết quả
-    results = {}
-    yes_count = 0
-    valid_count = 0  # Số frames hợp lệ (không phải Error)
-    
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(check_frame_vlm, frame, i): i 
-            for i, frame in enumerate(frames)
-        }
-        
-        # Chờ tất cả frames xong (không cancel sớm)
-        for future in as_completed(futures):
-            frame_index, result = future.result()
-            results[frame_index] = result
+    tally = _FrameTally(threshold_percent, early_exit, expected_total, stop_event)
+    deduper = FrameDeduper(dedup_max_diff) if dedup_max_diff is not None else None
+    prefilter = FramePrefilter() if prefilter_settings()["enabled"] else None
+    details = {} if frame_results is not None else None
+    
+    # Mỗi request là một batch frames; giới hạn theo số frames đang chờ
+    max_pending_batches = max(1, max_pending // batch_size)
+    batch_frames, batch_indices = [], []
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = set()
+    
+    def submit_batch():
+        tally.total_frames += len(batch_frames)
+        send_frames, send_indices = _prefilter_batch(prefilter, tally, batch_frames, batch_indices)
+        if send_frames:
+            in_flight.add(executor.submit(check_frames_batch_vlm, send_frames, send_indices,
+                                          details=details))
+        batch_frames.clear()
+        batch_indices.clear()
+    
+    try:
+        for i, frame in enumerate(frames):
+            # Đủ max_pending frames đang chờ → đợi bớt trước khi decode/gửi tiếp
+            if len(in_flight) >= max_pending_batches:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    tally.add_all(future.result())
             
-            # Đếm số frames có "Yes" và số frames hợp lệ
-            if result.lower().startswith('yes'):
-                yes_count += 1
-                valid_count += 1
-                print(f"Frame {frame_index}: {result} ✓")
-            elif result.lower().startswith('no'):
-                valid_count += 1
-            # Error không tính vào valid_count
-    
-    # Tính tỷ lệ
-    if valid_count == 0:
-        print("Không có frame hợp lệ nào!")
-        final_result = "No"
-    else:
-        percentage = (yes_count / valid_count) * 100
-        print(f"\n{'='*60}")
-        print(f"THỐNG KÊ KẾT QUẢ FRAMES:")
-        print(f"  - Tổng số frames: {len(frames)}")
-        print(f"  - Frames hợp lệ: {valid_count}")
-        print(f"  - Frames có 'Yes': {yes_count}")
-        print(f"  - Tỷ lệ: {percentage:.2f}%")
-        print(f"  - Ngưỡng yêu cầu: {threshold_percent}%")
-        print(f"{'='*60}")
-        
-        if percentage >= threshold_percent:
-            final_result = "Yes"
-            print(f"⚠️  KẾT LUẬN FRAMES: VI PHẠM (≥{threshold_percent}% frames có 'Yes')")
+            if tally.should_stop():
+                break
+            
+            if deduper is not None:
+                rep_index = deduper.representative(i, frame)
+                if rep_index is not None:
+                    tally.add_duplicate(i, rep_index)
+                    continue
+            
+            batch_frames.append(frame)
+            batch_indices.append(i)
+            if len(batch_frames) >= batch_size:
+                submit_batch()
         else:
-            final_result = "No"
-            print(f"✅ KẾT LUẬN FRAMES: AN TOÀN (<{threshold_percent}% frames có 'Yes')")
+            if batch_frames:
+                submit_batch()
+            tally.producer_done = True
+        
+        # Chờ các frames còn lại (chỉ dừng giữa chừng khi bật early_exit hoặc có stop_event)
+        while in_flight and not tally.should_stop():
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                tally.add_all(future.result())
+    finally:
+        # Giải phóng decoder (VideoCapture/ffmpeg) nếu dừng giữa chừng
+        if hasattr(frames, 'close'):
+            frames.close()
+        # Không đợi các request đang chạy khi đã dừng sớm
+        executor.shutdown(wait=not in_flight, cancel_futures=True)
     
-    print(f"\nKẾT QUẢ KIỂM TRA FRAMES: {final_result}")
-    return final_result
+    if stats is not None:
+        stats.update(tally.counts())
+    if frame_results is not None:
+        frame_results.extend(tally.frame_results(timestamps or [], details))
+    return tally.summarize(len(in_flight))
 
 
-def check_video_complete(video_path: str, 
-                        interval_seconds: float = 1,
-                        max_workers: int = 50,
-                        keep_audio: bool = False,
-                        threshold_percent: float = 25) -> str:
+def _prefilter_batch(prefilter: Optional[FramePrefilter], tally: _FrameTally,
+                     batch_frames: List, batch_indices: List[int]) -> Tuple[List, List[int]]:
     """
-    Kiểm tra video đầy đủ: cả audio (text) và frames.
+    Lọc cục bộ một batch trước khi gửi VLM: frames trống được ghi "No" vào tally.
+    
+    Returns:
+        (frames, indices) còn lại cần gửi VLM
+    """
+    if prefilter is None:
+        return batch_frames[:], batch_indices[:]
+    trivial = prefilter.triage(batch_frames)
+    tally.add_prefiltered(index for index, skip in zip(batch_indices, trivial) if skip)
+    return ([frame for frame, skip in zip(batch_frames, trivial) if not skip],
+            [index for index, skip in zip(batch_indices, trivial) if not skip])
+
+
+_FRAMES_DONE = object()
+
+
+async def check_video_frames_async(frames: Iterable, semaphore: asyncio.Semaphore,
+                                   client: Optional[AsyncHttpClient] = None,
+                                   threshold_percent: float = 25,
+                                   early_exit: bool = False,
+                                   expected_total: Optional[int] = None,
+                                   stop_event: Optional[asyncio.Event] = None,
+                                   batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                                   stats: Optional[Dict[str, int]] = None,
+                                   dedup_max_diff: Optional[float] = None,
+                                   timestamps: Optional[Sequence[float]] = None,
+                                   frame_results: Optional[List[FrameResult]] = None) -> str:
+    """
+    Bản async của check_video_frames: mỗi frame là một task trên event loop thay vì một thread.
+    
+    Số request đang chạy bị giới hạn bởi semaphore; truyền cùng một semaphore cho nhiều
+    video để giới hạn tổng số request tới VLM trong cả process. Frame tiếp theo chỉ được
+    decode khi có slot trống (backpressure).
     
     Args:
-        video_path: Đường dẫn đến file video
-        interval_seconds: Khoảng thời gian giữa các frames (giây)
-        max_workers: Số threads tối đa cho việc kiểm tra frames
-        keep_audio: Có giữ lại file audio sau khi xử lý không
-        threshold_percent: Ngưỡng phần trăm frames cần có "Yes" để kết luận vi phạm (mặc định 30%)
+        frames: List hoặc iterator các frames (iterator được đọc trong thread pool)
+        semaphore: Giới hạn số request VLM đồng thời
+        client: AsyncHttpClient dùng chung
+        threshold_percent, early_exit, expected_total, stop_event, batch_size, stats,
+        dedup_max_diff, timestamps, frame_results: như check_video_frames
     
     Returns:
-        "Yes" nếu có vi phạm (từ text hoặc frames), "No" nếu không, "Error" nếu có lỗi
+        "Yes", "No" hoặc "Skipped" như check_video_frames
     """
-    if not os.path.exists(video_path):
-        print(f"Lỗi: File không tồn tại - {video_path}")
-        return "Error"
+    if batch_size < 1:
+        raise ValueError(f"batch_size phải >= 1 (nhận: {batch_size})")
+    if hasattr(frames, '__len__'):
+        expected_total = len(frames)
     
-    if not is_video_file(video_path):
-        print(f"Lỗi: File không phải là video - {video_path}")
-        return "Error"
+    log(f"\nBắt đầu kiểm tra frames (async)...")
+    log(f"Ngưỡng: {threshold_percent}% frames phải có kết quả 'Yes' để kết luận vi phạm")
     
-    print(f"\n{'='*60}")
-    print(f"BẮT ĐẦU KIỂM TRA VIDEO: {video_path}")
-    print(f"{'='*60}\n")
+    tally = _FrameTally(threshold_percent, early_exit, expected_total, stop_event)
+    deduper = FrameDeduper(dedup_max_diff) if dedup_max_diff is not None else None
+    prefilter = FramePrefilter() if prefilter_settings()["enabled"] else None
+    details = {} if frame_results is not None else None
+    
+    def collect(done):
+        for task in done:
+            tally.add_all(task.result())
+    
+    frame_iter = iter(frames)
+    in_flight = set()
+    holding = False  # Đang giữ 1 slot chưa giao cho task nào (lỗi/cancel khi decode → trả lại)
+    try:
+        i = 0
+        while not tally.producer_done:
+            await semaphore.acquire()
+            holding = True
+            
+            collect({task for task in in_flight if task.done()})
+            in_flight = {task for task in in_flight if not task.done()}
+            if tally.should_stop():
+                semaphore.release()
+                holding = False
+                break
+            
+            # Decode frames trong thread pool để không chặn event loop
+            batch_frames, batch_indices = [], []
+            while len(batch_frames) < batch_size:
+                frame = await asyncio.to_thread(next, frame_iter, _FRAMES_DONE)
+                if frame is _FRAMES_DONE:
+                    tally.producer_done = True
+                    break
+                frame_index = i
+                i += 1
+                if deduper is not None:
+                    rep_index = deduper.representative(frame_index, frame)
+                    if rep_index is not None:
+                        tally.add_duplicate(frame_index, rep_index)
+                        continue
+                batch_frames.append(frame)
+                batch_indices.append(frame_index)
+            
+            if not batch_frames:
+                semaphore.release()
+                holding = False
+                break
+            
+            tally.total_frames += len(batch_frames)
+            batch_frames, batch_indices = _prefilter_batch(prefilter, tally, batch_frames, batch_indices)
+            if not batch_frames:
+                semaphore.release()
+                holding = False
+                continue
+            
+            task = asyncio.create_task(
+                check_frames_batch_vlm_async(batch_frames, batch_indices, client=client, details=details)
+            )
+            # Trả slot khi task kết thúc, kể cả khi bị cancel trước khi kịp chạy (dừng sớm ngay
+            # sau khi tạo task): finally bên trong coroutine chưa chạy thì không bao giờ chạy
+            task.add_done_callback(lambda _: semaphore.release())
+            holding = False
+            in_flight.add(task)
+        
+        while in_flight and not tally.should_stop():
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+    finally:
+        if holding:
+            semaphore.release()
+        if hasattr(frame_iter, 'close'):
+            frame_iter.close()
+        # Dừng sớm: cancel thật sự các request đang chạy
+        for task in in_flight:
+            task.cancel()
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
     
+    if stats is not None:
+        stats.update(tally.counts())
+    if frame_results is not None:
+        frame_results.extend(tally.frame_results(timestamps or [], details))
+    return tally.summarize(len(in_flight))
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    """Đo thời gian (giây) của một bước và ghi vào timings[stage]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+        metrics.observe(f"video_{stage}", timings[stage])
+
+
+def _run_timed(timings: Dict[str, float], stage: str, fn, *args):
+    """Gọi fn(*args), ghi thời gian chạy vào timings[stage]"""
+    with _timed(timings, stage):
+        return fn(*args)
+
+
+def _extract_audio(video_path: str, keep_audio: bool,
+                   demuxer: Optional[MediaDemuxer] = None):
+    """
+    Tách audio để transcribe: giữ file WAV khi keep_audio, ngược lại đọc WAV thẳng
+    từ stdout của ffmpeg vào bộ nhớ (không ghi/đọc file tạm). Có demuxer thì lấy
+    audio từ lần demux chung với nhánh frames.
+    
+    Returns:
+        Đường dẫn file WAV hoặc nội dung WAV (bytes); None nếu video không có audio track.
+        Lỗi khi tách audio (ffmpeg lỗi, file hỏng) được raise để nhánh audio báo "Error"
+    """
+    if demuxer is not None:
+        audio = demuxer.audio_bytes()
+    elif keep_audio:
+        audio = extract_audio(video_path)
+    else:
+        audio = extract_audio_bytes(video_path)
+    
+    if not audio:
+        log("⚠️  Video không có audio track\n")
+        return None
+    if demuxer is not None:
+        log(f"✅ Audio đã được tách ({len(audio) / 1024:.0f} KB, cùng lần demux với frames)\n")
+    elif keep_audio:
+        log(f"✅ Audio đã được tách: {audio}\n")
+    else:
+        log(f"✅ Audio đã được tách ({len(audio) / 1024:.0f} KB, trong bộ nhớ)\n")
+    return audio
+
+
+def _detect_speech(audio):
+    """
+    VAD trên audio đã tách: không có giọng nói → None (bỏ qua transcribe), có thì trả về
+    WAV đã cắt các đoạn lặng/nhạc dài. Lỗi khi phân tích → giữ nguyên audio.
+    """
+    if not audio or not vad_settings()["enabled"]:
+        return audio
+    try:
+        speech = trim_to_speech(audio)
+    except Exception as e:
+        log(f"⚠️  Lỗi khi phát hiện giọng nói, transcribe toàn bộ audio: {str(e)}")
+        return audio
+    if speech.wav is None:
+        log(f"🔇 Không phát hiện giọng nói ({speech.total_seconds:.1f}s audio), bỏ qua transcribe\n")
+    else:
+        log(f"🗣️  Giọng nói: {speech.speech_seconds:.1f}s / {speech.total_seconds:.1f}s audio\n")
+    return speech.wav
+
+
+def _check_audio_branch(video_path: str, keep_audio: bool, timings: Dict[str, float],
+                        violation_event: Optional[threading.Event] = None,
+                        demuxer: Optional[MediaDemuxer] = None) -> str:
+    """
+    Nhánh audio: tách audio → transcribe → kiểm tra text qua VLM.
+    
+    Nếu có violation_event: set khi text vi phạm (để nhánh frames dừng), và bỏ qua
+    bước kiểm tra text khi nhánh frames đã kết luận vi phạm trước.
+    
+    Returns:
+        Kết quả kiểm tra text ("Yes", "No", "Skipped" hoặc "Error"); "Error" cả khi tách
+        audio hay transcribe lỗi, để kết quả video không được cache như "No"
+    """
     # ==========================================
     # BƯỚC 1: Tách audio từ video
     # ==========================================
-    print("📢 BƯỚC 1: Tách audio từ video...")
+    log("📢 BƯỚC 1: Tách audio từ video...")
     try:
-        audio_path = extract_audio(video_path)
-        print(f"✅ Audio đã được tách: {audio_path}\n")
+        with _timed(timings, 'extract_audio'):
+            audio = _extract_audio(video_path, keep_audio, demuxer)
     except Exception as e:
-        print(f"❌ Lỗi khi tách audio: {str(e)}")
-        audio_path = None
+        log(f"❌ Lỗi khi tách audio: {str(e)}")
+        return "Error"
+    with _timed(timings, 'vad'):
+        speech = _detect_speech(audio)
     
     # ==========================================
     # BƯỚC 2: Transcribe audio → text
@@ -127,58 +579,169 @@ def check_video_complete(video_path: str,
     text_result = "No"
     transcript = ""
     
-    if audio_path and os.path.exists(audio_path):
-        print("🎤 BƯỚC 2: Transcribe audio thành text...")
-        transcript = transcribe_audio(audio_path)
+    if speech:
+        log("🎤 BƯỚC 2: Transcribe audio thành text...")
+        with _timed(timings, 'transcribe'):
+            transcript = transcribe_audio_chunked(speech, filename=f"{Path(video_path).stem}.wav")
         
-        if transcript:
-            print(f"✅ Transcribe thành công\n")
+        if violation_event is not None and violation_event.is_set():
+            log("⏩ Frames đã kết luận vi phạm, bỏ qua kiểm tra text\n")
+            text_result = "Skipped"
+        elif transcript is None:
+            log("❌ Transcribe lỗi, không kiểm tra được text\n")
+            text_result = "Error"
+        elif transcript:
+            log(f"✅ Transcribe thành công\n")
             
             # ==========================================
             # BƯỚC 3: Kiểm tra text qua VLM
             # ==========================================
-            print("📝 BƯỚC 3: Kiểm tra text qua VLM...")
-            text_result = check_text_vlm(transcript)
-            print(f"KẾT QUẢ KIỂM TRA TEXT: {text_result}\n")
+            log("📝 BƯỚC 3: Kiểm tra text qua VLM...")
+            with _timed(timings, 'check_text'):
+                text_result = check_text_vlm(transcript)
+            log(f"KẾT QUẢ KIỂM TRA TEXT: {text_result}\n")
+            
+            if violation_event is not None and text_result.lower().startswith('yes'):
+                violation_event.set()
         else:
-            print("⚠️  Không có transcript, bỏ qua kiểm tra text\n")
-        
-        # Xóa file audio nếu không cần giữ lại
-        if not keep_audio:
-            try:
-                os.remove(audio_path)
-                print(f"🗑️  Đã xóa file audio tạm: {audio_path}\n")
-            except:
-                pass
+            log("⚠️  Không có transcript, bỏ qua kiểm tra text\n")
+    elif audio:
+        log("⚠️  Không có giọng nói, bỏ qua kiểm tra text\n")
     else:
-        print("⚠️  Không có audio, bỏ qua kiểm tra text\n")
+        log("⚠️  Không có audio, bỏ qua kiểm tra text\n")
+    
+    return text_result
+
+
+def _check_frames_branch(video_path: str, interval_seconds: float, max_workers: int,
+                         threshold_percent: float, sampling_mode: str,
+                         violation_event: Optional[threading.Event] = None,
+                         batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                         stats: Optional[Dict[str, int]] = None,
+                         dedup_max_diff: Optional[float] = None,
+                         demuxer: Optional[MediaDemuxer] = None,
+                         frame_results: Optional[List[FrameResult]] = None) -> str:
+    """
+    Nhánh hình ảnh: trích xuất frames → kiểm tra frames qua VLM.
+    
+    Nếu có violation_event: bật dừng sớm, dừng khi text đã kết luận vi phạm,
+    và set event khi frames kết luận vi phạm. Có demuxer thì frames lấy từ lần
+    demux chung với nhánh audio thay vì mở video lần nữa.
     
+    Returns:
+        Kết quả kiểm tra frames ("Yes", "No" hoặc "Skipped")
+    """
     # ==========================================
     # BƯỚC 4: Trích xuất frames từ video
     # ==========================================
-    print("🖼️  BƯỚC 4: Trích xuất frames từ video...")
-    frames = extract_frames(video_path, interval_seconds)
+    log("🖼️  BƯỚC 4: Trích xuất frames từ video...")
+    timestamps = []
+    if demuxer is not None:
+        frames = demuxer.frames(timestamps)
+        # Không mở video chỉ để đọc metadata: dừng sớm "No" chờ tới khi demux xong
+        expected_total = None
+    else:
+        frames = iter_frames(video_path, interval_seconds, sampling_mode, timestamps)
+        # Số frames theo metadata chỉ là ước lượng (trừ mode seek): dừng sớm dựa trên nó có
+        # thể bỏ qua các frames cuối làm đổi kết luận
+        expected_total = max_frame_samples(video_path, interval_seconds, sampling_mode)
     
     # ==========================================
     # BƯỚC 5: Kiểm tra frames qua VLM
     # ==========================================
-    frames_result = "No"
-    if frames:
-        print(f"✅ Đã trích xuất {len(frames)} frames\n")
-        print("🔍 BƯỚC 5: Kiểm tra frames qua VLM...")
-        frames_result = check_video_frames(frames, max_workers, threshold_percent)
+    # Frames được decode và gửi VLM song song (streaming), không đợi trích xuất xong
+    log("🔍 BƯỚC 5: Kiểm tra frames qua VLM...")
+    try:
+        if violation_event is None:
+            return check_video_frames(frames, max_workers, threshold_percent,
+                                      batch_size=batch_size, stats=stats,
+                                      dedup_max_diff=dedup_max_diff,
+                                      timestamps=timestamps, frame_results=frame_results)
+        
+        frames_result = check_video_frames(
+            frames, max_workers, threshold_percent,
+            batch_size=batch_size,
+            stats=stats,
+            dedup_max_diff=dedup_max_diff,
+            timestamps=timestamps,
+            frame_results=frame_results,
+            early_exit=True,
+            expected_total=expected_total,
+            stop_event=violation_event
+        )
+    finally:
+        # Lỗi hoặc dừng trước khi đọc frame nào: nếu không, demuxer chờ chỗ trống trong
+        # hàng đợi mãi và nhánh audio (đang đợi demux xong) bị treo theo
+        if demuxer is not None:
+            demuxer.close_frames()
+    if frames_result.lower().startswith('yes'):
+        violation_event.set()
+    return frames_result
+
+
+def _fits_demux_buffer(video_path: str, interval_seconds: float, sampling_mode: str) -> bool:
+    """
+    Số frames lấy mẫu (theo metadata) có vừa hàng đợi của MediaDemuxer không. Nếu không,
+    ffmpeg dừng mỗi khi hàng đợi đầy nên audio chỉ xong khi gần hết frames đã được kiểm tra,
+    transcribe bị dồn ra sau nhánh frames → dùng 2 lần mở video để 2 nhánh chạy độc lập.
+    """
+    expected = estimate_frame_samples(video_path, interval_seconds, sampling_mode)
+    return expected is not None and expected <= DEMUX_MAX_BUFFERED_FRAMES
+
+
+def _print_timings(timings: Dict[str, float]):
+    """In thời gian từng bước, đánh dấu nhánh nằm trên critical path"""
+    labels = [
+        ('extract_audio', 'Tách audio'),
+        ('vad', 'Phát hiện giọng nói'),
+        ('transcribe', 'Transcribe'),
+        ('check_text', 'Kiểm tra text'),
+        ('audio_branch', 'Nhánh audio (tổng)'),
+        ('frames_branch', 'Nhánh frames (trích xuất + kiểm tra)'),
+        ('total', 'Tổng thời gian'),
+    ]
+    critical = max(('audio_branch', 'frames_branch'), key=lambda k: timings.get(k, 0))
+    
+    log("⏱️  THỜI GIAN TỪNG BƯỚC:")
+    for key, label in labels:
+        if key in timings:
+            marker = "  ← critical path" if key == critical else ""
+            log(f"  - {label}: {timings[key]:.2f}s{marker}")
+    log()
+
+
+def _validate_video(video_path: str) -> Optional[str]:
+    """Kiểm tra file tồn tại và là video, trả về thông báo lỗi hoặc None nếu hợp lệ"""
+    if not os.path.exists(video_path):
+        error = f"File không tồn tại - {video_path}"
+    elif not is_video_file(video_path):
+        error = f"File không phải là video - {video_path}"
     else:
-        print("⚠️  Không có frames để kiểm tra\n")
+        return None
+    log(f"Lỗi: {error}")
+    return error
+
+
+def _merge_results(text_result: str, frames_result: str, timings: Dict[str, float]) -> str:
+    """BƯỚC 6: Tổng hợp kết quả text và frames thành kết luận cuối cùng"""
+    log(f"\n{'='*60}")
+    log("TỔNG HỢP KẾT QUẢ")
+    log(f"{'='*60}\n")
     
-    # ==========================================
-    # BƯỚC 6: Tổng hợp kết quả
-    # ==========================================
-    print(f"\n{'='*60}")
-    print("TỔNG HỢP KẾT QUẢ")
-    print(f"{'='*60}\n")
+    log(f"📝 Kết quả kiểm tra TEXT: {text_result}")
+    log(f"🖼️  Kết quả kiểm tra FRAMES: {frames_result}\n")
     
-    print(f"📝 Kết quả kiểm tra TEXT: {text_result}")
-    print(f"🖼️  Kết quả kiểm tra FRAMES: {frames_result}\n")
+    _print_timings(timings)
+    
+    cache = get_result_cache()
+    if cache is not None:
+        stats = cache.stats()
+        log(f"💾 Cache kết quả: {stats['hits']} hit / {stats['misses']} miss "
+              f"({stats['hit_rate'] * 100:.1f}%)\n")
+    
+    limiter = get_vlm_limiter().stats()
+    log(f"🚦 VLM: giới hạn hiện tại {limiter['limit']} request đồng thời, "
+          f"{limiter['overloads']} lần server quá tải\n")
     
     # Nếu 1 trong 2 có Yes thì kết luận là Yes
     final_result = "Yes" if (
@@ -186,12 +749,548 @@ def check_video_complete(video_path: str,
         frames_result.lower().startswith('yes')
     ) else "No"
     
-    print(f"🎯 KẾT QUẢ CUỐI CÙNG: {final_result}")
-    print(f"{'='*60}\n")
+    log(f"🎯 KẾT QUẢ CUỐI CÙNG: {final_result}")
+    log(f"{'='*60}\n")
     
     return final_result
 
 
+def _video_settings(interval_seconds: float, threshold_percent: float,
+                    sampling_mode: str, batch_size: int,
+                    dedup_max_diff: Optional[float] = None) -> dict:
+    """
+    Các thiết lập ảnh hưởng tới kết luận của video (đưa vào cache key). Cách đọc video
+    (demux 1 lần hay mở 2 lần, sync hay async) không đổi kết luận nên không nằm trong key,
+    bản sync và async dùng chung kết quả đã cache.
+    """
+    settings = {
+        "interval_seconds": interval_seconds,
+        "threshold_percent": threshold_percent,
+        "sampling_mode": sampling_mode,
+        "batch_size": batch_size,
+        "dedup_max_diff": dedup_max_diff,
+        "prefilter": prefilter_settings(),
+        "frame_encoding": frame_encoding(),
+        "api_url": VLM_API_URL,
+        "model": VLM_MODEL_NAME,
+        "image_prompt": IMAGE_PROMPT_TEMPLATE,
+        "batch_image_prompt": BATCH_IMAGE_PROMPT_TEMPLATE,
+        "text_prompt": TEXT_PROMPT_TEMPLATE,
+        "text_window": [TEXT_WINDOW_WORDS, TEXT_WINDOW_OVERLAP_WORDS],
+        "vad": vad_settings(),
+        "transcribe_chunk_seconds": transcription_settings()["chunk_seconds"],
+    }
+    if sampling_mode == "scene":
+        settings["scene"] = [SCENE_ANALYSIS_FPS, SCENE_CHANGE_THRESHOLD, SCENE_FLOOR_SECONDS,
+                             SCENE_MIN_GAP_SECONDS, SCENE_MAX_FRAMES]
+    return settings
+
+
+def _lookup_video_result(video_path: str, settings: dict) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Tra kết quả cả video theo digest file + thiết lập.
+    
+    Returns:
+        (cache key, kết quả đã lưu hoặc None); key là None khi cache bị tắt
+    """
+    cache = get_result_cache()
+    if cache is None:
+        return None, None
+    try:
+        key = video_cache_key(cache.file_digest(video_path), settings)
+    except OSError as e:
+        log(f"⚠️  Không tính được digest video: {str(e)}")
+        return None, None
+    return key, cache.get_json(key)
+
+
+def _report_cached_video(video_path: str, record: dict) -> VideoReport:
+    """In kết quả video lấy từ cache và trả về kết quả đầy đủ"""
+    log(f"\n{'='*60}")
+    log(f"💾 VIDEO ĐÃ ĐƯỢC KIỂM TRA TRƯỚC ĐÓ (cache): {video_path}")
+    log(f"{'='*60}\n")
+    log(f"📝 Kết quả kiểm tra TEXT: {record['text_result']}")
+    log(f"🖼️  Kết quả kiểm tra FRAMES: {record['frames_result']}\n")
+    _print_timings(record.get('timings', {}))
+    log(f"🎯 KẾT QUẢ CUỐI CÙNG: {record['result']}")
+    log(f"{'='*60}\n")
+    return VideoReport.from_dict(dict(record, video_path=video_path, cached=True))
+
+
+def _store_video_result(key: Optional[str], report: VideoReport):
+    """Lưu kết quả video; bỏ qua khi text hoặc frame nào đó lỗi để lần sau kiểm tra lại"""
+    cache = get_result_cache()
+    if cache is None or key is None or report.text_result == "Error" or report.counts.get("errors"):
+        return
+    record = report.to_dict()
+    for field in ("video_path", "cached", "error"):
+        del record[field]
+    cache.set_json(key, record)
+
+
+def check_video_complete(video_path: str, 
+                        interval_seconds: float = 1,
+                        max_workers: int = 50,
+                        keep_audio: bool = False,
+                        threshold_percent: float = 25,
+                        sampling_mode: str = DEFAULT_FRAME_SAMPLING_MODE,
+                        early_exit: bool = False,
+                        batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                        dedup_max_diff: Optional[float] = None,
+                        single_pass: bool = SINGLE_PASS_DEMUX) -> str:
+    """
+    Kiểm tra video đầy đủ (như check_video_report), chỉ trả về kết luận cuối cùng.
+    
+    Returns:
+        "Yes" nếu có vi phạm (từ text hoặc frames), "No" nếu không, "Error" nếu có lỗi
+    """
+    return check_video_report(video_path, interval_seconds, max_workers, keep_audio, threshold_percent,
+                              sampling_mode, early_exit, batch_size, dedup_max_diff, single_pass).result
+
+
+def check_video_report(video_path: str,
+                       interval_seconds: float = 1,
+                       max_workers: int = 50,
+                       keep_audio: bool = False,
+                       threshold_percent: float = 25,
+                       sampling_mode: str = DEFAULT_FRAME_SAMPLING_MODE,
+                       early_exit: bool = False,
+                       batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                       dedup_max_diff: Optional[float] = None,
+                       single_pass: bool = SINGLE_PASS_DEMUX) -> VideoReport:
+    """
+    Kiểm tra video đầy đủ: cả audio (text) và frames.
+    
+    Args:
+        video_path: Đường dẫn đến file video
+        interval_seconds: Khoảng thời gian giữa các frames (giây)
+        max_workers: Số threads tối đa cho việc kiểm tra frames
+        keep_audio: Có giữ lại file audio sau khi xử lý không
+        threshold_percent: Ngưỡng phần trăm frames cần có "Yes" để kết luận vi phạm (mặc định 30%)
+        sampling_mode: Cách lấy mẫu frames ("read", "grab", "seek", "ffmpeg", hoặc "scene":
+                       theo điểm chuyển cảnh, bỏ qua interval_seconds)
+        early_exit: Dừng kiểm tra frames khi kết luận đã chắc chắn hoặc text đã vi phạm
+        batch_size: Số frames gửi chung trong 1 request VLM
+        dedup_max_diff: Ngưỡng bỏ qua frames gần trùng lặp (None = tắt), xem check_video_frames
+        single_pass: Lấy audio và frames từ cùng 1 lần chạy ffmpeg (MediaDemuxer) thay vì mở
+                     video 2 lần; không áp dụng cho mode "scene", --keep-audio hoặc khi thiếu ffmpeg
+    
+    Returns:
+        VideoReport: kết luận ("Yes" / "No" / "Error"), kết quả text, kết quả và chi tiết
+        từng frame (thời điểm, độ trễ, câu trả lời gốc), số lượng frames và thời gian từng bước
+    """
+    error = _validate_video(video_path)
+    if error is not None:
+        return VideoReport(video_path, "Error", error=error)
+    
+    # Video đã được kiểm tra với cùng thiết lập → trả kết quả ngay (trước khi mở video)
+    cache_key, cached = _lookup_video_result(
+        video_path,
+        _video_settings(interval_seconds, threshold_percent, sampling_mode, batch_size, dedup_max_diff)
+    )
+    if cached is not None:
+        return _report_cached_video(video_path, cached)
+    
+    single_pass = (single_pass and sampling_mode != "scene" and not keep_audio
+                   and shutil.which('ffmpeg') is not None
+                   and _fits_demux_buffer(video_path, interval_seconds, sampling_mode))
+    
+    log(f"\n{'='*60}")
+    log(f"BẮT ĐẦU KIỂM TRA VIDEO: {video_path}")
+    log(f"{'='*60}\n")
+    
+    timings = {}
+    frame_stats = {}
+    frame_results = []
+    violation_event = threading.Event() if early_exit else None
+    start = time.perf_counter()
+    
+    demuxer = MediaDemuxer(video_path, interval_seconds) if single_pass else None
+    
+    # Nhánh audio và nhánh frames độc lập → chạy song song, độ trễ = max thay vì tổng
+    try:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            audio_future = executor.submit(
+                _run_timed, timings, 'audio_branch',
+                _check_audio_branch, video_path, keep_audio, timings, violation_event, demuxer
+            )
+            frames_result = _run_timed(
+                timings, 'frames_branch',
+                _check_frames_branch, video_path, interval_seconds, max_workers,
+                threshold_percent, sampling_mode, violation_event, batch_size, frame_stats,
+                dedup_max_diff, demuxer, frame_results
+            )
+            text_result = audio_future.result()
+    finally:
+        if demuxer is not None:
+            demuxer.close()
+    
+    timings['total'] = time.perf_counter() - start
+    
+    final_result = _merge_results(text_result, frames_result, timings)
+    report = VideoReport(video_path, final_result, text_result, frames_result,
+                         frame_results, frame_stats, timings)
+    _store_video_result(cache_key, report)
+    return report
+
+
+# ===========================
+# ASYNC PIPELINE
+# ===========================
+
+async def _check_audio_branch_async(video_path: str, keep_audio: bool, timings: Dict[str, float],
+                                    client: AsyncHttpClient, semaphore: asyncio.Semaphore,
+                                    violation_event: Optional[asyncio.Event] = None) -> str:
+    """
+    Bản async của _check_audio_branch (ffmpeg chạy trong thread pool).
+    Request transcribe và kiểm tra text cũng chiếm một slot của semaphore.
+    """
+    start = time.perf_counter()
+    log("📢 BƯỚC 1: Tách audio từ video...")
+    try:
+        with _timed(timings, 'extract_audio'):
+            audio = await asyncio.to_thread(_extract_audio, video_path, keep_audio)
+    except Exception as e:
+        log(f"❌ Lỗi khi tách audio: {str(e)}")
+        timings['audio_branch'] = time.perf_counter() - start
+        return "Error"
+    with _timed(timings, 'vad'):
+        speech = await asyncio.to_thread(_detect_speech, audio)
+    
+    text_result = "No"
+    
+    if speech:
+        log("🎤 BƯỚC 2: Transcribe audio thành text...")
+        with _timed(timings, 'transcribe'):
+            transcript = await transcribe_audio_chunked_async(
+                speech, client=client, filename=f"{Path(video_path).stem}.wav", semaphore=semaphore
+            )
+        
+        if violation_event is not None and violation_event.is_set():
+            log("⏩ Frames đã kết luận vi phạm, bỏ qua kiểm tra text\n")
+            text_result = "Skipped"
+        elif transcript is None:
+            log("❌ Transcribe lỗi, không kiểm tra được text\n")
+            text_result = "Error"
+        elif transcript:
+            log(f"✅ Transcribe thành công\n")
+            log("📝 BƯỚC 3: Kiểm tra text qua VLM...")
+            with _timed(timings, 'check_text'):
+                text_result = await check_text_vlm_async(transcript, client=client, semaphore=semaphore)
+            log(f"KẾT QUẢ KIỂM TRA TEXT: {text_result}\n")
+            
+            if violation_event is not None and text_result.lower().startswith('yes'):
+                violation_event.set()
+        else:
+            log("⚠️  Không có transcript, bỏ qua kiểm tra text\n")
+    elif audio:
+        log("⚠️  Không có giọng nói, bỏ qua kiểm tra text\n")
+    else:
+        log("⚠️  Không có audio, bỏ qua kiểm tra text\n")
+    
+    timings['audio_branch'] = time.perf_counter() - start
+    return text_result
+
+
+async def _check_frames_branch_async(video_path: str, interval_seconds: float,
+                                     threshold_percent: float, sampling_mode: str,
+                                     timings: Dict[str, float], semaphore: asyncio.Semaphore,
+                                     client: AsyncHttpClient,
+                                     violation_event: Optional[asyncio.Event] = None,
+                                     batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                                     stats: Optional[Dict[str, int]] = None,
+                                     dedup_max_diff: Optional[float] = None,
+                                     decode_executor: Optional[Executor] = None,
+                                     frame_results: Optional[List[FrameResult]] = None) -> str:
+    """
+    Bản async của _check_frames_branch.
+    
+    Nếu có decode_executor (ProcessPoolExecutor), toàn bộ frames được decode và encode
+    trong process khác rồi mới gửi đi, để event loop không tranh GIL với OpenCV.
+    """
+    start = time.perf_counter()
+    log("🖼️  BƯỚC 4: Trích xuất frames từ video...")
+    timestamps = []
+    if decode_executor is not None:
+        frames, timestamps, decode_metrics = await asyncio.get_running_loop().run_in_executor(
+            decode_executor, decode_video_frames,
+            video_path, interval_seconds, sampling_mode, frame_encoding(), output_settings(),
+            metrics.metrics_settings()
+        )
+        if decode_metrics is not None:
+            metrics.merge(decode_metrics)
+    else:
+        frames = iter_frames(video_path, interval_seconds, sampling_mode, timestamps)
+    
+    log("🔍 BƯỚC 5: Kiểm tra frames qua VLM...")
+    expected_total = None
+    if violation_event is not None:
+        expected_total = await asyncio.to_thread(
+            max_frame_samples, video_path, interval_seconds, sampling_mode
+        )
+    
+    frames_result = await check_video_frames_async(
+        frames, semaphore, client, threshold_percent,
+        early_exit=violation_event is not None,
+        expected_total=expected_total,
+        stop_event=violation_event,
+        batch_size=batch_size,
+        stats=stats,
+        dedup_max_diff=dedup_max_diff,
+        timestamps=timestamps,
+        frame_results=frame_results
+    )
+    if violation_event is not None and frames_result.lower().startswith('yes'):
+        violation_event.set()
+    
+    timings['frames_branch'] = time.perf_counter() - start
+    return frames_result
+
+
+async def check_video_complete_async(video_path: str,
+                                     interval_seconds: float = 1,
+                                     max_concurrency: int = 50,
+                                     keep_audio: bool = False,
+                                     threshold_percent: float = 25,
+                                     sampling_mode: str = DEFAULT_FRAME_SAMPLING_MODE,
+                                     early_exit: bool = False,
+                                     batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                                     dedup_max_diff: Optional[float] = None,
+                                     semaphore: Optional[asyncio.Semaphore] = None,
+                                     client: Optional[AsyncHttpClient] = None,
+                                     decode_executor: Optional[Executor] = None) -> str:
+    """
+    Như check_video_report_async, chỉ trả về kết luận cuối cùng.
+    
+    Returns:
+        "Yes" nếu có vi phạm (từ text hoặc frames), "No" nếu không, "Error" nếu có lỗi
+    """
+    report = await check_video_report_async(
+        video_path, interval_seconds, max_concurrency, keep_audio, threshold_percent, sampling_mode,
+        early_exit, batch_size, dedup_max_diff, semaphore, client, decode_executor
+    )
+    return report.result
+
+
+async def check_video_report_async(video_path: str,
+                                   interval_seconds: float = 1,
+                                   max_concurrency: int = 50,
+                                   keep_audio: bool = False,
+                                   threshold_percent: float = 25,
+                                   sampling_mode: str = DEFAULT_FRAME_SAMPLING_MODE,
+                                   early_exit: bool = False,
+                                   batch_size: int = DEFAULT_FRAME_BATCH_SIZE,
+                                   dedup_max_diff: Optional[float] = None,
+                                   semaphore: Optional[asyncio.Semaphore] = None,
+                                   client: Optional[AsyncHttpClient] = None,
+                                   decode_executor: Optional[Executor] = None) -> VideoReport:
+    """
+    Bản async của check_video_report, chạy trên một event loop thay vì 50 threads/video.
+    
+    Để kiểm tra nhiều video cùng lúc trong một process, tạo một semaphore và một
+    AsyncHttpClient dùng chung rồi asyncio.gather nhiều lời gọi (xem check_videos_async).
+    
+    Args:
+        video_path, interval_seconds, keep_audio, threshold_percent, sampling_mode, early_exit,
+        batch_size, dedup_max_diff: như check_video_complete
+        max_concurrency: Số request VLM đồng thời tối đa (khi không truyền semaphore)
+        semaphore: Semaphore dùng chung giới hạn request VLM giữa nhiều video
+        client: AsyncHttpClient dùng chung (None → tạo client riêng cho video này)
+        decode_executor: ProcessPoolExecutor để decode/encode frames ngoài process chính
+    
+    Returns:
+        VideoReport như check_video_report
+    """
+    error = _validate_video(video_path)
+    if error is not None:
+        return VideoReport(video_path, "Error", error=error)
+    
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max_concurrency)
+    if client is None:
+        async with AsyncHttpClient(pool_size=max_concurrency) as client:
+            return await check_video_report_async(
+                video_path, interval_seconds, max_concurrency, keep_audio, threshold_percent,
+                sampling_mode, early_exit, batch_size, dedup_max_diff, semaphore, client,
+                decode_executor
+            )
+    
+    cache_key, cached = await asyncio.to_thread(
+        _lookup_video_result,
+        video_path,
+        _video_settings(interval_seconds, threshold_percent, sampling_mode, batch_size, dedup_max_diff)
+    )
+    if cached is not None:
+        return _report_cached_video(video_path, cached)
+    
+    log(f"\n{'='*60}")
+    log(f"BẮT ĐẦU KIỂM TRA VIDEO (async): {video_path}")
+    log(f"{'='*60}\n")
+    
+    timings = {}
+    frame_stats = {}
+    frame_results = []
+    violation_event = asyncio.Event() if early_exit else None
+    start = time.perf_counter()
+    
+    text_result, frames_result = await asyncio.gather(
+        _check_audio_branch_async(video_path, keep_audio, timings, client, semaphore, violation_event),
+        _check_frames_branch_async(video_path, interval_seconds, threshold_percent, sampling_mode,
+                                   timings, semaphore, client, violation_event, batch_size,
+                                   frame_stats, dedup_max_diff, decode_executor, frame_results)
+    )
+    
+    timings['total'] = time.perf_counter() - start
+    
+    final_result = _merge_results(text_result, frames_result, timings)
+    report = VideoReport(video_path, final_result, text_result, frames_result,
+                         frame_results, frame_stats, timings)
+    await asyncio.to_thread(_store_video_result, cache_key, report)
+    return report
+
+
+def decode_video_frames(video_path: str, interval_seconds: float, sampling_mode: str,
+                        encoding: dict, output: Optional[dict] = None,
+                        metric_settings: Optional[dict] = None
+                        ) -> Tuple[List[EncodedFrame], List[float], Optional[dict]]:
+    """
+    Trích xuất và encode frames của một video (chạy trong process decode).
+    
+    Args:
+        video_path, interval_seconds, sampling_mode: như iter_frames
+        encoding: Thiết lập tiền xử lý frame của process chính (frame_encoding())
+        output: Thiết lập log của process chính (output_settings()); process decode không
+                kế thừa configure_output nên --quiet / --jsonl - cần được truyền sang
+        metric_settings: Thiết lập metrics của process chính (metrics.metrics_settings()), chỉ
+                         truyền khi chạy trong process decode: metrics của process này bị xóa
+                         và metrics decode/encode của lần gọi được trả về để process chính cộng dồn
+    
+    Returns:
+        (List EncodedFrame (bytes ảnh + ảnh thu nhỏ để dedup) theo thứ tự thời gian,
+         thời điểm (giây) của từng frame,
+         metrics.snapshot() của lần gọi này hoặc None nếu metrics tắt)
+    """
+    configure_frame_encoding(encoding["max_side"], encoding["format"], encoding["quality"])
+    if output is not None:
+        configure_output(output["verbose"])
+    collect_metrics = metric_settings is not None and metric_settings["enabled"]
+    if metric_settings is not None:
+        # Process decode xử lý lần lượt từng video: xóa số liệu của video trước
+        metrics.configure_metrics(enabled=collect_metrics, reset=True)
+    timestamps = []
+    frames = [
+        EncodedFrame(encode_frame(frame), frame_thumbnail(frame))
+        for frame in iter_frames(video_path, interval_seconds, sampling_mode, timestamps)
+    ]
+    return frames, timestamps, metrics.snapshot() if collect_metrics else None
+
+
+def _decode_executor(decode_workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool decode frames cho check_videos_async.
+    
+    Process decode không được fork() từ process chính: lúc pool tạo process mới, thread
+    khác có thể đang chạy ffmpeg (tách audio), process con fork ra giữ luôn đầu ghi pipe
+    stdout của ffmpeg nên bên đọc không bao giờ nhận EOF và video bị treo. Dùng
+    forkserver, hoặc spawn trên hệ điều hành không có forkserver (Windows).
+    """
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=decode_workers,
+                               mp_context=multiprocessing.get_context(start_method))
+
+
+async def check_videos_async(video_paths: List[str], max_concurrency: int = 50,
+                             decode_workers: Optional[int] = None,
+                             max_videos: Optional[int] = None,
+                             on_report: Optional[Callable[[VideoReport], None]] = None,
+                             **kwargs) -> Dict[str, str]:
+    """
+    Kiểm tra nhiều video đồng thời trên một event loop, với tổng số request VLM
+    đang chạy (của tất cả video) không vượt quá max_concurrency.
+    
+    Args:
+        video_paths: Danh sách đường dẫn video
+        max_concurrency: Số request VLM đồng thời tối đa cho cả process
+        decode_workers: Số process decode/encode frames (None = decode trong process chính)
+        max_videos: Số video được xử lý cùng lúc (mặc định 2 × decode_workers khi có
+                    process decode, không giới hạn nếu không), giới hạn RAM giữ frames
+        on_report: Gọi với VideoReport của từng video ngay khi video đó xong
+                   (ví dụ JsonLinesWriter.write), không đợi cả folder
+        **kwargs: Tham số khác của check_video_complete_async
+    
+    Returns:
+        Dict {video_path: "Yes"/"No"/"Error"}
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    if max_videos is None:
+        max_videos = 2 * decode_workers if decode_workers else len(video_paths)
+    video_slots = asyncio.Semaphore(max(1, max_videos))
+    decode_executor = _decode_executor(decode_workers) if decode_workers else None
+    
+    async def check(path, client):
+        async with video_slots:
+            report = await check_video_report_async(
+                path, max_concurrency=max_concurrency, semaphore=semaphore, client=client,
+                decode_executor=decode_executor, **kwargs
+            )
+        if on_report is not None:
+            on_report(report)
+        return report.result
+    
+    try:
+        async with AsyncHttpClient(pool_size=max_concurrency) as client:
+            results = await asyncio.gather(*(check(path, client) for path in video_paths))
+    finally:
+        if decode_executor is not None:
+            decode_executor.shutdown(wait=True, cancel_futures=True)
+    return dict(zip(video_paths, results))
+
+
+def find_video_files(path: str) -> List[str]:
+    """File video → [file]; folder → tất cả file video bên trong (đệ quy, đã sắp xếp)"""
+    path_obj = Path(path)
+    if path_obj.is_file():
+        return [str(path_obj)]
+    return sorted(str(p) for p in path_obj.rglob('*') if p.is_file() and is_video_file(str(p)))
+
+
+def _print_batch_summary(results: Dict[str, str]):
+    """In tổng kết kết quả kiểm tra nhiều video"""
+    violated = [path for path, result in results.items() if result.lower().startswith('yes')]
+    errors = [path for path, result in results.items() if result == "Error"]
+    
+    log(f"\n{'='*60}")
+    log("TỔNG KẾT KẾT QUẢ")
+    log(f"{'='*60}\n")
+    log(f"📊 Tổng số video: {len(results)}")
+    log(f"✅ An toàn: {len(results) - len(violated) - len(errors)}")
+    log(f"⚠️  Vi phạm: {len(violated)}")
+    log(f"❌ Lỗi: {len(errors)}")
+    
+    if violated:
+        log(f"\n⚠️  DANH SÁCH VIDEO VI PHẠM:")
+        for path in violated:
+            log(f"   - {path}")
+    
+    if errors:
+        log(f"\n❌ DANH SÁCH VIDEO LỖI:")
+        for path in errors:
+            log(f"   - {path}")
+    
+    log(f"\n{'='*60}\n")
+
+
+def _positive_int(value: str) -> int:
+    """Kiểu argparse: số nguyên >= 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"phải là số nguyên >= 1 (nhận: {value})")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"phải là số nguyên >= 1 (nhận: {value})")
+    return number
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Kiểm tra video theo Meta Advertising Policy',
@@ -201,6 +1300,9 @@ Ví dụ:
   python main.py video.mp4
   python main.py video.mp4 --interval 2 --threads 30
   python main.py video.mp4 --keep-audio
+  python main.py --video_path videos/ --threads 100 --decode-workers 8
+  python main.py --video_path videos/ --jsonl - > results.jsonl
+  python main.py --video_path videos/ --metrics-json metrics.json
         """
     )
     
@@ -208,7 +1310,7 @@ Ví dụ:
         '--video_path',
         type=str,
         default="/home/hiepnd72/Documents/work/blocked/12.11/Failed/x (6).mp4",
-        help='Đường dẫn đến file video cần kiểm tra'
+        help='Đường dẫn đến file video cần kiểm tra, hoặc folder chứa các video'
     )
     
     parser.add_argument(
@@ -238,28 +1340,225 @@ Ví dụ:
         help=f'Ngưỡng phần trăm frames cần có "Yes" để kết luận vi phạm (mặc định: {DEFAULT_THRESHOLD_PERCENT}%%)'
     )
     
+    parser.add_argument(
+        '--sampling-mode',
+        choices=SAMPLING_MODES,
+        default=DEFAULT_FRAME_SAMPLING_MODE,
+        help=f'Cách lấy mẫu frames (mặc định: {DEFAULT_FRAME_SAMPLING_MODE})'
+    )
+    
+    parser.add_argument(
+        '--early-exit',
+        action='store_true',
+        help='Dừng kiểm tra frames ngay khi kết luận đã chắc chắn (mặc định: kiểm tra hết)'
+    )
+    
+    parser.add_argument(
+        '--async',
+        dest='use_async',
+        action='store_true',
+        help='Dùng pipeline asyncio (aiohttp) thay cho thread pool; --threads là số request đồng thời'
+    )
+    
+    parser.add_argument(
+        '--batch-size',
+        type=_positive_int,
+        default=DEFAULT_FRAME_BATCH_SIZE,
+        help=f'Số frames gửi chung trong 1 request VLM (mặc định: {DEFAULT_FRAME_BATCH_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--dedup',
+        type=float,
+        nargs='?',
+        const=DEFAULT_DEDUP_MAX_DIFF,
+        default=None,
+        metavar='MAX_DIFF',
+        help=f'Không gửi lại frames gần trùng lặp, dùng kết quả frame đại diện '
+             f'(ngưỡng chênh lệch 0-255, mặc định: {DEFAULT_DEDUP_MAX_DIFF})'
+    )
+    
+    parser.add_argument(
+        '--no-prefilter',
+        action='store_true',
+        help='Gửi VLM cả frames trống/đơn sắc (tắt lọc cục bộ)'
+    )
+    
+    parser.add_argument(
+        '--max-side',
+        type=int,
+        default=FRAME_MAX_SIDE,
+        help=f'Thu nhỏ frame để cạnh dài nhất <= MAX_SIDE px trước khi gửi VLM, 0 = giữ nguyên '
+             f'(mặc định: {FRAME_MAX_SIDE})'
+    )
+    
+    parser.add_argument(
+        '--image-format',
+        choices=list(IMAGE_FORMATS),
+        default=FRAME_IMAGE_FORMAT,
+        help=f'Định dạng ảnh gửi VLM (mặc định: {FRAME_IMAGE_FORMAT})'
+    )
+    
+    parser.add_argument(
+        '--image-quality',
+        type=int,
+        default=FRAME_IMAGE_QUALITY,
+        help=f'Chất lượng nén ảnh 1-100 (mặc định: {FRAME_IMAGE_QUALITY})'
+    )
+    
+    parser.add_argument(
+        '--decode-workers',
+        type=int,
+        default=os.cpu_count(),
+        help='Số process decode/encode frames khi kiểm tra folder (mặc định: số CPU core)'
+    )
+    
+    parser.add_argument(
+        '--rate-limit',
+        type=float,
+        default=VLM_RATE_LIMIT,
+        help='Số request/giây tối đa tới VLM, dùng chung cho frames và text (0 = không giới hạn)'
+    )
+    
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=VLM_MAX_RETRIES,
+        help=f'Số lần thử lại request VLM lỗi tạm thời (mặc định: {VLM_MAX_RETRIES})'
+    )
+    
+    parser.add_argument(
+        '--hedge',
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help='Gửi thêm 1 request khi request VLM chậm hơn p95 độ trễ gần đây, lấy kết quả thành công '
+             'về trước (mặc định theo VLM_HEDGE_ENABLED trong config)'
+    )
+    
+    parser.add_argument(
+        '--transcribe-chunk',
+        type=float,
+        default=TRANSCRIBE_CHUNK_SECONDS,
+        metavar='SECONDS',
+        help=f'Chia audio dài thành các đoạn <= SECONDS tại khoảng lặng và transcribe song song, '
+             f'0 = gửi nguyên file (mặc định: {TRANSCRIBE_CHUNK_SECONDS})'
+    )
+    
+    parser.add_argument(
+        '--no-vad',
+        action='store_true',
+        help='Luôn transcribe toàn bộ audio (không phát hiện giọng nói / cắt đoạn lặng)'
+    )
+    
+    parser.add_argument(
+        '--no-single-pass',
+        action='store_true',
+        help='Mở video 2 lần (ffmpeg cho audio, OpenCV cho frames) thay vì demux 1 lần'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Không dùng cache kết quả VLM (luôn gọi API)'
+    )
+    
+    parser.add_argument(
+        '--jsonl',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help='Ghi kết quả chi tiết của mỗi video (từng frame, thời gian từng bước) thành 1 dòng JSON '
+             'vào PATH (ghi nối tiếp); "-" = stdout, khi đó tự tắt log'
+    )
+    
+    parser.add_argument(
+        '--quiet',
+        action='store_true',
+        help='Không in log tiến độ'
+    )
+    
+    parser.add_argument(
+        '--metrics-json',
+        type=str,
+        default=None,
+        metavar='PATH',
+        help=f'Bật đo thời gian từng bước / đếm frames, bytes gửi đi và ghi ra PATH '
+             f'mỗi {METRICS_DUMP_INTERVAL_SECONDS}s và khi kết thúc'
+    )
+    
     args = parser.parse_args()
     
+    if args.quiet or args.jsonl == '-':
+        configure_output(verbose=False)
+    if args.metrics_json:
+        metrics.configure_metrics(enabled=True)
+        atexit.register(metrics.JsonMetricsDumper(args.metrics_json).start().stop)
+    
     # Kiểm tra video path
     if not os.path.exists(args.video_path):
-        print(f"❌ Lỗi: File không tồn tại - {args.video_path}")
+        log(f"❌ Lỗi: File không tồn tại - {args.video_path}")
         sys.exit(1)
     
-    if not is_video_file(args.video_path):
-        print(f"❌ Lỗi: File không phải là video - {args.video_path}")
+    batch_mode = os.path.isdir(args.video_path)
+    if not batch_mode and not is_video_file(args.video_path):
+        log(f"❌ Lỗi: File không phải là video - {args.video_path}")
         sys.exit(1)
     
+    if args.no_cache:
+        configure_result_cache(enabled=False)
+    configure_frame_encoding(args.max_side, args.image_format, args.image_quality)
+    if args.no_prefilter:
+        configure_prefilter(enabled=False)
+    if args.no_vad:
+        configure_vad(enabled=False)
+    configure_transcription(chunk_seconds=args.transcribe_chunk)
+    configure_vlm_retries(args.retries, args.hedge)
+    if args.rate_limit != VLM_RATE_LIMIT or args.threads != DEFAULT_MAX_THREADS:
+        # Limiter bắt đầu ở --threads request đồng thời (AIMD điều chỉnh từ đó)
+        configure_vlm_limiter(rate=args.rate_limit, initial=args.threads)
+    
     # Kiểm tra video
-    result = check_video_complete(
-        args.video_path,
+    options = dict(
         interval_seconds=args.interval,
-        max_workers=args.threads,
         keep_audio=args.keep_audio,
-        threshold_percent=args.threshold
+        threshold_percent=args.threshold,
+        sampling_mode=args.sampling_mode,
+        early_exit=args.early_exit,
+        batch_size=args.batch_size,
+        dedup_max_diff=args.dedup
     )
+    if batch_mode:
+        # Folder: decode/encode trong process pool, tổng request VLM của mọi video <= --threads
+        video_paths = find_video_files(args.video_path)
+        if not video_paths:
+            log(f"❌ Không tìm thấy video nào trong: {args.video_path}")
+            sys.exit(1)
+        writer = JsonLinesWriter(args.jsonl) if args.jsonl else None
+        try:
+            results = asyncio.run(check_videos_async(
+                video_paths, max_concurrency=args.threads, decode_workers=args.decode_workers,
+                on_report=writer.write if writer is not None else None, **options
+            ))
+        finally:
+            if writer is not None:
+                writer.close()
+        _print_batch_summary(results)
+        sys.exit(1 if any(r.lower().startswith('yes') for r in results.values()) else 0)
+    
+    if args.use_async:
+        report = asyncio.run(check_video_report_async(
+            args.video_path, max_concurrency=args.threads, **options
+        ))
+    else:
+        report = check_video_report(args.video_path, max_workers=args.threads,
+                                    single_pass=not args.no_single_pass, **options)
+    
+    if args.jsonl:
+        with JsonLinesWriter(args.jsonl) as writer:
+            writer.write(report)
     
     # Exit code: 0 nếu pass, 1 nếu có vi phạm
-    sys.exit(1 if result.lower().startswith('yes') else 0)
+    sys.exit(1 if report.result.lower().startswith('yes') else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+"""
+Đo thời gian từng bước và đếm frames / bytes trên hot path (video_utils, api_client).
+
+Mặc định tắt: mỗi lời gọi chỉ kiểm tra một biến bool rồi trả về. Bật bằng
+configure_metrics(enabled=True), đọc kết quả qua snapshot() (dict), render_prometheus()
+(text format cho endpoint /metrics) hoặc JsonMetricsDumper (ghi file JSON định kỳ).
+"""
+import os
+import json
+import time
+import bisect
+import threading
+from typing import Dict, Optional, Tuple
+
+from config import METRICS_ENABLED, METRICS_LATENCY_BUCKETS, METRICS_DUMP_INTERVAL_SECONDS
+
+
+_METRIC_PREFIX = "meta_ads_checker"
+
+_metrics_settings = {
+    "enabled": METRICS_ENABLED,
+}
+
+_lock = threading.Lock()
+_stages: Dict[str, "_Histogram"] = {}
+_counters: Dict[Tuple[str, str], float] = {}  # (tên counter, nhãn) → giá trị
+_started_at = time.time()
+
+
+class _Histogram:
+    """Histogram độ trễ với bucket cố định (giây), gọi khi đang giữ _lock"""
+    
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # phần tử cuối: > bucket lớn nhất
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Ước lượng phân vị q theo cận trên của bucket chứa nó"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def configure_metrics(enabled: Optional[bool] = None, reset: bool = False) -> dict:
+    """
+    Bật/tắt thu thập metrics.
+    
+    Args:
+        enabled: True/False, None = giữ nguyên
+        reset: Xóa các giá trị đã thu thập
+    
+    Returns:
+        Thiết lập hiện tại
+    """
+    global _started_at
+    if enabled is not None:
+        _metrics_settings["enabled"] = bool(enabled)
+    if reset:
+        with _lock:
+            _stages.clear()
+            _counters.clear()
+            _started_at = time.time()
+    return dict(_metrics_settings)
+
+
+def metrics_settings() -> dict:
+    return dict(_metrics_settings)
+
+
+# ===========================
+# GHI NHẬN
+# ===========================
+
+def observe(stage: str, seconds: float):
+    """Ghi thời gian (giây) của một lần chạy bước stage"""
+    if not _metrics_settings["enabled"]:
+        return
+    with _lock:
+        histogram = _stages.get(stage)
+        if histogram is None:
+            histogram = _stages[stage] = _Histogram()
+        histogram.observe(seconds)
+
+
+def _count(name: str, label: str, value: float):
+    if not _metrics_settings["enabled"]:
+        return
+    with _lock:
+        _counters[name, label] = _counters.get((name, label), 0) + value
+
+
+def frames(state: str, count: int = 1):
+    """Đếm frames theo trạng thái: sampled, sent, cached, errored, duplicate, prefiltered"""
+    _count("frames", state, count)
+
+
+def uploaded(kind: str, num_bytes: int):
+    """Đếm bytes gửi lên API theo loại request: vlm, transcribe"""
+    _count("upload_bytes", kind, num_bytes)
+
+
+def merge(values: dict):
+    """
+    Cộng dồn snapshot() của process khác (ví dụ process decode) vào metrics của process này.
+    Bucket của histogram phải giống nhau (cùng METRICS_LATENCY_BUCKETS trong config).
+    """
+    if not _metrics_settings["enabled"]:
+        return
+    with _lock:
+        for stage, values_stage in values["stages"].items():
+            histogram = _stages.get(stage)
+            if histogram is None:
+                histogram = _stages[stage] = _Histogram()
+            for i, count in enumerate(values_stage["buckets"].values()):
+                histogram.counts[i] += count
+            histogram.sum += values_stage["sum"]
+            histogram.count += values_stage["count"]
+        for name in ("frames", "upload_bytes"):
+            for label, value in values[name].items():
+                _counters[name, label] = _counters.get((name, label), 0) + value
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+    
+    def __init__(self, stage: str):
+        self.stage = stage
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        observe(self.stage, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timed(stage: str):
+    """Context manager đo thời gian một bước; khi metrics tắt trả về context manager rỗng dùng chung"""
+    return _Timer(stage) if _metrics_settings["enabled"] else _NO_TIMER
+
+
+# ===========================
+# XUẤT
+# ===========================
+
+def snapshot() -> dict:
+    """
+    Giá trị hiện tại dạng dict: mỗi bước có count/sum/avg/p50/p95/p99 (giây) và bucket,
+    counters frames và upload_bytes theo nhãn.
+    """
+    with _lock:
+        stages = {}
+        for stage, histogram in sorted(_stages.items()):
+            stages[stage] = {
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "avg": histogram.sum / histogram.count if histogram.count else None,
+                "p50": histogram.quantile(0.5),
+                "p95": histogram.quantile(0.95),
+                "p99": histogram.quantile(0.99),
+                "buckets": dict(zip([str(b) for b in histogram.buckets] + ["+Inf"],
+                                    histogram.counts)),
+            }
+        counters = {}
+        for (name, label), value in sorted(_counters.items()):
+            counters.setdefault(name, {})[label] = value
+    return {
+        "started_at": _started_at,
+        "time": time.time(),
+        "stages": stages,
+        "frames": counters.get("frames", {}),
+        "upload_bytes": counters.get("upload_bytes", {}),
+    }
+
+
+def render_prometheus() -> str:
+    """Các metrics theo Prometheus text exposition format (version 0.0.4)"""
+    lines = [
+        f"# HELP {_METRIC_PREFIX}_stage_seconds Thời gian từng bước xử lý (giây)",
+        f"# TYPE {_METRIC_PREFIX}_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage, histogram in sorted(_stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{_METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'{_METRIC_PREFIX}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} '
+                         f'{histogram.count}')
+            lines.append(f'{_METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'{_METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        
+        counters = sorted(_counters.items())
+    
+    for name, label_name, help_text in (
+        ("frames", "state", "Số frames theo trạng thái"),
+        ("upload_bytes", "kind", "Số bytes gửi lên API"),
+    ):
+        lines.append(f"# HELP {_METRIC_PREFIX}_{name}_total {help_text}")
+        lines.append(f"# TYPE {_METRIC_PREFIX}_{name}_total counter")
+        for (counter, label), value in counters:
+            if counter == name:
+                lines.append(f'{_METRIC_PREFIX}_{name}_total{{{label_name}="{label}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def dump_json(path: str):
+    """Ghi snapshot() ra file JSON (ghi file tạm rồi đổi tên, bên đọc không thấy file dở dang)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+class JsonMetricsDumper:
+    """Thread nền ghi snapshot ra file JSON mỗi interval_seconds, và lần cuối khi stop()"""
+    
+    def __init__(self, path: str, interval_seconds: float = METRICS_DUMP_INTERVAL_SECONDS):
+        self.path = path
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            dump_json(self.path)
+    
+    def start(self) -> "JsonMetricsDumper":
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        dump_json(self.path)
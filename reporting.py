@@ -0,0 +1,131 @@
+import sys
+import json
+import threading
+from types import MappingProxyType
+from typing import IO, Mapping, NamedTuple, Optional, Sequence
+
+
+# ===========================
+# LOG
+# ===========================
+
+_output_settings = {
+    "verbose": True,
+}
+
+
+def configure_output(verbose: Optional[bool] = None) -> dict:
+    """
+    Bật/tắt log tiến độ (print) của pipeline. Tắt khi chỉ cần kết quả dạng máy đọc
+    (JSON Lines) hoặc khi chạy nhiều video song song: mỗi print giữ lock của stdout.
+    
+    Returns:
+        Thiết lập hiện tại
+    """
+    if verbose is not None:
+        _output_settings["verbose"] = bool(verbose)
+    return dict(_output_settings)
+
+
+def output_settings() -> dict:
+    return dict(_output_settings)
+
+
+def log(*args, **kwargs):
+    """print() khi đang bật log, ngược lại bỏ qua"""
+    if _output_settings["verbose"]:
+        print(*args, **kwargs)
+
+
+# ===========================
+# KẾT QUẢ DẠNG CẤU TRÚC
+# ===========================
+
+def verdict_of(answer: str) -> str:
+    """Chuẩn hóa câu trả lời VLM về "Yes" / "No" / "Error" """
+    answer = answer.lower()
+    if answer.startswith('yes'):
+        return "Yes"
+    if answer.startswith('no'):
+        return "No"
+    return "Error"
+
+
+class FrameResult(NamedTuple):
+    """Kết quả kiểm tra một frame"""
+    index: int
+    verdict: str                       # "Yes" / "No" / "Error"
+    timestamp: Optional[float] = None  # Thời điểm của frame trong video (giây)
+    latency: Optional[float] = None    # Thời gian request VLM chứa frame này (giây)
+    raw_answer: Optional[str] = None   # Câu trả lời gốc của VLM (cả batch nếu gửi chung)
+    source: str = "vlm"                # "vlm", "cache", "duplicate" hoặc "prefilter"
+    
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+# Giá trị mặc định của NamedTuple dùng chung cho mọi instance → phải là kiểu không sửa được
+_EMPTY_MAPPING = MappingProxyType({})
+
+
+class VideoReport(NamedTuple):
+    """Kết quả kiểm tra một video: kết luận, kết quả từng nhánh, từng frame và thời gian từng bước"""
+    video_path: str
+    result: str                                         # "Yes" / "No" / "Error"
+    text_result: Optional[str] = None
+    frames_result: Optional[str] = None
+    frames: Sequence[FrameResult] = ()
+    counts: Mapping[str, int] = _EMPTY_MAPPING          # Như _FrameTally.counts()
+    timings: Mapping[str, float] = _EMPTY_MAPPING
+    cached: bool = False                          # Lấy từ cache kết quả video
+    error: Optional[str] = None
+    
+    def to_dict(self) -> dict:
+        record = self._asdict()
+        record["frames"] = [frame.to_dict() for frame in self.frames]
+        record["counts"] = dict(self.counts)
+        record["timings"] = dict(self.timings)
+        return record
+    
+    @classmethod
+    def from_dict(cls, record: dict) -> "VideoReport":
+        record = dict(record)
+        record["frames"] = [FrameResult(**frame) for frame in record.get("frames", [])]
+        return cls(**record)
+    
+    def to_json(self) -> str:
+        """Một dòng JSON (không xuống dòng bên trong), dùng cho JSON Lines"""
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+
+class JsonLinesWriter:
+    """
+    Ghi mỗi VideoReport thành một dòng JSON, an toàn khi gọi từ nhiều thread.
+    Mỗi dòng được flush ngay để bên đọc (tail -f, pipeline ingest) nhận được sớm.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: File đích (ghi nối tiếp), "-" = stdout
+        """
+        self._lock = threading.Lock()
+        self._owns_file = path != '-'
+        self._file: IO[str] = open(path, 'a', encoding='utf-8') if self._owns_file else sys.stdout
+    
+    def write(self, report: VideoReport):
+        line = report.to_json()
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+    
+    def close(self):
+        with self._lock:
+            if self._owns_file:
+                self._file.close()
+    
+    def __enter__(self) -> "JsonLinesWriter":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
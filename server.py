@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Service mode: chạy checker như một HTTP server lâu dài thay vì mỗi video một process.
+
+Job API:
+  POST /jobs                {"video_path": "...", "interval_seconds": 1, ...} → 202 {"job_id": ...}
+  GET  /jobs/<job_id>       trạng thái job (queued / running / done / failed)
+  GET  /jobs/<job_id>/result  200 + kết quả (kèm chi tiết từng frame) khi xong, 202 khi chưa xong
+  GET  /health              độ dài hàng đợi, số job, limiter VLM, cache
+  GET  /metrics             thời gian từng bước, số frames, bytes gửi đi (Prometheus text format)
+
+Ví dụ:
+  python server.py --port 8080 --workers 4
+  python server.py --unix-socket /run/checker.sock
+  curl -X POST localhost:8080/jobs -d '{"video_path": "/data/ad.mp4"}'
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from main import check_video_report
+from reporting import configure_output
+import metrics
+from video_utils import SAMPLING_MODES, is_video_file
+from api_client import get_http_client, get_vlm_limiter
+from cache import get_result_cache, configure_result_cache
+from config import (
+    DEFAULT_MAX_THREADS, SERVER_HOST, SERVER_PORT, SERVER_WORKERS, SERVER_QUEUE_SIZE,
+    SERVER_MAX_FINISHED_JOBS
+)
+
+
+# Tham số check_video_report mà client được phép truyền, kèm kiểu dữ liệu
+JOB_OPTIONS = {
+    "interval_seconds": (int, float),
+    "threshold_percent": (int, float),
+    "sampling_mode": str,
+    "early_exit": bool,
+    "batch_size": int,
+    "dedup_max_diff": (int, float, type(None)),
+    "single_pass": bool,
+}
+
+
+class Job:
+    """Một video cần kiểm tra và trạng thái xử lý"""
+    
+    def __init__(self, video_path: str, options: dict):
+        self.job_id = uuid.uuid4().hex
+        self.video_path = video_path
+        self.options = options
+        self.status = "queued"
+        self.result = None
+        self.report = None  # VideoReport.to_dict() khi xong
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+    
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+    
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "video_path": self.video_path,
+            "options": self.options,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def parse_job_request(body: dict) -> Job:
+    """
+    Kiểm tra body của POST /jobs và tạo Job.
+    
+    Raises:
+        ValueError: Thiếu video_path, file không phải video, hoặc tham số không hợp lệ
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Body phải là JSON object")
+    video_path = body.get("video_path")
+    if not isinstance(video_path, str) or not video_path:
+        raise ValueError("Thiếu video_path")
+    video_path = os.path.abspath(video_path)
+    if not os.path.isfile(video_path):
+        raise ValueError(f"File không tồn tại: {video_path}")
+    if not is_video_file(video_path):
+        raise ValueError(f"File không phải là video: {video_path}")
+    
+    options = {}
+    for name, value in body.items():
+        if name == "video_path":
+            continue
+        if name not in JOB_OPTIONS:
+            raise ValueError(f"Tham số không hỗ trợ: {name}")
+        # bool là int trong Python: không chấp nhận true/false cho tham số số
+        if not isinstance(value, JOB_OPTIONS[name]) or (isinstance(value, bool) and JOB_OPTIONS[name] is not bool):
+            raise ValueError(f"Giá trị không hợp lệ cho {name}: {value!r}")
+        options[name] = value
+    if options.get("sampling_mode", SAMPLING_MODES[0]) not in SAMPLING_MODES:
+        raise ValueError(f"sampling_mode không hợp lệ (hỗ trợ: {', '.join(SAMPLING_MODES)})")
+    # Viết dạng not (...) để NaN cũng bị từ chối
+    if "interval_seconds" in options and not options["interval_seconds"] > 0:
+        raise ValueError("interval_seconds phải > 0")
+    if "batch_size" in options and not options["batch_size"] >= 1:
+        raise ValueError("batch_size phải >= 1")
+    if "threshold_percent" in options and not 0 < options["threshold_percent"] <= 100:
+        raise ValueError("threshold_percent phải trong khoảng (0, 100]")
+    if options.get("dedup_max_diff") is not None and not options["dedup_max_diff"] >= 0:
+        raise ValueError("dedup_max_diff phải >= 0")
+    return Job(video_path, options)
+
+
+class CheckerService:
+    """
+    Hàng đợi job có giới hạn + các worker thread gọi check_video_report.
+    
+    HTTP client, limiter VLM và cache kết quả là singleton của process nên được
+    dùng chung (và giữ kết nối) giữa mọi job.
+    """
+    
+    def __init__(self, workers: int = SERVER_WORKERS, queue_size: int = SERVER_QUEUE_SIZE,
+                 max_workers: int = DEFAULT_MAX_THREADS,
+                 max_finished_jobs: int = SERVER_MAX_FINISHED_JOBS):
+        """
+        Args:
+            workers: Số video được kiểm tra đồng thời
+            queue_size: Số job tối đa đang chờ
+            max_workers: Số threads kiểm tra frames mỗi video
+            max_finished_jobs: Số job đã xong được giữ lại để tra kết quả
+        """
+        self.workers = workers
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.completed = 0
+        self.failed = 0
+    
+    def start(self):
+        # Khởi tạo trước pool kết nối, limiter và cache để job đầu tiên không phải chờ
+        get_http_client(min_pool_size=self.max_workers * self.workers)
+        get_vlm_limiter()
+        get_result_cache()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"checker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """Dừng các worker sau khi xử lý hết các job đã nhận"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+    
+    def submit(self, job: Job) -> Job:
+        """
+        Raises:
+            queue.Full: Hàng đợi đã đầy
+        """
+        with self._lock:
+            self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.job_id]
+            raise
+        return job
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        cache = get_result_cache()
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "running": statuses.count("running"),
+            "completed": self.completed,
+            "failed": self.failed,
+            "vlm": get_vlm_limiter().stats(),
+            "cache": cache.stats() if cache is not None else None,
+        }
+    
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                report = check_video_report(job.video_path, max_workers=self.max_workers,
+                                            **job.options)
+                job.result = report.result
+                job.report = report.to_dict()
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            job.finished_at = time.time()
+            self._job_finished(job)
+    
+    def _job_finished(self, job: Job):
+        """Đếm job đã xong, xóa các job đã xong cũ nhất khi vượt max_finished_jobs"""
+        with self._lock:
+            if job.status == "done":
+                self.completed += 1
+            else:
+                self.failed += 1
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+            for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+                del self._jobs[job_id]
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Cho phép keep-alive
+    
+    @property
+    def service(self) -> CheckerService:
+        return self.server.service
+    
+    def _send_json(self, status: int, body: dict, headers: Optional[dict] = None):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_text(self, status: int, text: str, content_type: str):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b""
+        if self.path.rstrip('/') != '/jobs':
+            self._send_json(404, {"error": "Không tìm thấy"})
+            return
+        try:
+            job = parse_job_request(json.loads(raw or b"{}"))
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "Body không phải JSON hợp lệ"})
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        try:
+            self.service.submit(job)
+        except queue.Full:
+            self._send_json(503, {"error": "Hàng đợi đầy, thử lại sau"}, {"Retry-After": "5"})
+            return
+        self._send_json(202, {"job_id": job.job_id, "status": job.status},
+                        {"Location": f"/jobs/{job.job_id}"})
+    
+    def do_GET(self):
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['health']:
+            self._send_json(200, self.service.stats())
+            return
+        if parts == ['metrics']:
+            self._send_text(200, metrics.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8')
+            return
+        if len(parts) in (2, 3) and parts[0] == 'jobs' and parts[2:] in ([], ['result']):
+            job = self.service.get(parts[1])
+            if job is None:
+                self._send_json(404, {"error": "Không tìm thấy job"})
+            elif len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            elif job.finished:
+                self._send_json(200, {"job_id": job.job_id, "status": job.status,
+                                      "result": job.result, "error": job.error,
+                                      "report": job.report})
+            else:
+                self._send_json(202, {"job_id": job.job_id, "status": job.status})
+            return
+        self._send_json(404, {"error": "Không tìm thấy"})
+    
+    def address_string(self):
+        # Client qua Unix socket không có địa chỉ IP
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+
+class _ServiceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class _UnixServiceServer(_ServiceServer):
+    address_family = socket.AF_UNIX
+    
+    def server_bind(self):
+        # HTTPServer.server_bind cần (host, port); socket Unix chỉ có đường dẫn
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def create_server(service: CheckerService, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                  unix_socket: Optional[str] = None) -> ThreadingHTTPServer:
+    """Tạo HTTP server (TCP hoặc Unix socket) phục vụ service"""
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = _UnixServiceServer(unix_socket, _ServiceHandler)
+    else:
+        server = _ServiceServer((host, port), _ServiceHandler)
+    server.service = service
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Chạy checker dạng HTTP service (job API)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__
+    )
+    parser.add_argument('--host', default=SERVER_HOST, help=f'Địa chỉ lắng nghe (mặc định: {SERVER_HOST})')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help=f'Cổng (mặc định: {SERVER_PORT})')
+    parser.add_argument('--unix-socket', default=None, metavar='PATH',
+                        help='Lắng nghe trên Unix socket thay vì TCP')
+    parser.add_argument('--workers', type=int, default=SERVER_WORKERS,
+                        help=f'Số video kiểm tra đồng thời (mặc định: {SERVER_WORKERS})')
+    parser.add_argument('--queue-size', type=int, default=SERVER_QUEUE_SIZE,
+                        help=f'Số job chờ tối đa (mặc định: {SERVER_QUEUE_SIZE})')
+    parser.add_argument('--threads', type=int, default=DEFAULT_MAX_THREADS,
+                        help=f'Số threads kiểm tra frames mỗi video (mặc định: {DEFAULT_MAX_THREADS})')
+    parser.add_argument('--no-cache', action='store_true', help='Không dùng cache kết quả VLM')
+    parser.add_argument('--quiet', action='store_true', help='Không in log tiến độ của từng video')
+    parser.add_argument('--no-metrics', action='store_true',
+                        help='Không thu thập metrics (GET /metrics trả về rỗng)')
+    args = parser.parse_args()
+    
+    if args.no_cache:
+        configure_result_cache(enabled=False)
+    if args.quiet:
+        configure_output(verbose=False)
+    metrics.configure_metrics(enabled=not args.no_metrics)
+    
+    service = CheckerService(args.workers, args.queue_size, args.threads)
+    service.start()
+    server = create_server(service, args.host, args.port, args.unix_socket)
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"🚀 Checker service đang chạy tại {where} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️  Đang dừng, đợi xử lý hết các job đã nhận...")
+    finally:
+        server.server_close()
+        service.stop()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
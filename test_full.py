@@ -1,12 +1,16 @@
 import cv2
 import base64
+import argparse
 import requests
 import json
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import sys
 import os
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
+
+from cache import get_result_cache, video_cache_key
+from job_store import JobStore, media_list_digest
 
 # ===========================
 # CONFIG
@@ -136,7 +140,8 @@ def check_image_nsfw(image_path, api_url):
     
     return result
 
-def check_video_nsfw(video_path, api_url, interval_seconds=2, max_workers=10, threshold_percent=20):
+def check_video_nsfw(video_path, api_url, interval_seconds=2, max_workers=10, threshold_percent=20,
+                     job_store: Optional[JobStore] = None, batch_id: Optional[str] = None):
     """
     Kiểm tra video NSFW với logic: cần >= threshold_percent% frames có kết quả "Yes" mới kết luận là "Yes"
     
@@ -146,34 +151,71 @@ def check_video_nsfw(video_path, api_url, interval_seconds=2, max_workers=10, th
         interval_seconds: Khoảng thời gian giữa các frames
         max_workers: Số threads tối đa
         threshold_percent: Ngưỡng phần trăm (mặc định 30%)
+        job_store: Lưu kết quả từng frame ngay khi có (cùng batch_id); frames đã có kết quả
+                   hợp lệ từ lần chạy trước không được gửi lại
+        batch_id: Batch trong job_store (JobStore.start_batch)
     
     Returns:
         "Yes" nếu >= threshold_percent% frames có "Yes", "No" nếu không
     """
+    # Video đã kiểm tra với cùng thiết lập → dùng lại kết quả
+    cache = get_result_cache()
+    cache_key = None
+    if cache is not None:
+        settings = {
+            "api_url": api_url,
+            "interval_seconds": interval_seconds,
+            "threshold_percent": threshold_percent,
+            "model": MODEL_NAME,
+            "prompt": PROMPT_TEMPLATE,
+        }
+        try:
+            cache_key = video_cache_key(cache.file_digest(video_path), settings)
+        except OSError as e:
+            print(f"⚠️  Không tính được digest video: {str(e)}")
+        cached = cache.get_json(cache_key) if cache_key is not None else None
+        if cached is not None:
+            print(f"KẾT QUẢ CUỐI CÙNG (cache): {cached['result']}")
+            if job_store is not None:
+                job_store.begin_media(batch_id, video_path)
+                job_store.finish_media(batch_id, video_path, cached['result'])
+            return cached['result']
+    
+    # Frames đã có kết quả hợp lệ từ lần chạy trước bị dừng giữa chừng
+    done = job_store.begin_media(batch_id, video_path) if job_store is not None else {}
+    
     frames = extract_frames(video_path, interval_seconds)
     
     if not frames:
         print("Không có frame nào được trích xuất!")
+        if job_store is not None:
+            job_store.finish_media(batch_id, video_path, "No")
         return "No"
     
-    print(f"\nBắt đầu kiểm tra {len(frames)} frames với {max_workers} threads...")
+    done = {i: result for i, result in done.items() if i < len(frames)}
+    if done:
+        print(f"♻️  Dùng lại kết quả {len(done)}/{len(frames)} frames từ lần chạy trước")
+    
+    print(f"\nBắt đầu kiểm tra {len(frames) - len(done)} frames với {max_workers} threads...")
     print(f"Ngưỡng: {threshold_percent}% frames phải có kết quả 'Yes' để kết luận vi phạm")
     
     # Thu thập tất cả kết quả
-    results = {}
-    yes_count = 0
-    valid_count = 0  # Số frames hợp lệ (không phải Error)
+    results = dict(done)
+    yes_count = sum(1 for result in done.values() if result.lower().startswith('yes'))
+    valid_count = len(done)  # Số frames hợp lệ (không phải Error)
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = {
             executor.submit(check_nsfw_frame, frame, i, api_url): i 
-            for i, frame in enumerate(frames)
+            for i, frame in enumerate(frames) if i not in done
         }
         
         # Chờ tất cả frames xong (không cancel sớm)
         for future in as_completed(futures):
             frame_index, result = future.result()
             results[frame_index] = result
+            if job_store is not None:
+                job_store.record_frame(batch_id, video_path, frame_index, result)
             
             # Đếm số frames có "Yes" và số frames hợp lệ
             if result.lower().startswith('yes'):
@@ -208,6 +250,19 @@ def check_video_nsfw(video_path, api_url, interval_seconds=2, max_workers=10, th
     
     print(f"\nKẾT QUẢ CUỐI CÙNG: {final_result}")
     
+    # Còn frame "Error" → lần chạy sau chỉ gửi lại các frame đó
+    if job_store is not None:
+        job_store.finish_media(batch_id, video_path, final_result, complete=valid_count == len(frames))
+    
+    # Chỉ lưu khi mọi frame đều có kết quả hợp lệ
+    if cache_key is not None and valid_count == len(frames):
+        cache.set_json(cache_key, {
+            "result": final_result,
+            "yes_count": yes_count,
+            "valid_count": valid_count,
+            "total_frames": len(frames),
+        })
+    
     return final_result
 
 def is_image_file(file_path):
@@ -218,15 +273,23 @@ def is_video_file(file_path):
     video_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.webm', '.m4v'}
     return Path(file_path).suffix.lower() in video_extensions
 
-def check_media_nsfw(media_path, api_url, interval_seconds=2, max_workers=10):
+def check_media_nsfw(media_path, api_url, interval_seconds=2, max_workers=10,
+                     job_store: Optional[JobStore] = None, batch_id: Optional[str] = None):
     if not os.path.exists(media_path):
         print(f"Lỗi: File không tồn tại - {media_path}")
         return "Error"
     
     if is_image_file(media_path):
-        return check_image_nsfw(media_path, api_url)
+        if job_store is not None:
+            job_store.begin_media(batch_id, media_path)
+        result = check_image_nsfw(media_path, api_url)
+        if job_store is not None:
+            job_store.finish_media(batch_id, media_path, result,
+                                   complete=result.lower().startswith(('yes', 'no')))
+        return result
     elif is_video_file(media_path):
-        return check_video_nsfw(media_path, api_url, interval_seconds, max_workers)
+        return check_video_nsfw(media_path, api_url, interval_seconds, max_workers,
+                                job_store=job_store, batch_id=batch_id)
     else:
         print(f"Lỗi: File không được hỗ trợ - {media_path}")
         print("Chỉ hỗ trợ: Ảnh (jpg, png, ...) và Video (mp4, avi, ...)")
@@ -258,26 +321,53 @@ def get_all_media_files(path: str) -> List[str]:
         print(f"Lỗi: Đường dẫn không tồn tại - {path}")
         return []
 
-def check_multiple_media(media_paths: List[str], api_url: str, interval_seconds=2, max_workers=10) -> Dict[str, str]:
+def check_multiple_media(media_paths: List[str], api_url: str, interval_seconds=2, max_workers=10,
+                         job_store: Optional[JobStore] = None, resume: bool = True) -> Dict[str, str]:
     """
     Kiểm tra nhiều file media và trả về kết quả dạng dictionary
+    
+    Có job_store: tiến độ được lưu liên tục, chạy lại cùng thiết lập và cùng danh sách file
+    sau khi bị dừng sẽ bỏ qua các file đã xong và chỉ gửi lại các frame chưa có kết quả
+    hoặc bị "Error". Batch xong hết thì tiến độ bị xóa, lần quét sau kiểm tra lại từ đầu;
+    resume=False bỏ tiến độ cũ ngay từ đầu.
     """
     results = {}
     total = len(media_paths)
+    batch_id = None
+    if job_store is not None:
+        batch_id = job_store.start_batch({
+            "api_url": api_url,
+            "interval_seconds": interval_seconds,
+            "model": MODEL_NAME,
+            "prompt": PROMPT_TEMPLATE,
+            "media": media_list_digest(media_paths),
+        }, resume=resume)
     
     print(f"\n{'='*60}")
     print(f"BẮT ĐẦU KIỂM TRA {total} FILE MEDIA")
     print(f"{'='*60}\n")
     
     for idx, media_path in enumerate(media_paths, 1):
+        finished = None
+        if job_store is not None and os.path.exists(media_path):
+            finished = job_store.finished_result(batch_id, media_path)
+        if finished is not None:
+            results[media_path] = finished
+            print(f"[{idx}/{total}] ⏭️  Đã kiểm tra ở lần chạy trước: {media_path} → {finished}")
+            continue
+        
         print(f"\n[{idx}/{total}] Đang kiểm tra: {media_path}")
         print("-" * 60)
         
-        result = check_media_nsfw(media_path, api_url, interval_seconds, max_workers)
+        result = check_media_nsfw(media_path, api_url, interval_seconds, max_workers,
+                                  job_store=job_store, batch_id=batch_id)
         results[media_path] = result
         
         print(f"Kết quả: {result}")
     
+    if job_store is not None:
+        job_store.finish_batch(batch_id)
+    
     return results
 
 def print_summary(results: Dict[str, str]):
@@ -320,6 +410,14 @@ def print_summary(results: Dict[str, str]):
     return len(violated) > 0
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kiểm tra hàng loạt ảnh/video theo chính sách quảng cáo Meta")
+    parser.add_argument(
+        '--fresh',
+        action='store_true',
+        help='Bỏ tiến độ của lần chạy trước bị dừng giữa chừng, kiểm tra lại mọi file'
+    )
+    args = parser.parse_args()
+    
     # Cấu hình mặc định
     INTERVAL_SECONDS = 1
     MAX_THREADS = 50
@@ -335,8 +433,10 @@ if __name__ == "__main__":
         print("Không tìm thấy file media nào!")
         sys.exit(1)
     
-    # Kiểm tra tất cả file
-    results = check_multiple_media(media_files, API_URL, INTERVAL_SECONDS, MAX_THREADS)
+    # Kiểm tra tất cả file; tiến độ lưu vào job store nên chạy lại sẽ tiếp tục từ chỗ dừng
+    job_store = JobStore()
+    results = check_multiple_media(media_files, API_URL, INTERVAL_SECONDS, MAX_THREADS,
+                                   job_store=job_store, resume=not args.fresh)
     
     # In tổng kết
     has_violation = print_summary(results)
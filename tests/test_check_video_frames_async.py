@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+import numpy as np
+
+import main
+
+
+def test_early_stop_returns_every_semaphore_permit(monkeypatch):
+    """
+    Nhánh text kết luận vi phạm (stop_event) trong lúc đang decode frame: task vừa tạo bị
+    cancel trước khi kịp chạy vẫn phải trả lại slot của semaphore dùng chung.
+    """
+    async def check_frames_batch_vlm_async(frames, indices, client=None, details=None):
+        await asyncio.sleep(1)
+        return [(index, "No") for index in indices]
+
+    monkeypatch.setattr(main, "check_frames_batch_vlm_async", check_frames_batch_vlm_async)
+    rng = np.random.default_rng(0)
+
+    async def check_video(semaphore):
+        loop = asyncio.get_running_loop()
+        stop_event = asyncio.Event()
+
+        def frames():
+            for i in range(10):
+                if i == 1:
+                    # Nhánh text trả lời "Yes" trong lúc frame đang được decode
+                    loop.call_soon_threadsafe(stop_event.set)
+                    time.sleep(0.05)
+                yield rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+
+        return await main.check_video_frames_async(
+            frames(), semaphore, early_exit=True, stop_event=stop_event
+        )
+
+    async def run():
+        semaphore = asyncio.Semaphore(8)
+        for _ in range(6):
+            assert await check_video(semaphore) == "Skipped"
+            assert semaphore._value == 8
+
+    asyncio.run(run())
@@ -1,57 +1,518 @@
 import cv2
 import os
+import shutil
 import subprocess
+import numpy as np
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+import queue
 import tempfile
+import threading
+import time
 
+from config import (
+    DEFAULT_FRAME_SAMPLING_MODE, DEFAULT_SEEK_MIN_GAP_FRAMES,
+    DEFAULT_DEDUP_MAX_DIFF, DEDUP_THUMB_SIZE, DEDUP_WINDOW,
+    SCENE_ANALYSIS_FPS, SCENE_CHANGE_THRESHOLD, SCENE_FLOOR_SECONDS, SCENE_MIN_GAP_SECONDS,
+    SCENE_MAX_FRAMES, DEMUX_MAX_BUFFERED_FRAMES,
+    PREFILTER_ENABLED, PREFILTER_THUMB_SIZE, PREFILTER_MAX_ENTROPY, PREFILTER_MAX_EDGE_RATIO,
+    PREFILTER_MAX_SKIN_RATIO, PREFILTER_EDGE_SIZE
+)
+from audio_utils import AUDIO_SAMPLE_RATE, pcm_to_wav
+from reporting import log
+import metrics
 
-def extract_frames(video_path: str, interval_seconds: float = 1) -> List:
+
+SAMPLING_MODES = ("read", "grab", "seek", "ffmpeg", "scene")
+
+
+def _frame_interval(fps: float, interval_seconds: float) -> int:
+    """Số frame giữa 2 lần lấy mẫu (tối thiểu 1)"""
+    frame_interval = int(fps * interval_seconds)
+    if frame_interval == 0:
+        frame_interval = 1
+    return frame_interval
+
+
+def _sample_read(cap, frame_interval: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """Decode toàn bộ frames, giữ lại mỗi frame_interval frame (cách cũ)"""
+    frame_count = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if frame_count % frame_interval == 0:
+            yield frame_count, frame
+        frame_count += 1
+
+
+def _sample_grab(cap, frame_interval: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """grab() mọi frame nhưng chỉ retrieve() (convert sang BGR) frame được chọn"""
+    frame_count = 0
+    while cap.grab():
+        if frame_count % frame_interval == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield frame_count, frame
+        frame_count += 1
+
+
+def _sample_seek(cap, frame_interval: int, total_frames: int,
+                 min_gap: int = DEFAULT_SEEK_MIN_GAP_FRAMES) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Nhảy thẳng tới các frame cần lấy.
+
+    Seek buộc decoder decode lại từ keyframe gần nhất, nên khi khoảng cách
+    tới frame tiếp theo nhỏ hơn min_gap thì grab() tiến tới sẽ rẻ hơn.
+    """
+    if total_frames <= 0:
+        # Không biết độ dài video (stream, container lỗi) → không seek được
+        yield from _sample_grab(cap, frame_interval)
+        return
+
+    position = 0  # Index của frame sẽ được decode tiếp theo
+    for target in range(0, total_frames, frame_interval):
+        if target - position >= min_gap:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        else:
+            while position < target:
+                if not cap.grab():
+                    return
+                position += 1
+        ret, frame = cap.read()
+        if not ret:
+            return
+        position = target + 1
+        yield target, frame
+
+
+def _read_exact(stream, size: int) -> Optional[bytearray]:
+    """Đọc đúng size bytes từ pipe, None nếu pipe kết thúc trước"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = stream.readinto(view[received:])
+        if not n:
+            return None
+        received += n
+    return buffer
+
+
+def _sample_ffmpeg(video_path: str, frame_interval: int,
+                   width: int, height: int) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Đọc frames qua pipe rawvideo từ ffmpeg.
+
+    Filter select chỉ giữ frame thứ n với n % frame_interval == 0 (khớp với các
+    mode khác), scale ép về đúng kích thước mà OpenCV báo để cắt buffer chính xác.
+    """
+    cmd = [
+        'ffmpeg',
+        '-nostdin',
+        '-loglevel', 'error',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f"select='not(mod(n\\,{frame_interval}))',scale={width}:{height}",
+        '-vsync', '0',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'bgr24',
+        '-'
+    ]
+    frame_size = width * height * 3
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        index = 0
+        while True:
+            buffer = _read_exact(proc.stdout, frame_size)
+            if buffer is None:
+                break
+            yield index * frame_interval, np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+            index += 1
+    finally:
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+
+def _sample_scene(cap, fps: float, total_frames: int,
+                  analysis_fps: float = SCENE_ANALYSIS_FPS,
+                  threshold: float = SCENE_CHANGE_THRESHOLD,
+                  floor_seconds: float = SCENE_FLOOR_SECONDS,
+                  min_gap_seconds: float = SCENE_MIN_GAP_SECONDS,
+                  max_frames: int = SCENE_MAX_FRAMES) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Lấy frames theo nội dung: frame đầu tiên, frame ngay sau mỗi lần chuyển cảnh,
+    và ít nhất 1 frame mỗi floor_seconds cho các cảnh tĩnh dài.
+    
+    Cứ mỗi 1/analysis_fps giây, frame được thu nhỏ thành ảnh grayscale và so với frame
+    phân tích trước đó (cắt cảnh) và với frame được lấy gần nhất (thay đổi từ từ).
+    Khi biết độ dài video, khoảng cách tối thiểu giữa 2 frame được nới ra để tổng số
+    frames không vượt quá max_frames.
+    """
+    analysis_step = _frame_interval(fps, 1 / analysis_fps)
+    floor_gap = max(1, int(fps * floor_seconds))
+    min_gap = max(1, int(fps * min_gap_seconds))
+    if total_frames > 0:
+        min_gap = max(min_gap, total_frames // max_frames)
+        floor_gap = max(floor_gap, min_gap)
+    
+    frame_count = 0
+    emitted = 0
+    last_emitted = None
+    prev_thumb = None
+    emitted_thumb = None
+    while emitted < max_frames and cap.grab():
+        n = frame_count
+        frame_count += 1
+        if n % analysis_step:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            break
+        thumb = frame_thumbnail(frame)
+        
+        if last_emitted is None:
+            emit = True
+        else:
+            gap = n - last_emitted
+            changed = (float(np.mean(np.abs(thumb - prev_thumb))) > threshold or
+                       float(np.mean(np.abs(thumb - emitted_thumb))) > threshold)
+            emit = gap >= floor_gap or (changed and gap >= min_gap)
+        prev_thumb = thumb
+        
+        if emit:
+            last_emitted = n
+            emitted_thumb = thumb
+            emitted += 1
+            yield n, frame
+
+
+def _sample_frames(video_path: str, interval_seconds: float,
+                   mode: str) -> Iterator[Tuple[float, np.ndarray]]:
+    """Mở video và lấy mẫu frames theo mode, yield (thời điểm frame tính bằng giây, frame)"""
+    if mode not in SAMPLING_MODES:
+        raise ValueError(f"Mode lấy mẫu không hợp lệ: {mode} (hỗ trợ: {', '.join(SAMPLING_MODES)})")
+
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        log(f"Không thể mở video: {video_path}")
+        return
+
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if fps <= 0:
+            log(f"Không thể lấy FPS từ video: {video_path}")
+            return
+
+        frame_interval = _frame_interval(fps, interval_seconds)
+
+        if mode == "ffmpeg":
+            if shutil.which('ffmpeg') is None:
+                log("Không tìm thấy ffmpeg, chuyển sang mode seek")
+                mode = "seek"
+            else:
+                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                cap.release()
+                samples = _sample_ffmpeg(video_path, frame_interval, width, height)
+
+        if mode == "scene":
+            samples = _sample_scene(cap, fps, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        elif mode == "read":
+            samples = _sample_read(cap, frame_interval)
+        elif mode == "grab":
+            samples = _sample_grab(cap, frame_interval)
+        elif mode == "seek":
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            samples = _sample_seek(cap, frame_interval, total_frames)
+
+        for frame_number, frame in samples:
+            yield frame_number / fps, frame
+    finally:
+        cap.release()
+
+
+def estimate_frame_samples(video_path: str, interval_seconds: float = 1,
+                           mode: str = DEFAULT_FRAME_SAMPLING_MODE) -> Optional[int]:
+    """
+    Ước lượng số frames iter_frames/extract_frames sẽ trả về, dựa trên metadata
+    (CAP_PROP_FRAME_COUNT) mà không decode.
+    
+    Returns:
+        Số frames dự kiến, hoặc None nếu container không có thông tin độ dài
+        hoặc số frames phụ thuộc nội dung (mode "scene")
+    """
+    if mode == "scene":
+        return None
+    cap = cv2.VideoCapture(video_path)
+    try:
+        if not cap.isOpened():
+            return None
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if fps <= 0 or total_frames <= 0:
+            return None
+        frame_interval = _frame_interval(fps, interval_seconds)
+        return (total_frames + frame_interval - 1) // frame_interval
+    finally:
+        cap.release()
+
+
+def max_frame_samples(video_path: str, interval_seconds: float = 1,
+                      mode: str = DEFAULT_FRAME_SAMPLING_MODE) -> Optional[int]:
+    """
+    Số frames tối đa iter_frames có thể trả về, None nếu không biết chắc.
+    
+    Chỉ mode "seek" có cận trên chắc chắn (nó chỉ lấy các frame trong khoảng
+    CAP_PROP_FRAME_COUNT). Các mode khác decode tới hết stream, còn CAP_PROP_FRAME_COUNT
+    chỉ là ước lượng từ metadata và có thể ít hơn số frame thật.
+    """
+    if mode != "seek":
+        return None
+    return estimate_frame_samples(video_path, interval_seconds, mode)
+
+
+def iter_frames(video_path: str, interval_seconds: float = 1,
+                mode: str = DEFAULT_FRAME_SAMPLING_MODE,
+                timestamps: Optional[List[float]] = None) -> Iterator[np.ndarray]:
+    """
+    Generator trả về từng frame ngay khi được decode (không giữ cả video trong RAM).
+    
+    Args:
+        video_path: Đường dẫn đến file video
+        interval_seconds: Khoảng thời gian giữa các frames (giây)
+        mode: Cách lấy mẫu frames ("read", "grab", "seek", "ffmpeg", "scene")
+        timestamps: List (nếu có) được thêm thời điểm (giây) của mỗi frame trước khi yield
+    
+    Yields:
+        Frames (numpy arrays) theo thứ tự thời gian
+    """
+    count = 0
+    started = time.perf_counter()
+    for timestamp, frame in _sample_frames(video_path, interval_seconds, mode):
+        # Thời gian decode (kể cả seek/bỏ qua frames) cho tới frame được lấy mẫu này
+        metrics.observe("decode", time.perf_counter() - started)
+        metrics.frames("sampled")
+        count += 1
+        if timestamps is not None:
+            timestamps.append(timestamp)
+        yield frame
+        started = time.perf_counter()
+    log(f"Tổng số frames trích xuất: {count}")
+
+
+def extract_frames(video_path: str, interval_seconds: float = 1,
+                   mode: str = DEFAULT_FRAME_SAMPLING_MODE) -> List:
     """
     Trích xuất frames từ video theo khoảng thời gian.
     
     Args:
         video_path: Đường dẫn đến file video
         interval_seconds: Khoảng thời gian giữa các frames (giây)
+        mode: Cách lấy mẫu frames ("read", "grab", "seek", "ffmpeg", "scene")
     
     Returns:
         List các frames (numpy arrays)
     """
-    frames = []
-    cap = cv2.VideoCapture(video_path)
+    return list(iter_frames(video_path, interval_seconds, mode))
+
+
+class EncodedFrame(NamedTuple):
+    """Frame đã được encode sẵn (ví dụ trong process decode), kèm ảnh thu nhỏ để dedup"""
+    data: bytes
+    thumbnail: np.ndarray
+
+
+def frame_thumbnail(frame: np.ndarray, size: int = DEDUP_THUMB_SIZE) -> np.ndarray:
+    """Ảnh grayscale thu nhỏ size x size (float32) dùng để so sánh frames"""
+    if isinstance(frame, EncodedFrame):
+        return frame.thumbnail
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class FrameDeduper:
+    """
+    Nhóm các frames gần trùng lặp (video talking-head, slideshow...).
     
-    if not cap.isOpened():
-        print(f"Không thể mở video: {video_path}")
-        return frames
+    Mỗi frame được so sánh với các frame đại diện gần nhất qua chênh lệch trung bình của
+    ảnh thu nhỏ; frame trùng trả về index của đại diện để dùng lại kết quả VLM,
+    frame khác biệt trở thành đại diện mới.
+    """
     
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps <= 0:
-        print(f"Không thể lấy FPS từ video: {video_path}")
-        cap.release()
-        return frames
+    def __init__(self, max_diff: float = DEFAULT_DEDUP_MAX_DIFF, window: int = DEDUP_WINDOW,
+                 thumb_size: int = DEDUP_THUMB_SIZE):
+        """
+        Args:
+            max_diff: Chênh lệch trung bình tối đa (thang 0-255) để coi là trùng
+            window: Số frame đại diện gần nhất được so sánh
+            thumb_size: Kích thước ảnh thu nhỏ
+        """
+        self.max_diff = max_diff
+        self.window = window
+        self.thumb_size = thumb_size
+        self.duplicates = 0
+        self._representatives = []  # [(frame_index, thumbnail)], mới nhất ở cuối
     
-    frame_interval = int(fps * interval_seconds)
-    if frame_interval == 0:
-        frame_interval = 1
+    def representative(self, frame_index: int, frame: np.ndarray) -> Optional[int]:
+        """
+        Returns:
+            Index của frame đại diện nếu frame trùng lặp, None nếu frame là đại diện mới
+        """
+        thumb = frame_thumbnail(frame, self.thumb_size)
+        for rep_index, rep_thumb in reversed(self._representatives):
+            if float(np.mean(np.abs(thumb - rep_thumb))) <= self.max_diff:
+                self.duplicates += 1
+                metrics.frames("duplicate")
+                return rep_index
+        
+        self._representatives.append((frame_index, thumb))
+        if len(self._representatives) > self.window:
+            self._representatives.pop(0)
+        return None
+
+
+_prefilter_settings = {
+    "enabled": PREFILTER_ENABLED,
+    "thumb_size": PREFILTER_THUMB_SIZE,
+    "edge_size": PREFILTER_EDGE_SIZE,
+    "max_entropy": PREFILTER_MAX_ENTROPY,
+    "max_edge_ratio": PREFILTER_MAX_EDGE_RATIO,
+    "max_skin_ratio": PREFILTER_MAX_SKIN_RATIO,
+}
+
+# Chênh lệch độ sáng giữa 2 pixel kề nhau (thang 0-255) để tính là biên
+_EDGE_THRESHOLD = 24
+
+
+def configure_prefilter(enabled: Optional[bool] = None, **settings) -> dict:
+    """
+    Bật/tắt lọc cục bộ hoặc đổi ngưỡng (các key như _prefilter_settings, None = giữ nguyên).
     
-    frame_count = 0
+    Returns:
+        Thiết lập hiện tại
+    """
+    if enabled is not None:
+        _prefilter_settings["enabled"] = enabled
+    for name, value in settings.items():
+        if name not in _prefilter_settings:
+            raise ValueError(f"Thiết lập lọc frames không hợp lệ: {name}")
+        if value is not None:
+            _prefilter_settings[name] = value
+    return dict(_prefilter_settings)
+
+
+def prefilter_settings() -> dict:
+    """Thiết lập lọc cục bộ hiện tại (dùng cho cache key)"""
+    return dict(_prefilter_settings)
+
+
+def _prefilter_planes(frame, thumb_size: int,
+                      edge_size: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    (ảnh màu BGR thu nhỏ thumb_size x thumb_size, ảnh xám edge_size x edge_size) của frame;
+    EncodedFrame được decode ở 1/4 kích thước. None nếu không decode được.
+    """
+    if isinstance(frame, EncodedFrame):
+        frame = cv2.imdecode(np.frombuffer(frame.data, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+        if frame is None:
+            return None
+    elif frame.ndim == 2:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    thumb = cv2.resize(frame, (thumb_size, thumb_size), interpolation=cv2.INTER_AREA)
+    gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (edge_size, edge_size),
+                      interpolation=cv2.INTER_AREA)
+    return thumb, gray
+
+
+def _stretch_contrast(y: np.ndarray) -> np.ndarray:
+    """
+    Kéo giãn độ sáng từng ảnh (n, h, w) về 0-255 để cảnh tối có chi tiết không bị coi là
+    trống; ảnh gần như phẳng (chỉ có nhiễu nén) giữ nguyên.
+    """
+    low = y.min(axis=(1, 2), keepdims=True)
+    spread = y.max(axis=(1, 2), keepdims=True) - low
+    return (y - low) * np.where(spread >= 16, 255 / np.maximum(spread, 1), 1)
+
+
+class FramePrefilter:
+    """
+    Phân loại nhanh trên CPU trước khi gửi VLM: frame gần như trống (entropy độ sáng thấp,
+    hầu như không có biên, không có màu da) chắc chắn an toàn → kết luận "No" tại chỗ;
+    mọi frame khác (kể cả slide chữ, vì chữ có thể vi phạm) vẫn được gửi VLM.
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    Các chỉ số được tính vector hóa trên cả batch ảnh thu nhỏ; riêng biên được tìm trên
+    ảnh xám lớn hơn (edge_size) để chữ nhỏ không bị làm mờ mất khi thu nhỏ.
+    """
+    
+    def __init__(self, settings: Optional[dict] = None):
+        self.settings = dict(settings or _prefilter_settings)
+        self.checked = 0
+        self.skipped = 0
+    
+    def measure(self, frames: Sequence) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns:
+            (entropy, tỉ lệ biên, tỉ lệ màu da, decode được) - mỗi mảng dài len(frames)
+        """
+        size = self.settings["thumb_size"]
+        edge_size = self.settings["edge_size"]
+        planes = [_prefilter_planes(frame, size, edge_size) for frame in frames]
+        ok = np.array([plane is not None for plane in planes])
+        blank = (np.zeros((size, size, 3), dtype=np.uint8), np.zeros((edge_size, edge_size), dtype=np.uint8))
+        planes = [plane if plane is not None else blank for plane in planes]
+        stack = np.stack([thumb for thumb, _ in planes]).astype(np.float32)
         
-        if frame_count % frame_interval == 0:
-            frames.append(frame)
+        b, g, r = stack[..., 0], stack[..., 1], stack[..., 2]
+        y = 0.299 * r + 0.587 * g + 0.114 * b
+        cr = (r - y) * 0.713 + 128
+        cb = (b - y) * 0.564 + 128
+        skin = ((cr >= 133) & (cr <= 173) & (cb >= 77) & (cb <= 127) & (y > 40)).mean(axis=(1, 2))
         
-        frame_count += 1
+        # Histogram 32 mức độ sáng của từng frame trong 1 lần bincount
+        y = _stretch_contrast(y)
+        n = len(frames)
+        bins = np.clip(y / 8, 0, 31).astype(np.int64) + np.arange(n)[:, None, None] * 32
+        p = np.bincount(bins.ravel(), minlength=n * 32).reshape(n, 32) / (size * size)
+        entropy = np.abs(np.sum(np.where(p > 0, p * np.log2(np.where(p > 0, p, 1)), 0), axis=1))
+        
+        gray = _stretch_contrast(np.stack([gray for _, gray in planes]).astype(np.float32))
+        gx = np.abs(np.diff(gray, axis=2))[:, :-1, :] > _EDGE_THRESHOLD
+        gy = np.abs(np.diff(gray, axis=1))[:, :, :-1] > _EDGE_THRESHOLD
+        edges = (gx | gy).mean(axis=(1, 2))
+        return entropy, edges, skin, ok
     
-    cap.release()
-    print(f"Tổng số frames trích xuất: {len(frames)}")
-    return frames
+    def triage(self, frames: Sequence) -> np.ndarray:
+        """
+        Returns:
+            Mảng bool: True = frame an toàn chắc chắn, không cần gửi VLM
+        """
+        if not len(frames):
+            return np.zeros(0, dtype=bool)
+        with metrics.timed("prefilter"):
+            entropy, edges, skin, ok = self.measure(frames)
+        trivial = (ok & (entropy <= self.settings["max_entropy"])
+                   & (edges <= self.settings["max_edge_ratio"])
+                   & (skin <= self.settings["max_skin_ratio"]))
+        self.checked += len(frames)
+        self.skipped += int(trivial.sum())
+        metrics.frames("prefiltered", int(trivial.sum()))
+        return trivial
+
+
+# ffmpeg báo lỗi này khi video không có audio track để xuất (không phải lỗi đọc file)
+_NO_AUDIO_STREAM_MESSAGE = "does not contain any stream"
 
 
-def extract_audio(video_path: str, output_path: Optional[str] = None) -> str:
+def _has_no_audio_stream(error: subprocess.CalledProcessError) -> bool:
+    return _NO_AUDIO_STREAM_MESSAGE in (error.stderr or b"").decode(errors='replace')
+
+
+def extract_audio(video_path: str, output_path: Optional[str] = None) -> Optional[str]:
     """
     Tách audio từ video và lưu thành file WAV.
     
@@ -60,13 +521,13 @@ def extract_audio(video_path: str, output_path: Optional[str] = None) -> str:
         output_path: Đường dẫn file audio output (nếu None sẽ tạo temp file)
     
     Returns:
-        Đường dẫn đến file audio đã tách
+        Đường dẫn đến file audio đã tách, None nếu video không có audio track
     """
     if output_path is None:
-        # Tạo temp file với extension .wav
-        temp_dir = tempfile.gettempdir()
-        video_name = Path(video_path).stem
-        output_path = os.path.join(temp_dir, f"{video_name}_audio.wav")
+        # Tạo temp file với extension .wav; tên duy nhất để 2 video trùng tên xử lý song song
+        # không ghi đè file của nhau
+        fd, output_path = tempfile.mkstemp(prefix=f"{Path(video_path).stem}_", suffix="_audio.wav")
+        os.close(fd)
     
     # Đảm bảo thư mục output tồn tại
     os.makedirs(os.path.dirname(output_path) if os.path.dirname(output_path) else '.', exist_ok=True)
@@ -84,22 +545,263 @@ def extract_audio(video_path: str, output_path: Optional[str] = None) -> str:
             output_path
         ]
         
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True
-        )
+        with metrics.timed("ffmpeg_audio"):
+            result = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True
+            )
         
-        print(f"Đã tách audio thành công: {output_path}")
+        log(f"Đã tách audio thành công: {output_path}")
         return output_path
         
     except subprocess.CalledProcessError as e:
-        print(f"Lỗi khi tách audio: {e.stderr.decode()}")
+        if _has_no_audio_stream(e):
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+        log(f"Lỗi khi tách audio: {e.stderr.decode()}")
+        raise
+    except FileNotFoundError:
+        log("Lỗi: Không tìm thấy ffmpeg. Vui lòng cài đặt ffmpeg.")
+        raise
+
+
+def extract_audio_bytes(video_path: str) -> bytes:
+    """
+    Tách audio từ video thành WAV trong bộ nhớ (ffmpeg ghi PCM ra stdout), không qua
+    file tạm trên đĩa.
+    
+    Args:
+        video_path: Đường dẫn đến file video
+    
+    Returns:
+        Nội dung file WAV (PCM 16-bit, 16kHz, mono); b"" nếu video không có audio track
+    """
+    cmd = [
+        'ffmpeg',
+        '-nostdin',
+        '-i', video_path,
+        '-vn',  # Không copy video
+        '-acodec', 'pcm_s16le',  # PCM 16-bit
+        '-ar', str(AUDIO_SAMPLE_RATE),  # Sample rate 16kHz (phù hợp cho speech recognition)
+        '-ac', '1',  # Mono
+        '-f', 's16le',
+        '-'
+    ]
+    try:
+        with metrics.timed("ffmpeg_audio"):
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    except subprocess.CalledProcessError as e:
+        if _has_no_audio_stream(e):
+            return b""
+        log(f"Lỗi khi tách audio: {e.stderr.decode()}")
         raise
     except FileNotFoundError:
-        print("Lỗi: Không tìm thấy ffmpeg. Vui lòng cài đặt ffmpeg.")
+        log("Lỗi: Không tìm thấy ffmpeg. Vui lòng cài đặt ffmpeg.")
         raise
+    
+    return pcm_to_wav(result.stdout)
+
+
+_DEMUX_DONE = object()
+
+
+class MediaDemuxer:
+    """
+    Đọc video 1 lần cho cả 2 nhánh: 1 tiến trình ffmpeg decode, xuất frames lấy mẫu
+    (PPM qua stdout) và audio PCM 16kHz mono (qua pipe thứ 2) cùng lúc, thay vì
+    extract_audio + cv2.VideoCapture mở và parse container 2 lần.
+    
+    Frames được lấy bằng filter fps của ffmpeg (1 frame mỗi interval_seconds), kích thước
+    đọc từ header PPM nên không cần mở video trước để lấy metadata. Một thread nền đọc
+    frames vào hàng đợi (tối đa max_buffered_frames) và gom audio; audio chỉ hoàn tất
+    khi ffmpeg chạy hết video, nên frames() cần được tiêu thụ song song hoặc close_frames()
+    (kể cả khi frames() chưa từng được đọc). Video có nhiều frames hơn hàng đợi thì audio
+    phải chờ nhánh frames, nên chỉ nên dùng khi số frames lấy mẫu vừa hàng đợi.
+    
+    Dùng:
+        demuxer = MediaDemuxer(video_path, interval_seconds)
+        frames = demuxer.frames()       # nhánh frames
+        audio = demuxer.audio_bytes()   # nhánh audio (thread khác)
+        demuxer.close_frames()
+        demuxer.close()
+    """
+    
+    def __init__(self, video_path: str, interval_seconds: float = 1,
+                 max_buffered_frames: int = DEMUX_MAX_BUFFERED_FRAMES):
+        self.video_path = video_path
+        self.interval_seconds = interval_seconds
+        self.frame_count = 0
+        self._frames = queue.Queue(maxsize=max(1, max_buffered_frames))
+        self._frames_closed = threading.Event()
+        self._stopped = threading.Event()
+        self._proc = None
+        self._audio = b""
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def _command(self, audio_fd: Optional[int]) -> List[str]:
+        cmd = [
+            'ffmpeg',
+            '-nostdin',
+            '-loglevel', 'error',
+            '-i', self.video_path,
+            '-map', '0:v:0',
+            '-vf', f"fps={1 / self.interval_seconds:g}",
+            '-f', 'image2pipe',
+            '-c:v', 'ppm',
+            'pipe:1'
+        ]
+        if audio_fd is not None:
+            cmd += [
+                '-map', '0:a:0?',
+                '-acodec', 'pcm_s16le',
+                '-ar', str(AUDIO_SAMPLE_RATE),
+                '-ac', '1',
+                '-f', 's16le',
+                f'pipe:{audio_fd}'
+            ]
+        return cmd
+    
+    def _run(self):
+        try:
+            # Video không có audio track: ffmpeg từ chối output audio rỗng ngay từ đầu
+            # → chạy lại chỉ với frames
+            if (not self._demux(with_audio=True) and not self._frames_closed.is_set()
+                    and not self._stopped.is_set()):
+                self._demux(with_audio=False)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._put(_DEMUX_DONE)
+    
+    def _demux(self, with_audio: bool) -> bool:
+        """Chạy ffmpeg; False nếu ffmpeg lỗi trước khi ra frame nào"""
+        read_fd = write_fd = None
+        if with_audio:
+            read_fd, write_fd = os.pipe()
+        try:
+            self._proc = subprocess.Popen(
+                self._command(write_fd), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                pass_fds=(write_fd,) if with_audio else ()
+            )
+        except Exception:
+            if with_audio:
+                os.close(read_fd)
+                os.close(write_fd)
+            raise
+        if self._stopped.is_set():
+            self._proc.kill()
+        
+        chunks = []
+        audio_reader = None
+        if with_audio:
+            os.close(write_fd)
+            audio_pipe = os.fdopen(read_fd, 'rb')
+            # Audio phải được đọc liên tục, nếu không ffmpeg sẽ nghẽn khi pipe audio đầy
+            audio_reader = threading.Thread(target=lambda: chunks.append(audio_pipe.read()), daemon=True)
+            audio_reader.start()
+        
+        count = 0
+        try:
+            while True:
+                with metrics.timed("decode"):
+                    frame = self._read_ppm(self._proc.stdout)
+                if frame is None:
+                    break
+                count += 1
+                self._put(frame)
+        finally:
+            self._proc.stdout.close()
+            if audio_reader is not None:
+                audio_reader.join()
+                audio_pipe.close()
+            self._proc.wait()
+        
+        if self._proc.returncode != 0 and count == 0:
+            return False
+        self.frame_count = count
+        self._audio = b"".join(chunks)
+        return True
+    
+    @staticmethod
+    def _read_ppm(stream) -> Optional[np.ndarray]:
+        """Đọc 1 ảnh PPM (P6, 8-bit) từ pipe, trả về frame BGR như OpenCV"""
+        header = []
+        while len(header) < 4:
+            line = stream.readline()
+            if not line:
+                return None
+            header += line.split()
+        width, height = int(header[1]), int(header[2])
+        buffer = _read_exact(stream, width * height * 3)
+        if buffer is None:
+            return None
+        rgb = np.frombuffer(buffer, dtype=np.uint8).reshape(height, width, 3)
+        return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    
+    def _put(self, item):
+        # Bên tiêu thụ đã đóng frames(): bỏ frame, tiếp tục decode để lấy nốt audio
+        while not self._frames_closed.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+    
+    def frames(self, timestamps: Optional[List[float]] = None) -> Iterator[np.ndarray]:
+        """Generator frames theo thứ tự thời gian (chỉ gọi 1 lần), timestamps như iter_frames"""
+        count = 0
+        try:
+            while True:
+                item = self._frames.get()
+                if item is _DEMUX_DONE:
+                    break
+                metrics.frames("sampled")
+                if timestamps is not None:
+                    timestamps.append(float(count * self.interval_seconds))
+                count += 1
+                yield item
+            log(f"Tổng số frames trích xuất: {count}")
+        finally:
+            self.close_frames()
+    
+    def close_frames(self):
+        """
+        Báo nhánh frames không đọc nữa: các frames còn lại bị bỏ, ffmpeg chạy tiếp để
+        lấy nốt audio. Gọi được nhiều lần, cần gọi cả khi frames() chưa được đọc lần nào
+        (generator chưa chạy thì đóng nó không chạy tới finally).
+        """
+        self._frames_closed.set()
+        # Giải phóng các frames còn trong hàng đợi
+        while True:
+            try:
+                self._frames.get_nowait()
+            except queue.Empty:
+                break
+    
+    def audio_bytes(self) -> bytes:
+        """
+        Đợi demux xong và trả về audio dạng WAV (PCM 16-bit, 16kHz, mono);
+        b"" nếu video không có audio track.
+        """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if self._proc is not None and self._proc.returncode != 0 and not self._audio:
+            raise subprocess.CalledProcessError(self._proc.returncode, self._command(None))
+        return pcm_to_wav(self._audio) if self._audio else b""
+    
+    def close(self):
+        """Dừng ffmpeg nếu còn chạy (ví dụ khi có lỗi giữa chừng)"""
+        self._stopped.set()
+        self._frames_closed.set()
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+        self._thread.join()
 
 
 def is_video_file(file_path: str) -> bool: